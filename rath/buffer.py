@@ -0,0 +1,157 @@
+"""Bounded buffers for subscriptions.
+
+Events of a subscription are buffered between the link that receives them and
+the consumer. A SubscriptionQueue bounds this buffer and applies an overflow
+policy when the consumer can not keep up, so that high-rate subscriptions have
+predictable memory.
+"""
+
+import asyncio
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Generic, TypeVar, Union
+
+from rath.operation import OverflowPolicy
+
+T = TypeVar("T")
+
+
+class SubscriptionQueue(asyncio.Queue[T], Generic[T]):
+    """An asyncio.Queue that is bounded by buffer_size and handles overflows by its policy.
+
+    Only events that are put as droppable count against the buffer and can be
+    dropped. Control messages (e.g. the completion of a subscription, or a
+    disconnect) are never dropped, but wait for room if the policy is "block".
+    """
+
+    def __init__(self, buffer_size: int = 0, overflow_policy: OverflowPolicy = "block") -> None:
+        """Initialize the queue
+
+        Parameters
+        ----------
+        buffer_size : int, optional
+            The maximum number of buffered events, by default 0 (unbounded)
+        overflow_policy : OverflowPolicy, optional
+            What happens when the buffer is full, by default "block"
+        """
+        if overflow_policy == "latest":
+            buffer_size = 1
+        self._put_droppable = True
+        super().__init__(maxsize=buffer_size if overflow_policy == "block" else 0)
+        self.buffer_size = buffer_size
+        self.overflow_policy = overflow_policy
+        self.dropped = 0
+
+    def _init(self, maxsize: int) -> None:
+        super()._init(maxsize)  # type: ignore[misc]
+        # whether each buffered item can be dropped, in the order of the items
+        self._droppable_flags: Deque[bool] = deque()
+        self._droppable_count = 0
+
+    def _put(self, item: Any) -> None:
+        super()._put(item)  # type: ignore[misc]
+        self._droppable_flags.append(self._put_droppable)
+        self._droppable_count += self._put_droppable
+
+    def _get(self) -> Any:
+        self._droppable_count -= self._droppable_flags.popleft()
+        return super()._get()  # type: ignore[misc]
+
+    def _drop_oldest(self) -> bool:
+        """Drop the oldest droppable item (returns False if none is buffered)"""
+        for index, droppable in enumerate(self._droppable_flags):
+            if droppable:
+                del self._queue[index]  # type: ignore[attr-defined]
+                del self._droppable_flags[index]
+                self._droppable_count -= 1
+                # the dropped item will never be consumed
+                self.task_done()
+                return True
+        return False
+
+    async def put_event(self, item: T, droppable: bool = True) -> None:
+        """Put an item into the queue, applying the overflow policy if it is full
+
+        Parameters
+        ----------
+        item : T
+            The item
+        droppable : bool, optional
+            Can the item be dropped (and does it count against the buffer), by default True
+        """
+        if self.overflow_policy == "block" or self.buffer_size <= 0:
+            await self.put(item)
+            return
+
+        if droppable and self._droppable_count >= self.buffer_size:
+            if self.overflow_policy == "drop_newest":
+                self.dropped += 1
+                return
+            # drop_oldest and latest: make room by dropping the oldest droppable event
+            if self._drop_oldest():
+                self.dropped += 1
+
+        self._put_droppable = droppable
+        try:
+            self.put_nowait(item)
+        finally:
+            self._put_droppable = True
+
+
+class _Failure:
+    """Carries an exception of the buffered iterator to the consumer"""
+
+    def __init__(self, error: BaseException) -> None:
+        self.error = error
+
+
+_DONE = object()
+
+
+async def abuffered(
+    iterator: AsyncIterator[T],
+    buffer_size: int = 0,
+    overflow_policy: OverflowPolicy = "block",
+) -> AsyncIterator[T]:
+    """Consume an async iterator in the background, buffering its items
+
+    The iterator is drained by a task into a SubscriptionQueue, so that a slow
+    consumer (e.g. a synchronous generator in another thread) is decoupled from
+    the producer, with bounded memory.
+
+    Parameters
+    ----------
+    iterator : AsyncIterator[T]
+        The iterator to buffer
+    buffer_size : int, optional
+        The maximum number of buffered items, by default 0 (unbounded)
+    overflow_policy : OverflowPolicy, optional
+        What happens when the buffer is full, by default "block"
+
+    Yields
+    ------
+    T
+        The items of the iterator
+    """
+    queue: SubscriptionQueue[Union[T, _Failure, object]] = SubscriptionQueue(buffer_size, overflow_policy)
+
+    async def pump() -> None:
+        try:
+            async for item in iterator:
+                await queue.put_event(item)
+        except Exception as e:
+            await queue.put_event(_Failure(e), droppable=False)
+        else:
+            await queue.put_event(_DONE, droppable=False)
+
+    task = asyncio.create_task(pump())
+    try:
+        while True:
+            item = await queue.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item  # type: ignore[misc]
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
@@ -1,15 +1,26 @@
-from datetime import datetime
 from http import HTTPStatus
 import json
 from ssl import SSLContext
 from typing import Any, Dict, List, Optional, Self, Type, AsyncIterator
+from urllib.parse import urlencode
 from rath.links.types import Payload
 import aiohttp
 from graphql import OperationType
-from pydantic import Field
-from rath.operation import GraphQLException, GraphQLResult, Operation
-from rath.links.base import AsyncTerminatingLink
-from rath.links.errors import AuthenticationError, MalformedResponseError
+from pydantic import Field, model_validator
+from rath.operation import GraphQLResult, Operation
+from rath.links.batch import BatchResult, BatchingTerminatingLink
+from rath.links.codec import JSONCodec, StdlibCodec, get_codec
+from rath.links.codec import DateTimeEncoder  # noqa: F401 (kept for backwards compatibility)
+from rath.links.errors import AuthenticationError, HTTPStatusError, MalformedResponseError
+from rath.links.incremental import (
+    INCREMENTAL_ACCEPT,
+    aparse_multipart_response,
+    is_multipart,
+    uses_incremental_delivery,
+)
+from rath.links.streaming import aparse_streamed_response
+from rath.links.upload import MultipartUpload, UploadProgressCallback
+from rath.links.utils import build_payload, build_query_params, parse_graphql_response, parse_retry_after
 import logging
 import certifi
 import ssl
@@ -17,24 +28,15 @@ import ssl
 logger = logging.getLogger(__name__)
 
 
-class DateTimeEncoder(json.JSONEncoder):
-    """DateTimeEncoder is a JSONEncoder that extends the default python json decoder to serialize"""
-
-    def default(self, o: Any):  # noqa
-        """Override the default method to serialize datetime objects to ISO 8601 strings"""
-        if isinstance(o, datetime):
-            return o.isoformat()
-
-        return json.JSONEncoder.default(self, o)
-
-
-class AIOHttpLink(AsyncTerminatingLink):
+class AIOHttpLink(BatchingTerminatingLink):
     """AIOHttpLink is a terminating link that sends operations over HTTP using aiohttp.
 
     Aiohttp is a Python library for asynchronous HTTP requests. This link uses the
     standard aiohttp library to send operations over HTTP, but provides an ssl context
     that is configured to use the certifi CA bundle by default. You can override this
     behavior by passing your own SSLContext to the constructor.
+
+    This link supports batching, so it can be composed with a BatchLink.
     """
 
     endpoint_url: str
@@ -55,15 +57,103 @@ class AIOHttpLink(AsyncTerminatingLink):
     override this to include other status codes that indicate that the request was
     unauthorized."""
 
-    json_encoder: Type[json.JSONEncoder] = Field(default=DateTimeEncoder, exclude=True)
-    """json_encoder is the JSONEncoder to use when serializing the payload. By default,
-    this is a DateTimeEncoder that extends the default python json decoder to serialize 
-    datetime objects to ISO 8601 strings."""
+    status_errors: List[HTTPStatus] = Field(
+        default_factory=lambda: [
+            HTTPStatus.TOO_MANY_REQUESTS,
+            HTTPStatus.BAD_GATEWAY,
+            HTTPStatus.SERVICE_UNAVAILABLE,
+            HTTPStatus.GATEWAY_TIMEOUT,
+        ]
+    )
+    """status_errors is a list of HTTPStatus codes that indicate a (possibly transient)
+    failure of the server. They raise an HTTPStatusError (carrying the Retry-After
+    header), instead of trying to decode the body."""
+
+    codec: JSONCodec = Field(default_factory=get_codec, exclude=True)
+    """codec is the JSONCodec used to encode payloads and decode responses. By default,
+    this is the fastest installed codec (orjson, msgspec or the standard library),
+    all of which serialize datetime objects to ISO 8601 strings."""
+    json_encoder: Optional[Type[json.JSONEncoder]] = Field(default=None, exclude=True)
+    """json_encoder is a JSONEncoder to use when serializing the payload. If set, the
+    standard library codec is used with this encoder (overriding codec)."""
+
+    session_per_request: bool = False
+    """session_per_request makes the link create (and close) a new aiohttp session for
+    every operation, instead of reusing the session that is opened when the link is
+    entered. This disables connection pooling and should only be used if you need
+    to isolate requests from each other."""
+    connection_limit: int = 100
+    """connection_limit is the total number of simultaneous connections in the pool
+    (0 means no limit)."""
+    connection_limit_per_host: int = 0
+    """connection_limit_per_host is the number of simultaneous connections to the same
+    endpoint (0 means no limit)."""
+    keepalive_timeout: float = 15
+    """keepalive_timeout is the number of seconds an idle connection is kept open
+    in the pool for reuse."""
+    use_dns_cache: bool = True
+    """use_dns_cache enables caching of resolved host names in the connector."""
+    ttl_dns_cache: Optional[int] = 10
+    """ttl_dns_cache is the number of seconds resolved host names are cached
+    (None means forever)."""
+
+    get_persisted_queries: bool = False
+    """get_persisted_queries sends queries that omit their document (e.g. the hashed
+    queries of an ApqLink) as GET requests with a query string, so that CDNs and
+    reverse proxies can cache them. Mutations are always sent as POST requests."""
+    max_get_url_length: int = 2048
+    """max_get_url_length is the maximum length of the URL of a GET request. Queries
+    with larger variables are sent as POST requests."""
+
+    stream_chunk_size: int = 64 * 1024
+    """stream_chunk_size is the size of the chunks a streamed response (an operation
+    with a stream_path) is read and decoded in."""
+    upload_chunk_size: int = 64 * 1024
+    """upload_chunk_size is the size of the chunks files are uploaded in. Files are
+    streamed, and never read into memory as a whole."""
+    on_upload_progress: Optional[UploadProgressCallback] = Field(exclude=True, default=None)
+    """on_upload_progress is called with the UploadProgress of a file after every
+    uploaded chunk (it can be async), e.g. to show a progress bar."""
 
     _connected = False
+    _session: Optional[aiohttp.ClientSession] = None
+
+    @model_validator(mode="after")
+    def _use_json_encoder(self) -> Self:
+        """Use the standard library codec if a custom json_encoder is set"""
+        if self.json_encoder is not None:
+            self.codec = StdlibCodec(encoder=self.json_encoder)
+        return self
+
+    def _build_session(self) -> aiohttp.ClientSession:
+        """Builds a new aiohttp session with a pooled connector
+
+        Returns
+        -------
+        aiohttp.ClientSession
+            The configured session
+        """
+        connector = aiohttp.TCPConnector(
+            ssl=self.ssl_context,
+            limit=self.connection_limit,
+            limit_per_host=self.connection_limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            use_dns_cache=self.use_dns_cache,
+            ttl_dns_cache=self.ttl_dns_cache,
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            json_serialize=self.codec.dumps,
+        )
 
     async def __aenter__(self) -> Self:
-        """Entery point for the async context manager"""
+        """Entery point for the async context manager
+
+        Opens the pooled aiohttp session that is shared by all operations
+        executed while the link is entered (unless session_per_request is set).
+        """
+        if not self.session_per_request and self._session is None:
+            self._session = self._build_session()
         return self
 
     async def aconnect(self, operation: Operation) -> None:
@@ -81,15 +171,21 @@ class AIOHttpLink(AsyncTerminatingLink):
         exc_val: Optional[BaseException],
         traceback: Optional[Any],
     ) -> None:
-        """Exit point for the async context manager"""
-        pass
+        """Exit point for the async context manager
+
+        Closes the pooled aiohttp session and all of its connections.
+        """
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        self._connected = False
 
     async def aexecute(self, operation: Operation) -> AsyncIterator[GraphQLResult]:
         """Executes an operation against the link
 
-        This link will create a new aiohttp session for each request. While
-        we could also reuse the session, we currently don't do this. If
-        you feel like this should be changed, please open an issue.
+        This link will reuse the pooled session that was opened when the link
+        was entered. If the link was not entered (or session_per_request is set),
+        a new session is created and closed for this request.
 
         Parameters
         ----------
@@ -104,7 +200,8 @@ class AIOHttpLink(AsyncTerminatingLink):
         if not self._connected:
             await self.aconnect(operation)
 
-        payload: Payload = {"query": operation.document}
+        payload: Payload = build_payload(operation)
+        headers = operation.context.headers
 
         if operation.node.operation == OperationType.SUBSCRIPTION:
             raise NotImplementedError(
@@ -113,67 +210,178 @@ class AIOHttpLink(AsyncTerminatingLink):
             )
 
         if len(operation.context.files.items()) > 0:
-            payload["variables"] = operation.variables
+            upload = MultipartUpload.from_operation(
+                operation,
+                payload,
+                self.codec.dumps,
+                chunk_size=self.upload_chunk_size,
+                on_progress=self.on_upload_progress,
+            )
+            headers = {**headers, **upload.headers}
+            method, request_kwargs = "POST", {"data": upload}
+
+        else:
+            params = self._get_params(operation, payload)
+            if params is not None:
+                method, request_kwargs = "GET", {"params": params}
+            else:
+                method, request_kwargs = "POST", {"json": payload}
 
-            files = operation.context.files
-            data = aiohttp.FormData()
+        incremental = uses_incremental_delivery(operation)
+        if operation.context.stream_path or incremental:
+            if incremental and "Accept" not in headers:
+                headers = {**headers, "Accept": INCREMENTAL_ACCEPT}
+            async for result in self._astream(method, headers, operation, request_kwargs):
+                yield result
+            return
 
-            file_map = {str(i): [path] for i, path in enumerate(files)}
+        json_response = await self._arequest(method, headers, request_kwargs)
+        yield parse_graphql_response(json_response, operation, self.endpoint_url)
 
-            # Enumerate the file streams
-            # Will generate something like {'0': <_io.BufferedReader ...>}
-            file_streams = {str(i): files[path] for i, path in enumerate(files)}
-            operations_str = json.dumps(payload, cls=self.json_encoder)
+    async def aexecute_batch(self, operations: List[Operation]) -> List[BatchResult]:
+        """Executes a batch of operations in a single request
 
-            data.add_field(
-                "operations", operations_str, content_type="application/json"
+        The operations are sent as a JSON array, and the server is expected
+        to answer with a JSON array of results in the same order.
+
+        Parameters
+        ----------
+        operations : List[Operation]
+            The operations to execute, they all share the same headers
+
+        Returns
+        -------
+        List[BatchResult]
+            The result (or error) of each operation, in the same order
+        """
+        if not self._connected:
+            await self.aconnect(operations[0])
+
+        json_response = await self._arequest(
+            "POST",
+            operations[0].context.headers,
+            {"json": [build_payload(operation) for operation in operations]},
+        )
+
+        if not isinstance(json_response, list) or len(json_response) != len(operations):
+            raise MalformedResponseError(
+                f"Batch response from {self.endpoint_url} is not a list of "
+                f"{len(operations)} results: {json_response}"
             )
-            file_map_str = json.dumps(file_map)
-            data.add_field("map", file_map_str, content_type="application/json")
-
-            for k, v in file_streams.items():
-                data.add_field(
-                    k,
-                    v,
-                    filename=getattr(v, "name", k),
-                )
 
-            post_kwargs: Dict[str, Any] = {"data": data}
+        results: List[BatchResult] = []
+        for operation, response in zip(operations, json_response):
+            try:
+                results.append(parse_graphql_response(response, operation, self.endpoint_url))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def _get_params(self, operation: Operation, payload: Payload) -> Optional[Dict[str, str]]:
+        """The query string of an operation, if it should be sent as a GET request
 
+        Only persisted queries (that omit their document) are sent as GET requests,
+        and only if the URL stays within max_get_url_length.
+        """
+        if not (
+            self.get_persisted_queries
+            and operation.context.omit_document
+            and operation.node.operation == OperationType.QUERY
+        ):
+            return None
+
+        params = build_query_params(payload, self.codec.dumps)
+        if len(self.endpoint_url) + len(urlencode(params)) + 1 > self.max_get_url_length:
+            return None
+        return params
+
+    async def _arequest(self, method: str, headers: Dict[str, str], request_kwargs: Dict[str, Any]) -> Any:
+        """Sends a request to the endpoint and returns the decoded response
+
+        Uses the pooled session, or a new session if the link was not
+        entered (or session_per_request is set).
+        """
+        if self._session is None or self.session_per_request:
+            async with self._build_session() as session:
+                return await self._arequest_with(session, method, headers, request_kwargs)
+        return await self._arequest_with(self._session, method, headers, request_kwargs)
+
+    async def _arequest_with(
+        self,
+        session: aiohttp.ClientSession,
+        method: str,
+        headers: Dict[str, str],
+        request_kwargs: Dict[str, Any],
+    ) -> Any:
+        """Sends a request to the endpoint with the given session and returns the decoded response"""
+        async with session.request(
+            method, self.endpoint_url, headers=headers, **request_kwargs
+        ) as response:
+            self._raise_for_status(response, headers)
+
+            # the body is read and decoded exactly once
+            return self.codec.loads(await response.read())
+
+    def _raise_for_status(self, response: aiohttp.ClientResponse, headers: Dict[str, str]) -> None:
+        """Raises if the status of the response is an auth error or a status error"""
+        if response.status in self.auth_errors:
+            raise AuthenticationError(f"Token Expired Error {headers}")
+        if response.status in self.status_errors:
+            raise HTTPStatusError(
+                f"Request to {self.endpoint_url} failed with status {response.status}",
+                response.status,
+                parse_retry_after(response.headers.get("Retry-After")),
+            )
+
+    async def _astream(
+        self,
+        method: str,
+        headers: Dict[str, str],
+        operation: Operation,
+        request_kwargs: Dict[str, Any],
+    ) -> AsyncIterator[GraphQLResult]:
+        """Sends a request and decodes the response incrementally
+
+        A multipart/mixed response (for operations with @defer or @stream) yields
+        the merged result after every part. Otherwise a partial result is yielded
+        for every chunk that completes items of the list at the stream_path of the
+        operation, and finally the rest of the response.
+        """
+        if self._session is None or self.session_per_request:
+            async with self._build_session() as session:
+                async for result in self._astream_with(session, method, headers, operation, request_kwargs):
+                    yield result
         else:
-            payload["variables"] = operation.variables
-            post_kwargs = {"json": payload}
-
-        async with aiohttp.ClientSession(
-            connector=aiohttp.TCPConnector(ssl=self.ssl_context),
-            json_serialize=lambda x: json.dumps(x, cls=self.json_encoder),
-        ) as session:
-            async with session.post(
-                self.endpoint_url, headers=operation.context.headers, **post_kwargs
-            ) as response:
-                if response.status == HTTPStatus.OK:
-                    await response.json()
-
-                if response.status in self.auth_errors:
-                    raise AuthenticationError(
-                        f"Token Expired Error {operation.context.headers}"
-                    )
-
-                json_response = await response.json()
-
-                if "errors" in json_response:
-                    raise GraphQLException(
-                        "\n".join([e["message"] for e in json_response["errors"]]),
-                        operation=operation,
-                        endpoint_url=self.endpoint_url,
-                        errors=json_response["errors"],
-                    )
-
-                if "data" not in json_response:
-                    raise MalformedResponseError(
-                        f"Response from {self.endpoint_url} for operation "
-                        f"'{operation.display_name}' contains neither "
-                        f"'data' nor 'errors': {json_response}"
-                    )
-
-                yield GraphQLResult(data=json_response["data"])
+            async for result in self._astream_with(self._session, method, headers, operation, request_kwargs):
+                yield result
+
+    async def _astream_with(
+        self,
+        session: aiohttp.ClientSession,
+        method: str,
+        headers: Dict[str, str],
+        operation: Operation,
+        request_kwargs: Dict[str, Any],
+    ) -> AsyncIterator[GraphQLResult]:
+        """Sends a request with the given session and decodes the response incrementally"""
+        async with session.request(
+            method, self.endpoint_url, headers=headers, **request_kwargs
+        ) as response:
+            self._raise_for_status(response, headers)
+
+            content_type = response.headers.get("Content-Type", "")
+            chunks = response.content.iter_chunked(self.stream_chunk_size)
+            if is_multipart(content_type):
+                results = aparse_multipart_response(
+                    chunks, content_type, operation, self.codec.loads, self.endpoint_url
+                )
+            elif operation.context.stream_path:
+                results = aparse_streamed_response(chunks, operation, self.codec.loads, self.endpoint_url)
+            else:
+                # the server does not support incremental delivery
+                json_response = self.codec.loads(await response.read())
+                yield parse_graphql_response(json_response, operation, self.endpoint_url)
+                return
+
+            async for result in results:
+                yield result
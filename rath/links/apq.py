@@ -1,33 +1,132 @@
+from functools import lru_cache
 import hashlib
-from typing import AsyncIterator
+import json
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, NamedTuple, Optional, Self, Union
+
+from graphql import parse, print_ast
+from pydantic import model_validator
 
 from rath.links.base import ContinuationLink
 from rath.operation import GraphQLException, GraphQLResult, Operation
 from rath.errors import NotComposedError
 
 
+@lru_cache(maxsize=1024)
+def hash_document(document: str) -> str:
+    """The SHA-256 hash of a document, as used by the APQ protocol
+
+    Hashes are cached per document, as an application only ever sends
+    a limited set of documents.
+
+    Parameters
+    ----------
+    document : str
+        The (printed) document
+
+    Returns
+    -------
+    str
+        The hex encoded SHA-256 hash
+    """
+    return hashlib.sha256(document.encode("utf-8")).hexdigest()
+
+
+class ManifestEntry(NamedTuple):
+    """A persisted query of a manifest"""
+
+    hash: str
+    """ The hash of the query, as the server knows it """
+    body: str
+    """ The document, exactly as it is in the manifest (the hash is the hash of this body) """
+
+
+def load_manifest(manifest: Union[str, Path, Dict[str, Any]]) -> Dict[str, ManifestEntry]:
+    """Load a persisted query manifest
+
+    Supports the apollo manifest format (`{"operations": [{"id": ..., "body": ...}]}`)
+    and plain mappings of hashes to documents (`{hash: document}`). Entries
+    are keyed by their printed document, so that they match the documents of
+    operations, and keep their original body.
+
+    Parameters
+    ----------
+    manifest : Union[str, Path, Dict[str, Any]]
+        The path to a JSON manifest, or the loaded manifest
+
+    Returns
+    -------
+    Dict[str, ManifestEntry]
+        A mapping of printed documents to their manifest entries
+    """
+    if not isinstance(manifest, dict):
+        with open(manifest, "r") as f:
+            manifest = json.load(f)
+
+    if "operations" in manifest:
+        entries = {operation["id"]: operation["body"] for operation in manifest["operations"]}
+    else:
+        entries = manifest
+
+    return {print_ast(parse(body)): ManifestEntry(hash, body) for hash, body in entries.items()}
+
+
+def is_persisted_query_error(exc: GraphQLException) -> bool:
+    """Checks if an error signals that the server does not know a persisted query"""
+    return "PersistedQueryNotFound" in exc.message or "PERSISTED_QUERY_NOT_FOUND" in exc.message
+
+
 class ApqLink(ContinuationLink):
     """A link that implements the Automatic Persisted Queries (APQ) protocol.
 
-    On the first request only the SHA-256 hash of the query is sent.  If the
-    server responds with a "PersistedQueryNotFound" error the full query is
-    resent together with the hash so the server can cache it for next time.
+    Every request only sends the SHA-256 hash of the query. If the server
+    responds with a "PersistedQueryNotFound" error, the full query is resent
+    together with its hash, so that the server registers it, and all later
+    requests for the document can again be sent without it.
     """
 
+    manifest: Optional[Union[str, Path, Dict[str, Any]]] = None
+    """A persisted query manifest (or the path to it), e.g. generated from the
+    documents of a turms project. Its hashes are used for its documents, and if
+    the server does not know one of them, the document is registered with its
+    body from the manifest (which the server hashes to the same hash)."""
+
+    _manifest_entries: Dict[str, ManifestEntry] = {}
+
+    @model_validator(mode="after")
+    def _load_manifest(self) -> Self:
+        """Load the manifest once, when the link is created"""
+        if self.manifest is not None:
+            self._manifest_entries = load_manifest(self.manifest)
+        return self
+
     def _hash_query(self, query: str) -> str:
-        sha256 = hashlib.sha256()
-        sha256.update(query.encode("utf-8"))
-        return sha256.hexdigest()
+        """The hash of a document (from the manifest, if it is part of it)"""
+        entry = self._manifest_entries.get(query)
+        return entry.hash if entry is not None else hash_document(query)
 
     async def aexecute(
         self, operation: Operation
     ) -> AsyncIterator[GraphQLResult]:
+        """Executes an operation against the link
+
+        Parameters
+        ----------
+        operation : Operation
+            The operation to execute
+
+        Yields
+        ------
+        GraphQLResult
+            The result of the operation
+        """
         if not self.next:
             raise NotComposedError("No next link set")
 
+        sha256_hash = self._hash_query(operation.document)
         operation.context.extensions["persistedQuery"] = {
             "version": 1,
-            "sha256Hash": self._hash_query(operation.document),
+            "sha256Hash": sha256_hash,
         }
         operation.context.omit_document = True
 
@@ -36,14 +135,13 @@ class ApqLink(ContinuationLink):
                 yield result
 
         except GraphQLException as exc:
-            is_persisted_query_error = (
-                "PersistedQueryNotFound" in exc.message
-                or "PERSISTED_QUERY_NOT_FOUND" in exc.message
-            )
-
-            if is_persisted_query_error:
-                operation.context.extensions.pop("persistedQuery", None)
+            if is_persisted_query_error(exc):
+                # send the document together with its hash, so that the server registers it
                 operation.context.omit_document = False
+                entry = self._manifest_entries.get(operation.document)
+                if entry is not None and entry.body != operation.document:
+                    # the server checks the hash against the document it receives
+                    operation = operation.model_copy(update={"document": entry.body})
                 async for result in self.next.aexecute(operation):
                     yield result
             else:
@@ -0,0 +1,203 @@
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional, Self, Tuple, Type, Union
+
+from graphql import OperationType
+
+from rath.errors import NotComposedError
+from rath.links.base import AsyncTerminatingLink, ContinuationLink
+from rath.links.incremental import uses_incremental_delivery
+from rath.operation import GraphQLResult, Operation
+
+logger = logging.getLogger(__name__)
+
+
+BatchResult = Union[GraphQLResult, Exception]
+"""The result of one operation in a batch: either its result or the error it raised."""
+
+
+class BatchingTerminatingLink(AsyncTerminatingLink):
+    """A terminating link that can send multiple operations in one request.
+
+    This is the terminating half of the BatchLink: it receives a list of
+    operations (that share the same headers), sends them in a single request
+    and returns one BatchResult per operation, in the same order. An error
+    that only concerns a single operation (e.g. a GraphQL error) is returned
+    in its place, so that it does not affect the other operations in the batch.
+    An error that concerns the whole request (e.g. a connection error) is raised.
+    """
+
+    async def aexecute_batch(self, operations: List[Operation]) -> List[BatchResult]:
+        """Executes a batch of operations in a single request
+
+        Parameters
+        ----------
+        operations : List[Operation]
+            The operations to execute, they all share the same headers
+
+        Returns
+        -------
+        List[BatchResult]
+            The result (or error) of each operation, in the same order
+        """
+        raise NotImplementedError(f"Please overwrite the aexecute_batch method in {self.__class__.__name__}")
+
+
+BatchKey = Tuple[Tuple[str, str], ...]
+
+PendingOperation = Tuple[Operation, "asyncio.Future[BatchResult]"]
+
+
+class BatchLink(ContinuationLink):
+    """BatchLink is a link that coalesces concurrent operations into batches.
+
+    Queries (and optionally mutations) that arrive within batch_interval seconds
+    of each other are collected and sent as a single JSON-array batch request
+    through the next link, which needs to be a BatchingTerminatingLink (e.g. the
+    AIOHttpLink or HttpxLink). A batch is sent early once it reaches
+    max_batch_size operations. Only operations with the same headers are
+    batched together.
+
+    The results are fanned back out to each caller, and an error of a single
+    operation is only raised for that operation. Subscriptions, operations with
+    files, and operations sent to a next link that does not support batching
+    are forwarded unchanged.
+
+    This link needs to be entered (which composing it into a Rath does).
+    """
+
+    batch_interval: float = 0.01
+    """The time window in seconds in which operations are collected into one batch."""
+    max_batch_size: int = 20
+    """The maximum number of operations in one batch. A full batch is sent immediately."""
+    batch_mutations: bool = False
+    """Should mutations be batched as well. Servers execute the operations of a batch
+    in order, but mutations of independent callers might be reordered."""
+
+    _pending: Dict[BatchKey, List[PendingOperation]] = {}
+    _timers: Dict[BatchKey, asyncio.TimerHandle] = {}
+    _inflight: set["asyncio.Task[None]"] = set()
+
+    async def __aenter__(self) -> Self:
+        """Enters the link, and initializes the batch queues"""
+        self._pending = {}
+        self._timers = {}
+        self._inflight = set()
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_val: Optional[BaseException],
+        traceback: Optional[Any],
+    ) -> None:
+        """Exits the link, sending all pending batches and waiting for them"""
+        for key in list(self._pending):
+            self._flush(key)
+
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+
+    def should_batch(self, operation: Operation) -> bool:
+        """Decides if an operation can be batched
+
+        Parameters
+        ----------
+        operation : Operation
+            The operation
+
+        Returns
+        -------
+        bool
+            True if the operation should be batched
+        """
+        if not isinstance(self.next, BatchingTerminatingLink):
+            return False
+        if operation.context.files or operation.context.stream_path:
+            return False
+        if uses_incremental_delivery(operation):
+            return False
+        if operation.node.operation == OperationType.QUERY:
+            return True
+        if operation.node.operation == OperationType.MUTATION:
+            return self.batch_mutations
+        return False
+
+    def _flush(self, key: BatchKey) -> None:
+        """Sends the pending batch for key"""
+        timer = self._timers.pop(key, None)
+        if timer:
+            timer.cancel()
+
+        batch = self._pending.pop(key, None)
+        if not batch:
+            return
+
+        task = asyncio.create_task(self._asend(batch))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def _asend(self, batch: List[PendingOperation]) -> None:
+        """Sends a batch through the next link and resolves the futures of the callers"""
+        assert isinstance(self.next, BatchingTerminatingLink), "Next link does not support batching"
+
+        # callers that were cancelled in the meantime do not need to be sent
+        batch = [(operation, future) for operation, future in batch if not future.done()]
+        if not batch:
+            return
+
+        logger.debug(f"Sending batch of {len(batch)} operations")
+        try:
+            results = await self.next.aexecute_batch([operation for operation, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def aexecute(self, operation: Operation) -> AsyncIterator[GraphQLResult]:
+        """Executes an operation against the link
+
+        Batchable operations are queued and sent as part of the next batch,
+        all other operations are forwarded to the next link.
+
+        Parameters
+        ----------
+        operation : Operation
+            The operation to execute
+
+        Yields
+        ------
+        GraphQLResult
+            The result of the operation
+        """
+        if not self.next:
+            raise NotComposedError("No next link set")
+
+        if not self.should_batch(operation):
+            async for result in self.next.aexecute(operation):
+                yield result
+            return
+
+        key: BatchKey = tuple(sorted(operation.context.headers.items()))
+        future: asyncio.Future[BatchResult] = asyncio.get_running_loop().create_future()
+
+        batch = self._pending.setdefault(key, [])
+        batch.append((operation, future))
+
+        if len(batch) >= self.max_batch_size:
+            self._flush(key)
+        elif key not in self._timers:
+            self._timers[key] = asyncio.get_running_loop().call_later(self.batch_interval, self._flush, key)
+
+        result = await future
+        assert isinstance(result, GraphQLResult), "Batch result needs to be a GraphQLResult"
+        yield result
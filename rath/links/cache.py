@@ -0,0 +1,387 @@
+import asyncio
+from collections import OrderedDict
+import json
+import logging
+import time
+from typing import Any, AsyncIterator, Dict, FrozenSet, Hashable, List, NamedTuple, Optional, Self, Tuple, Type
+
+from graphql import FieldNode, OperationType
+from pydantic import Field
+
+from rath.errors import NotComposedError
+from rath.links.base import ContinuationLink
+from rath.links.incremental import uses_incremental_delivery
+from rath.operation import CachePolicy, GraphQLResult, Operation
+
+logger = logging.getLogger(__name__)
+
+
+CacheKey = Tuple[str, Optional[str], str, str]
+
+
+def root_fields(operation: Operation) -> FrozenSet[str]:
+    """The names of the root fields of an operation (aliases are ignored)
+
+    Parameters
+    ----------
+    operation : Operation
+        The operation
+
+    Returns
+    -------
+    FrozenSet[str]
+        The names of the root fields
+    """
+    return frozenset(
+        selection.name.value
+        for selection in operation.node.selection_set.selections
+        if isinstance(selection, FieldNode)
+    )
+
+
+def result_typenames(data: Any) -> FrozenSet[str]:
+    """The __typename of all objects in the data of a result (the root object is ignored)
+
+    Parameters
+    ----------
+    data : Any
+        The data of a result
+
+    Returns
+    -------
+    FrozenSet[str]
+        The typenames
+    """
+    typenames = set()
+    stack = list(data.values()) if isinstance(data, dict) else []
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            typename = value.get("__typename")
+            if isinstance(typename, str):
+                typenames.add(typename)
+            stack.extend(value.values())
+        elif isinstance(value, list):
+            stack.extend(value)
+    return frozenset(typenames)
+
+
+def canonical_json(value: Any) -> str:
+    """Serialize a value to a canonical JSON string (sorted keys), to be used in cache keys"""
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+
+
+class CacheEntry(NamedTuple):
+    """An entry in the response cache"""
+
+    result: GraphQLResult
+    root_fields: FrozenSet[str]
+    typenames: FrozenSet[str]
+    expires_at: Optional[float]
+
+
+class CacheInfo(NamedTuple):
+    """Statistics of a CacheLink"""
+
+    hits: int
+    misses: int
+    evictions: int
+    invalidations: int
+    maxsize: int
+    currsize: int
+
+
+class BaseCacheLink(ContinuationLink):
+    """BaseCacheLink implements the cache policies for links that cache query results.
+
+    Subclasses decide how results are stored by implementing cache_key, read
+    and write, and can react to the results of mutations and subscriptions
+    by implementing update.
+
+    How a query is treated is decided by its cache policy (set through the
+    context, e.g. `rath.aquery(..., cache_policy="network-only")`), or the
+    default_policy of the link:
+
+    - cache-first: serve from the cache if possible, otherwise fetch and cache
+    - network-only: always fetch, and cache the result
+    - cache-and-network: serve from the cache (if possible) and then yield the
+      fetched result. The fetch completes (and updates the cache) even if the
+      consumer stops after the cached result, as Rath.aquery does.
+    """
+
+    default_policy: CachePolicy = "cache-first"
+    """The cache policy for operations that do not set one in their context."""
+
+    _refreshes: set["asyncio.Task[Optional[GraphQLResult]]"] = set()
+
+    async def __aenter__(self) -> Self:
+        """Enters the link"""
+        self._refreshes = set()
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_val: Optional[BaseException],
+        traceback: Optional[Any],
+    ) -> None:
+        """Exits the link, cancelling background refreshes"""
+        for task in self._refreshes:
+            task.cancel()
+        if self._refreshes:
+            await asyncio.gather(*self._refreshes, return_exceptions=True)
+
+    def cache_key(self, operation: Operation) -> Hashable:
+        """Builds the cache key for a query, that is passed to read and write"""
+        raise NotImplementedError(f"Please overwrite the cache_key method in {self.__class__.__name__}")
+
+    def read(self, key: Hashable, operation: Operation) -> Optional[GraphQLResult]:
+        """Reads the result of a query from the cache (None if it is not cached)"""
+        raise NotImplementedError(f"Please overwrite the read method in {self.__class__.__name__}")
+
+    def write(self, key: Hashable, operation: Operation, result: GraphQLResult) -> None:
+        """Writes the result of a query to the cache"""
+        raise NotImplementedError(f"Please overwrite the write method in {self.__class__.__name__}")
+
+    def update(self, operation: Operation, result: GraphQLResult) -> None:
+        """Updates the cache with the result of a mutation or subscription"""
+        pass
+
+    def should_cache(self, operation: Operation) -> bool:
+        """Decides if the result of an operation is cached (only queries without files, that are not streamed or delivered incrementally)"""
+        return (
+            operation.node.operation == OperationType.QUERY
+            and not operation.context.files
+            and not operation.context.stream_path
+            and not uses_incremental_delivery(operation)
+        )
+
+    async def _afetch(self, key: Hashable, operation: Operation) -> Optional[GraphQLResult]:
+        """Fetches the result of a query from the next link and caches it"""
+        assert self.next, "No next link set"
+
+        result = None
+        async for result in self.next.aexecute(operation):
+            break
+
+        if result is not None:
+            self.write(key, operation, result)
+        return result
+
+    def _refresh_done(self, task: "asyncio.Task[Optional[GraphQLResult]]") -> None:
+        """Forgets a finished background refresh, logging its error if nobody awaited it"""
+        self._refreshes.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Background refresh of a cached query failed", exc_info=task.exception())
+
+    async def aexecute(self, operation: Operation) -> AsyncIterator[GraphQLResult]:
+        """Executes an operation against the link
+
+        Queries are served according to their cache policy, the results
+        of mutations and subscriptions are passed to update.
+
+        Parameters
+        ----------
+        operation : Operation
+            The operation to execute
+
+        Yields
+        ------
+        GraphQLResult
+            The result of the operation
+        """
+        if not self.next:
+            raise NotComposedError("No next link set")
+
+        if not self.should_cache(operation):
+            async for result in self.next.aexecute(operation):
+                # update before yielding, as the consumer might stop after the result
+                self.update(operation, result)
+                yield result
+            return
+
+        policy = operation.context.cache_policy or self.default_policy
+        key = self.cache_key(operation)
+
+        if policy == "network-only":
+            result = await self._afetch(key, operation)
+            if result is not None:
+                yield result
+            return
+
+        cached = self.read(key, operation)
+
+        if policy == "cache-first":
+            if cached is not None:
+                yield cached
+                return
+
+            result = await self._afetch(key, operation)
+            if result is not None:
+                yield result
+            return
+
+        # cache-and-network: the refresh runs as its own task, so that it completes
+        # even if the consumer only takes the cached result
+        refresh = asyncio.create_task(self._afetch(key, operation))
+        self._refreshes.add(refresh)
+        refresh.add_done_callback(self._refresh_done)
+
+        if cached is not None:
+            yield cached
+
+        result = await asyncio.shield(refresh)
+        if result is not None:
+            yield result
+
+
+class CacheLink(BaseCacheLink):
+    """CacheLink is a link that caches the results of queries.
+
+    Results are keyed by the document, the operation name, the canonicalized
+    variables and (by default) the headers of the operation, and a cache hit is
+    served without touching the next link. The cache is bounded by maxsize
+    (least recently used entries are evicted first) and entries expire after
+    ttl seconds. See BaseCacheLink for the supported cache policies.
+
+    Mutations invalidate all cached queries that contain an object of a type
+    the mutation returned (by __typename, e.g. `createBeast { __typename id }`
+    invalidates every query that returned a Beast). Queries that share a root
+    field with the mutation, or that are mapped to one of its root fields in
+    `invalidates`, are invalidated as well, which also covers queries whose
+    results did not contain such an object yet (e.g. an empty list).
+    Subscriptions and mutations are never cached.
+
+    Cached results are shared between callers and must not be mutated.
+    """
+
+    maxsize: int = 1000
+    """The maximum number of cached results."""
+    ttl: Optional[float] = 300
+    """The number of seconds a result stays valid (None means forever)."""
+    vary_on_headers: bool = True
+    """Should the headers be part of the cache key. Disable only if all callers
+    are allowed to see the same data."""
+    invalidates: Dict[str, List[str]] = Field(default_factory=dict)
+    """A mapping of mutation root fields to the query root fields they invalidate,
+    e.g. `{"createBeast": ["beasts"]}`."""
+    invalidate_by_typename: bool = True
+    """Should mutations invalidate the queries that contain objects of the types
+    (by __typename) that the mutation returned."""
+
+    _entries: "OrderedDict[CacheKey, CacheEntry]" = OrderedDict()
+    _hits: int = 0
+    _misses: int = 0
+    _evictions: int = 0
+    _invalidations: int = 0
+
+    async def __aenter__(self) -> Self:
+        """Enters the link, and initializes an empty cache"""
+        self._entries = OrderedDict()
+        return await super().__aenter__()
+
+    def cache_key(self, operation: Operation) -> CacheKey:
+        """Builds the cache key for an operation
+
+        Parameters
+        ----------
+        operation : Operation
+            The operation
+
+        Returns
+        -------
+        CacheKey
+            The key of the operation in the cache
+        """
+        headers = canonical_json(operation.context.headers) if self.vary_on_headers else ""
+        return (
+            operation.document,
+            operation.operation_name,
+            canonical_json(operation.variables),
+            headers,
+        )
+
+    def read(self, key: Hashable, operation: Operation) -> Optional[GraphQLResult]:
+        """Get a cached result, if it exists and has not expired"""
+        entry = self._entries.get(key)  # type: ignore
+        if entry is None:
+            self._misses += 1
+            return None
+
+        if entry.expires_at is not None and entry.expires_at < time.monotonic():
+            del self._entries[key]  # type: ignore
+            self._evictions += 1
+            self._misses += 1
+            return None
+
+        self._entries.move_to_end(key)  # type: ignore
+        self._hits += 1
+        return entry.result
+
+    def write(self, key: Hashable, operation: Operation, result: GraphQLResult) -> None:
+        """Cache a result, evicting the least recently used results if the cache is full"""
+        if self.maxsize <= 0:
+            return
+
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        entry = CacheEntry(result, root_fields(operation), result_typenames(result.data), expires_at)
+        self._entries[key] = entry  # type: ignore
+        self._entries.move_to_end(key)  # type: ignore
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def update(self, operation: Operation, result: GraphQLResult) -> None:
+        """Invalidates the queries affected by a mutation"""
+        if operation.node.operation == OperationType.MUTATION:
+            fields = root_fields(operation)
+            mapped = [field for mutation_field in fields for field in self.invalidates.get(mutation_field, [])]
+            typenames = result_typenames(result.data) if self.invalidate_by_typename else frozenset()
+            self.invalidate(fields | frozenset(mapped), typenames)
+
+    def invalidate(
+        self,
+        fields: Optional[FrozenSet[str]] = None,
+        typenames: Optional[FrozenSet[str]] = None,
+    ) -> int:
+        """Invalidate cached results
+
+        Parameters
+        ----------
+        fields : Optional[FrozenSet[str]], optional
+            Invalidate results of queries with one of these root fields
+        typenames : Optional[FrozenSet[str]], optional
+            Invalidate results that contain an object of one of these types.
+            If neither fields nor typenames are given, everything is invalidated
+
+        Returns
+        -------
+        int
+            The number of invalidated results
+        """
+        if fields is None and typenames is None:
+            keys = list(self._entries)
+        else:
+            fields, typenames = fields or frozenset(), typenames or frozenset()
+            keys = [
+                key
+                for key, entry in self._entries.items()
+                if entry.root_fields & fields or entry.typenames & typenames
+            ]
+
+        for key in keys:
+            del self._entries[key]
+
+        self._invalidations += len(keys)
+        return len(keys)
+
+    def info(self) -> CacheInfo:
+        """Get the statistics of the cache"""
+        return CacheInfo(
+            hits=self._hits,
+            misses=self._misses,
+            evictions=self._evictions,
+            invalidations=self._invalidations,
+            maxsize=self.maxsize,
+            currsize=len(self._entries),
+        )
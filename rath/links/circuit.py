@@ -0,0 +1,221 @@
+from collections import deque
+import logging
+import time
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Deque,
+    Literal,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+from pydantic import Field
+
+from rath.errors import NotComposedError
+from rath.links.base import ContinuationLink
+from rath.links.errors import ContinuationLinkError
+from rath.operation import GraphQLException, GraphQLResult, Operation
+
+logger = logging.getLogger(__name__)
+
+
+CircuitState = Literal["closed", "open", "half_open"]
+
+
+class CircuitOpenError(ContinuationLinkError):
+    """Raised when an operation is rejected, because the circuit is open"""
+
+
+class CircuitInfo(NamedTuple):
+    """The state of a CircuitBreakerLink, the calls and failures in its window, and
+    the number of rejected operations and transitions since it was created"""
+
+    state: CircuitState
+    calls: int
+    failures: int
+    failure_rate: float
+    rejected: int
+    transitions: int
+
+
+class CircuitBreakerLink(ContinuationLink):
+    """CircuitBreakerLink stops sending operations to an unhealthy endpoint.
+
+    The link tracks the outcome of the operations of the last window seconds.
+    An operation fails if it raises (GraphQL errors do not count, as the endpoint
+    answered), or if its first result took longer than slow_call_duration. Once
+    the failure rate reaches failure_rate_threshold, the circuit opens and all
+    operations fail fast with a CircuitOpenError, instead of waiting for timeouts.
+
+    After reset_timeout seconds the circuit is half open: half_open_probes
+    operations are let through as probes. If they all succeed the circuit
+    closes again, if one of them fails, the circuit opens again.
+
+    Use one link per endpoint. Combined with a SplitLink, operations can fall
+    back to a secondary link while the primary one is unhealthy:
+
+    ```python
+    breaker = CircuitBreakerLink()
+    link = split(compose(breaker, primary), secondary, lambda op: breaker.available)
+    ```
+    """
+
+    window: float = 30
+    """ The duration (in seconds) of the sliding window of tracked operations """
+    minimum_calls: int = 10
+    """ The minimum number of operations in the window, before the circuit can open """
+    failure_rate_threshold: float = 0.5
+    """ The rate of failed (or slow) operations in the window that opens the circuit """
+    slow_call_duration: Optional[float] = None
+    """ The duration (in seconds) after which an operation counts as failed (None means
+    slow operations do not count as failed) """
+    reset_timeout: float = 30
+    """ The time (in seconds) the circuit stays open, before it lets probes through """
+    half_open_probes: int = 1
+    """ The number of probes that need to succeed, to close the circuit again """
+    on_transition: Optional[Callable[[CircuitState, CircuitState], Awaitable[None]]] = Field(
+        exclude=True, default=None
+    )
+    """ A function that is called with the previous and the new state on every
+    transition, e.g. to report metrics. Return is ignored. """
+
+    _state: CircuitState = "closed"
+    _calls: Deque[Tuple[float, bool]] = deque()
+    _opened_at: float = 0
+    _probes: int = 0
+    _probe_successes: int = 0
+    _rejected: int = 0
+    _transitions: int = 0
+
+    @property
+    def state(self) -> CircuitState:
+        """The current state of the circuit"""
+        if self._state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return self._state
+
+    @property
+    def available(self) -> bool:
+        """Would an operation be let through right now?"""
+        state = self.state
+        return state == "closed" or (state == "half_open" and self._probes < self.half_open_probes)
+
+    def info(self) -> CircuitInfo:
+        """Get the state and the statistics of the circuit"""
+        self._prune(time.monotonic())
+        failures = sum(1 for _, failed in self._calls if failed)
+        return CircuitInfo(
+            state=self.state,
+            calls=len(self._calls),
+            failures=failures,
+            failure_rate=failures / len(self._calls) if self._calls else 0.0,
+            rejected=self._rejected,
+            transitions=self._transitions,
+        )
+
+    def is_failure(self, error: Exception) -> bool:
+        """Checks if an error counts as a failure of the endpoint"""
+        return not isinstance(error, GraphQLException)
+
+    def _prune(self, now: float) -> None:
+        """Forget the operations that left the window"""
+        while self._calls and self._calls[0][0] < now - self.window:
+            self._calls.popleft()
+
+    async def _transition(self, state: CircuitState) -> None:
+        """Transition to a new state"""
+        previous = self._state
+        self._state = state
+        self._transitions += 1
+        if state == "open":
+            self._opened_at = time.monotonic()
+        if state == "closed":
+            self._calls.clear()
+        self._probes = 0
+        self._probe_successes = 0
+        logger.info(f"Circuit transitioned from {previous} to {state}")
+        if self.on_transition:
+            await self.on_transition(previous, state)
+
+    async def _record(self, failed: bool, probe: bool) -> None:
+        """Record the outcome of an operation, and open or close the circuit"""
+        if probe:
+            if self._state != "half_open":
+                return
+            if failed:
+                await self._transition("open")
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= self.half_open_probes:
+                await self._transition("closed")
+            return
+
+        now = time.monotonic()
+        self._calls.append((now, failed))
+        self._prune(now)
+        if self._state != "closed" or len(self._calls) < self.minimum_calls:
+            return
+
+        failures = sum(1 for _, failed in self._calls if failed)
+        if failures / len(self._calls) >= self.failure_rate_threshold:
+            await self._transition("open")
+
+    async def aexecute(self, operation: Operation) -> AsyncIterator[GraphQLResult]:
+        """Executes an operation against the link
+
+        Fails fast with a CircuitOpenError if the circuit is open, and records
+        the outcome of the operation otherwise.
+
+        Parameters
+        ----------
+        operation : Operation
+            The operation to execute
+
+        Yields
+        ------
+        GraphQLResult
+            The result of the operation
+        """
+        if not self.next:
+            raise NotComposedError("No next link set")
+
+        if self.state == "half_open" and self._state == "open":
+            await self._transition("half_open")
+
+        probe = self._state == "half_open"
+        if self._state == "open" or (probe and self._probes >= self.half_open_probes):
+            self._rejected += 1
+            raise CircuitOpenError(
+                f"Circuit is open, rejecting {operation.display_name}"
+            )
+
+        if probe:
+            self._probes += 1
+
+        recorded = False
+        start = time.monotonic()
+        try:
+            async for result in self.next.aexecute(operation):
+                if not recorded:
+                    # before yielding, as the consumer might not resume this generator
+                    recorded = True
+                    slow = (
+                        self.slow_call_duration is not None
+                        and time.monotonic() - start > self.slow_call_duration
+                    )
+                    await self._record(slow, probe)
+                yield result
+
+        except Exception as e:
+            if not recorded:
+                recorded = True
+                await self._record(self.is_failure(e), probe)
+            raise
+
+        finally:
+            if probe and not recorded and self._state == "half_open":
+                # the probe was cancelled without an outcome, let another one through
+                self._probes -= 1
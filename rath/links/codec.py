@@ -0,0 +1,182 @@
+"""JSON codecs for the terminating links.
+
+Serialization is usually the dominant CPU cost of a request, so all terminating
+links encode and decode their payloads through a JSONCodec. By default the
+fastest installed backend is used (orjson, then msgspec), falling back to the
+standard library json module. All codecs serialize datetime, date and time
+objects to ISO 8601 strings.
+"""
+
+from datetime import date, datetime, time
+import json
+from typing import Any, Callable, Optional, Type, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover
+    msgspec = None  # type: ignore
+
+
+class DateTimeEncoder(json.JSONEncoder):
+    """DateTimeEncoder is a JSONEncoder that extends the default python json decoder to serialize"""
+
+    def default(self, o: Any):  # noqa
+        """Override the default method to serialize datetime objects to ISO 8601 strings"""
+        if isinstance(o, datetime):
+            return o.isoformat()
+
+        return json.JSONEncoder.default(self, o)
+
+
+def isoformat_default(o: Any) -> Any:
+    """A `default` hook for json encoders that serializes datetimes to ISO 8601 strings"""
+    if isinstance(o, (datetime, date, time)):
+        return o.isoformat()
+
+    raise TypeError(f"Object of type {o.__class__.__name__} is not JSON serializable")
+
+
+class JSONCodec:
+    """A JSONCodec encodes and decodes the payloads of a terminating link.
+
+    Subclasses need to implement dumpb and loads. Invalid input to loads
+    must raise a ValueError (json.JSONDecodeError is a ValueError).
+    """
+
+    name: str = "abstract"
+
+    def dumps(self, obj: Any) -> str:
+        """Serialize obj to a JSON string"""
+        return self.dumpb(obj).decode("utf-8")
+
+    def dumpb(self, obj: Any) -> bytes:
+        """Serialize obj to JSON encoded bytes"""
+        raise NotImplementedError(f"Please overwrite the dumpb method in {self.__class__.__name__}")
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        """Deserialize a JSON string or bytes to a python object"""
+        raise NotImplementedError(f"Please overwrite the loads method in {self.__class__.__name__}")
+
+    def __repr__(self) -> str:
+        """Return a string representation of the codec"""
+        return f"{self.__class__.__name__}()"
+
+
+class StdlibCodec(JSONCodec):
+    """A codec that uses the standard library json module.
+
+    If no encoder class is passed, datetimes are serialized through a `default`
+    hook, which keeps the C accelerated encoder and avoids instantiating an
+    encoder for every call.
+    """
+
+    name = "json"
+
+    def __init__(self, encoder: Optional[Type[json.JSONEncoder]] = None) -> None:
+        """Initialize the codec, optionally with a custom JSONEncoder class"""
+        self.encoder = encoder
+
+    def dumps(self, obj: Any) -> str:
+        """Serialize obj to a JSON string"""
+        if self.encoder is not None:
+            return json.dumps(obj, cls=self.encoder)
+        return json.dumps(obj, default=isoformat_default, separators=(",", ":"))
+
+    def dumpb(self, obj: Any) -> bytes:
+        """Serialize obj to JSON encoded bytes"""
+        return self.dumps(obj).encode("utf-8")
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        """Deserialize a JSON string or bytes to a python object"""
+        return json.loads(data)
+
+    def __repr__(self) -> str:
+        """Return a string representation of the codec"""
+        if self.encoder is not None:
+            return f"StdlibCodec(encoder={self.encoder.__name__})"
+        return "StdlibCodec()"
+
+
+class OrjsonCodec(JSONCodec):
+    """A codec that uses orjson, which serializes datetimes natively."""
+
+    name = "orjson"
+
+    def __init__(self) -> None:
+        """Initialize the codec, requires orjson to be installed"""
+        if orjson is None:
+            raise ImportError("OrjsonCodec requires orjson. Install it with `pip install rath[orjson]`")
+
+    def dumps(self, obj: Any) -> str:
+        """Serialize obj to a JSON string"""
+        return orjson.dumps(obj).decode("utf-8")
+
+    def dumpb(self, obj: Any) -> bytes:
+        """Serialize obj to JSON encoded bytes"""
+        return orjson.dumps(obj)
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        """Deserialize a JSON string or bytes to a python object"""
+        return orjson.loads(data)
+
+
+class MsgspecCodec(JSONCodec):
+    """A codec that uses msgspec, which serializes datetimes natively."""
+
+    name = "msgspec"
+
+    def __init__(self) -> None:
+        """Initialize the codec, requires msgspec to be installed"""
+        if msgspec is None:
+            raise ImportError("MsgspecCodec requires msgspec. Install it with `pip install rath[msgspec]`")
+        self._encoder = msgspec.json.Encoder()
+        self._decoder = msgspec.json.Decoder()
+
+    def dumpb(self, obj: Any) -> bytes:
+        """Serialize obj to JSON encoded bytes"""
+        return self._encoder.encode(obj)
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        """Deserialize a JSON string or bytes to a python object"""
+        try:
+            return self._decoder.decode(data)
+        except msgspec.DecodeError as e:
+            raise ValueError(str(e)) from e
+
+
+CODECS: dict[str, Callable[[], JSONCodec]] = {
+    "orjson": OrjsonCodec,
+    "msgspec": MsgspecCodec,
+    "json": StdlibCodec,
+}
+"""All known codecs, in order of preference"""
+
+
+def get_codec(name: Optional[str] = None) -> JSONCodec:
+    """Get a codec by name, or the fastest installed codec if no name is given
+
+    Parameters
+    ----------
+    name : Optional[str], optional
+        The name of the codec ("orjson", "msgspec" or "json"), by default None
+
+    Returns
+    -------
+    JSONCodec
+        The codec
+    """
+    if name is not None:
+        if name not in CODECS:
+            raise ValueError(f"Unknown codec {name}. Available codecs are {list(CODECS)}")
+        return CODECS[name]()
+
+    if orjson is not None:
+        return OrjsonCodec()
+    if msgspec is not None:
+        return MsgspecCodec()
+    return StdlibCodec()
@@ -0,0 +1,211 @@
+import asyncio
+from collections import deque
+import logging
+import time
+from typing import AsyncIterator, Deque, NamedTuple, Self
+
+from graphql import OperationType
+from pydantic import model_validator
+
+from rath.errors import NotComposedError
+from rath.links.base import ContinuationLink
+from rath.operation import GraphQLException, GraphQLResult, Operation
+
+logger = logging.getLogger(__name__)
+
+
+class ConcurrencyInfo(NamedTuple):
+    """Statistics of a ConcurrencyLimitLink"""
+
+    limit: float
+    in_flight: int
+    queued: int
+    operations: int
+    mean_wait: float
+    max_wait: float
+    latency: float
+
+
+class ConcurrencyLimitLink(ContinuationLink):
+    """ConcurrencyLimitLink bounds the number of operations in flight.
+
+    Operations beyond the limit wait in a FIFO queue, so that they are started
+    in the order they arrived. The limit adapts to the backend with AIMD
+    (additive increase, multiplicative decrease): it grows by about one for
+    every limit operations that succeed while the link is busy, and shrinks by
+    backoff_ratio when an operation fails, or when its latency exceeds
+    latency_tolerance times the smoothed long-term latency (the latency
+    gradient, as in Netflix's concurrency-limits). The limit shrinks at most
+    once per round trip: only operations that were started after the last
+    decrease can decrease it again, so a burst of slow or failed operations
+    that were in flight together counts once.
+
+    Queries and mutations hold their slot until their result arrives.
+    Subscriptions are long lived, and are not limited.
+    """
+
+    initial_limit: float = 20
+    """ The limit the link starts with """
+    min_limit: float = 1
+    """ The lowest the limit can shrink to """
+    max_limit: float = 200
+    """ The highest the limit can grow to """
+    backoff_ratio: float = 0.9
+    """ The factor the limit is multiplied with, when the backend is overloaded """
+    latency_tolerance: float = 2.0
+    """ How much slower than the smoothed long-term latency an operation can be, before
+    it counts as a sign of overload """
+    latency_window: int = 100
+    """ The number of operations the long-term latency is smoothed over (it is the
+    mean latency until that many operations finished, and then an exponential
+    moving average over about that many operations) """
+
+    _limit: float = 0
+    _in_flight: int = 0
+    _waiters: Deque[asyncio.Future[None]] = deque()
+    _latency: float = 0
+    _samples: int = 0
+    _last_decrease: float = 0
+    _operations: int = 0
+    _total_wait: float = 0
+    _max_wait: float = 0
+
+    @model_validator(mode="after")
+    def _start_at_initial_limit(self) -> Self:
+        """Start at the initial limit"""
+        self._limit = self.initial_limit
+        return self
+
+    @property
+    def limit(self) -> float:
+        """The current concurrency limit"""
+        return self._limit
+
+    def info(self) -> ConcurrencyInfo:
+        """Get the current limit, the queue and the waiting times"""
+        return ConcurrencyInfo(
+            limit=self._limit,
+            in_flight=self._in_flight,
+            queued=len(self._waiters),
+            operations=self._operations,
+            mean_wait=self._total_wait / self._operations if self._operations else 0.0,
+            max_wait=self._max_wait,
+            latency=self._latency,
+        )
+
+    def should_limit(self, operation: Operation) -> bool:
+        """Checks if an operation is limited"""
+        return operation.node.operation != OperationType.SUBSCRIPTION
+
+    def is_overload(self, error: Exception) -> bool:
+        """Checks if an error is a sign of an overloaded backend"""
+        return not isinstance(error, GraphQLException)
+
+    def _wake(self) -> None:
+        """Start the waiting operations that fit into the limit, in order"""
+        while self._waiters and self._in_flight < int(self._limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self._in_flight += 1
+                waiter.set_result(None)
+
+    async def _acquire(self) -> None:
+        """Wait for a slot"""
+        start = time.monotonic()
+        if not self._waiters and self._in_flight < int(self._limit):
+            self._in_flight += 1
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # the slot was granted, but is not used anymore
+                    self._release()
+                elif waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                raise
+
+        wait = time.monotonic() - start
+        self._operations += 1
+        self._total_wait += wait
+        self._max_wait = max(self._max_wait, wait)
+
+    def _release(self) -> None:
+        """Give a slot back"""
+        self._in_flight -= 1
+        self._wake()
+
+    def _observe(self, latency: float) -> None:
+        """Add a latency to the smoothed long-term latency"""
+        self._samples += 1
+        if self._samples <= self.latency_window:
+            # warm up with the mean, so that the first latencies do not dominate
+            self._latency += (latency - self._latency) / self._samples
+        else:
+            self._latency += (latency - self._latency) * 2 / (self.latency_window + 1)
+
+    def _adapt(self, latency: float, overloaded: bool, started_at: float) -> None:
+        """Adapt the limit to the outcome of an operation that started at started_at"""
+        if not overloaded and self._samples and latency > self.latency_tolerance * self._latency:
+            overloaded = True
+        self._observe(latency)
+
+        if overloaded:
+            if started_at < self._last_decrease:
+                # the operation was in flight when the limit was decreased, the
+                # backend was already given time to recover from it
+                return
+            self._last_decrease = time.monotonic()
+            self._limit = max(self.min_limit, self._limit * self.backoff_ratio)
+            logger.debug(f"Backend overloaded, decreasing concurrency limit to {self._limit:.1f}")
+        elif self._in_flight >= self._limit / 2:
+            # only grow when the limit is actually used
+            self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+
+    async def aexecute(self, operation: Operation) -> AsyncIterator[GraphQLResult]:
+        """Executes an operation against the link
+
+        Waits for a slot before the operation is passed to the next link.
+
+        Parameters
+        ----------
+        operation : Operation
+            The operation to execute
+
+        Yields
+        ------
+        GraphQLResult
+            The result of the operation
+        """
+        if not self.next:
+            raise NotComposedError("No next link set")
+
+        if not self.should_limit(operation):
+            async for result in self.next.aexecute(operation):
+                yield result
+            return
+
+        await self._acquire()
+        released = False
+        start = time.monotonic()
+        try:
+            async for result in self.next.aexecute(operation):
+                if not released:
+                    # before yielding, as the consumer might not resume this generator
+                    released = True
+                    self._adapt(time.monotonic() - start, False, start)
+                    self._release()
+                yield result
+
+        except Exception as e:
+            if not released:
+                released = True
+                self._adapt(time.monotonic() - start, self.is_overload(e), start)
+                self._release()
+            raise
+
+        finally:
+            if not released:
+                self._release()
@@ -0,0 +1,151 @@
+import asyncio
+from typing import Any, AsyncIterator, Dict, Optional, Self, Tuple, Type
+
+from graphql import OperationType
+
+from rath.errors import NotComposedError
+from rath.links.base import ContinuationLink
+from rath.links.cache import canonical_json
+from rath.links.incremental import uses_incremental_delivery
+from rath.operation import GraphQLResult, Operation
+
+
+DedupKey = Tuple[str, Optional[str], str, str]
+
+
+class InFlight:
+    """A query that is in flight, and the number of callers waiting for it"""
+
+    def __init__(self, task: "asyncio.Task[Optional[GraphQLResult]]") -> None:
+        """Initialize the in-flight query with the task that executes it"""
+        self.task = task
+        self.waiters = 0
+
+
+class DedupLink(ContinuationLink):
+    """DedupLink is a link that deduplicates identical in-flight queries.
+
+    A query that is identical to a query that is still in flight (same document,
+    operation name, canonicalized variables and headers) is not sent again, but
+    attached to the result of the first query. N identical concurrent queries
+    therefore cost one round-trip. The query is only cancelled once all callers
+    waiting for it are cancelled.
+
+    Mutations, subscriptions and operations with files are forwarded unchanged.
+    The shared result must not be mutated by the callers.
+    """
+
+    _inflight: Dict[DedupKey, InFlight] = {}
+    _deduplicated: int = 0
+
+    async def __aenter__(self) -> Self:
+        """Enters the link"""
+        self._inflight = {}
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_val: Optional[BaseException],
+        traceback: Optional[Any],
+    ) -> None:
+        """Exits the link, cancelling the queries that are still in flight"""
+        tasks = [inflight.task for inflight in self._inflight.values()]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._inflight = {}
+
+    def should_dedup(self, operation: Operation) -> bool:
+        """Decides if an operation can be deduplicated (only queries without files, that are not streamed or delivered incrementally)"""
+        return (
+            operation.node.operation == OperationType.QUERY
+            and not operation.context.files
+            and not operation.context.stream_path
+            and not uses_incremental_delivery(operation)
+        )
+
+    def dedup_key(self, operation: Operation) -> DedupKey:
+        """Builds the key that identifies identical queries
+
+        Parameters
+        ----------
+        operation : Operation
+            The operation
+
+        Returns
+        -------
+        DedupKey
+            The key of the operation
+        """
+        return (
+            operation.document,
+            operation.operation_name,
+            canonical_json(operation.variables),
+            canonical_json(operation.context.headers),
+        )
+
+    @property
+    def deduplicated(self) -> int:
+        """The number of queries that were attached to an in-flight query"""
+        return self._deduplicated
+
+    async def _afetch(self, operation: Operation) -> Optional[GraphQLResult]:
+        """Executes the query on the next link, and returns its first result"""
+        assert self.next, "No next link set"
+
+        async for result in self.next.aexecute(operation):
+            return result
+        return None
+
+    async def aexecute(self, operation: Operation) -> AsyncIterator[GraphQLResult]:
+        """Executes an operation against the link
+
+        Parameters
+        ----------
+        operation : Operation
+            The operation to execute
+
+        Yields
+        ------
+        GraphQLResult
+            The result of the operation
+        """
+        if not self.next:
+            raise NotComposedError("No next link set")
+
+        if not self.should_dedup(operation):
+            async for result in self.next.aexecute(operation):
+                yield result
+            return
+
+        key = self.dedup_key(operation)
+        inflight = self._inflight.get(key)
+        if inflight is None or inflight.task.done():
+            inflight = InFlight(asyncio.create_task(self._afetch(operation)))
+            self._inflight[key] = inflight
+            inflight.task.add_done_callback(lambda _: self._forget(key, inflight))
+        else:
+            self._deduplicated += 1
+
+        inflight.waiters += 1
+        try:
+            result = await asyncio.shield(inflight.task)
+        except asyncio.CancelledError:
+            if not inflight.task.done() and inflight.waiters == 1:
+                # forget the query first, so that callers arriving before the task
+                # finishes cancelling start a new query instead of attaching to it
+                self._forget(key, inflight)
+                inflight.task.cancel()
+            raise
+        finally:
+            inflight.waiters -= 1
+
+        if result is not None:
+            yield result
+
+    def _forget(self, key: DedupKey, inflight: InFlight) -> None:
+        """Removes a finished query, so that later queries are sent again"""
+        if self._inflight.get(key) is inflight:
+            del self._inflight[key]
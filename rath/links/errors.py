@@ -1,3 +1,5 @@
+from typing import Optional
+
 from rath.errors import RathException
 
 
@@ -30,6 +32,37 @@ class TerminatingLinkError(LinkError):
     This is a base class for all terminating link errors."""
 
 
+class HTTPStatusError(TerminatingLinkError):
+    """Raised when the server answers with a status that signals a (possibly transient)
+    failure, e.g. 429 (Too Many Requests) or 503 (Service Unavailable).
+
+    The status and the Retry-After header of the response (if any) are kept, so
+    that links like the RetryLink can decide if and when to retry."""
+
+    def __init__(self, message: str, status: int, retry_after: Optional[float] = None) -> None:
+        """Initialize the error
+
+        Parameters
+        ----------
+        message : str
+            The message of the error
+        status : int
+            The HTTP status of the response
+        retry_after : Optional[float], optional
+            The seconds the server asked to wait before retrying, by default None
+        """
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class SendQueueFullError(TerminatingLinkError):
+    """Raised when an operation can not be started, because too many messages are
+    waiting to be sent (e.g. while a websocket link reconnects)."""
+
+    pass
+
+
 class ContinuationLinkError(LinkError):
     """Raised when a continuation link is called an errors.
 
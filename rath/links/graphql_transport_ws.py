@@ -0,0 +1,119 @@
+import asyncio
+from typing import Any, ClassVar, Dict
+
+from rath.links.graphql_ws import (
+    GQL_COMPLETE,
+    GQL_PING,
+    GQL_PONG,
+    RESUME_EXTENSION,
+    GraphQLWSLink,
+    TransportMessage,
+)
+from rath.operation import Operation
+
+
+GQL_TRANSPORT_WS_SUBPROTOCOL = "graphql-transport-ws"
+
+# the message types that differ from the graphql-ws protocol
+GQL_SUBSCRIBE = "subscribe"
+GQL_NEXT = "next"
+
+
+class GraphQLTransportWSLink(GraphQLWSLink):
+    """GraphQLTransportWSLink is a terminating link that sends operations over websockets
+    using the graphql-transport-ws protocol (the protocol of the `graphql-ws` library).
+    This is the current standard protocol, and should be used for new projects.
+
+    It shares the connection management, reconnects and the multiplexing of
+    operations with the GraphQLWSLink, but starts operations with `subscribe`
+    and receives their results as `next` messages. Instead of keep-alive messages
+    the server and client ping each other: pings of the server are answered with
+    a pong, and if heartbeat_interval_ms is set, the link pings the server in
+    that interval.
+
+    This is a terminating link, so it should be the last link in the chain.
+    This is a stateful link, keeing a connection open and sending messages over it.
+    """
+
+    subprotocol: ClassVar[str] = GQL_TRANSPORT_WS_SUBPROTOCOL
+    data_type: ClassVar[str] = GQL_NEXT
+
+    def build_start_message(self, operation: Operation) -> Dict[str, Any]:
+        """Builds the subscribe message of an operation
+
+        Parameters
+        ----------
+        operation : Operation
+            The operation to start
+
+        Returns
+        -------
+        Dict[str, Any]
+            The message
+        """
+        payload: Dict[str, Any] = {
+            "query": operation.document,
+            "variables": operation.variables,
+        }
+        if operation.operation_name:
+            payload["operationName"] = operation.operation_name
+        extensions = {key: value for key, value in operation.context.extensions.items() if key != RESUME_EXTENSION}
+        if extensions:
+            payload["extensions"] = extensions
+
+        return {"id": operation.id, "type": GQL_SUBSCRIBE, "payload": payload}
+
+    def build_stop_message(self, id: str) -> Dict[str, Any]:
+        """Builds the message that completes the operation with the given id"""
+        return {"id": id, "type": GQL_COMPLETE}
+
+    async def sending(self, client: Any, initiating_operation: Operation) -> None:
+        """The sending task
+
+        Sends the messages of the send queue, and pings the server every
+        heartbeat_interval_ms (if set). It should not be called manually,
+        but is called automatically by the websocket loop.
+
+        Parameters
+        ----------
+        client : websocket.Client
+            The websockets client
+        initiating_operation : Operation
+            The initiating operation
+        """
+        if not self.heartbeat_interval_ms:
+            return await super().sending(client, initiating_operation)
+
+        heartbeat_task = asyncio.create_task(self.heartbeat())
+        try:
+            await super().sending(client, initiating_operation)
+        finally:
+            heartbeat_task.cancel()
+            await asyncio.gather(heartbeat_task, return_exceptions=True)
+
+    async def heartbeat(self) -> None:
+        """Pings the server every heartbeat_interval_ms"""
+        assert self.heartbeat_interval_ms, "No heartbeat interval set"
+
+        ping = self.codec.dumps({"type": GQL_PING})
+        while True:
+            await asyncio.sleep(self.heartbeat_interval_ms / 1000)
+            await self.aforward(ping, control=True)
+
+    async def broadcast(
+        self, message: TransportMessage, initial_connection_future: asyncio.Future[bool]
+    ) -> None:
+        """Broadcasts a message to all subscriptions"""
+        if message["type"] == GQL_PONG:
+            if self.on_pong:
+                await self.on_pong(message.get("payload", {}))
+            return
+
+        if message["type"] == GQL_PING:
+            # answer pings of the server, without treating them as a pong
+            await self.aforward(
+                self.codec.dumps({"type": GQL_PONG, "payload": message.get("payload", {})}), control=True
+            )
+            return
+
+        await super().broadcast(message, initial_connection_future)
@@ -3,11 +3,14 @@ from typing import (
     AsyncIterator,
     Awaitable,
     Callable,
+    ClassVar,
     Dict,
+    List,
     Literal,
     Optional,
     Any,
     Self,
+    Set,
     Type,
     TypedDict,
     NotRequired,
@@ -15,20 +18,23 @@ from typing import (
 from graphql import OperationType
 from pydantic import Field
 import websockets
-import json
 import asyncio
 import logging
+import random
 import ssl
 import certifi
 from rath.links.errors import LinkNotConnectedError, TerminatingLinkError
 
 from rath.operation import (
+    OverflowPolicy,
     GraphQLException,
     GraphQLResult,
     Operation,
     SubscriptionDisconnect,
 )
-from rath.links.base import AsyncTerminatingLink
+from rath.buffer import SubscriptionQueue
+from rath.links.codec import JSONCodec, get_codec
+from rath.links.websocket import QueuedWebsocketLink
 
 
 logger = logging.getLogger(__name__)
@@ -54,6 +60,21 @@ GQL_PONG = "pong"
 WEBSOCKET_DEAD = "websocket_dead"
 WEBSOCKET_CANCELLED = "websocket_cancelled"
 
+RESUME_EXTENSION = "resume"
+"""The key of a resume cursor in the context extensions of a subscription, e.g.
+`{"variable": "since", "path": ["events", "cursor"]}`. The value at path of every
+event is remembered, and passed as the variable when the subscription is restarted
+after a reconnect."""
+
+
+def get_path(data: Any, path: List[str]) -> Any:
+    """Get the value at path in the data of an event (None if it does not exist)"""
+    for key in path:
+        if not isinstance(data, dict):
+            return None
+        data = data.get(key)
+    return data
+
 
 class CorrectableConnectionFail(TerminatingLinkError):
     """A CorrectableConnectionFail is raised when a connection fails, but can be recovered from"""
@@ -97,6 +118,7 @@ class TransportMessage(TypedDict):
         "ping",
         "pong",
         "data",
+        "next",
         "error",
         "complete",
         "websocket_dead",
@@ -105,10 +127,11 @@ class TransportMessage(TypedDict):
     error: NotRequired[Exception]
 
 
-class GraphQLWSLink(AsyncTerminatingLink):
+class GraphQLWSLink(QueuedWebsocketLink):
     """GraphQLWSLink is a terminating link that sends operations over websockets using
-      websockets via the graphql-ws protocol. This is a
-      new standard protocol, and should not be used for new projects.
+      websockets via the graphql-ws protocol. This is the legacy protocol of
+      subscriptions-transport-ws, new projects should use the
+      GraphQLTransportWSLink (graphql-transport-ws protocol).
 
     This is a terminating link, so it should be the last link in the chain.
     This is a stateful link, keeing a connection open and sending messages over it.
@@ -120,12 +143,21 @@ class GraphQLWSLink(AsyncTerminatingLink):
     allow_reconnect: bool = True
     """ Should the websocket try to reconnect if it fails """
     time_between_retries: float = 4
-    """ The sleep time between retries """
+    """ The base sleep time between retries, that is doubled with every retry (with jitter) """
+    max_time_between_retries: float = 60
+    """ The maximum sleep time between retries """
     max_retries: int = 3
-    """ The maximum amount of retries before giving up """
+    """ The maximum amount of retries (since the last successful connection) before giving up """
+    resubscribe_on_reconnect: bool = True
+    """ Should live subscriptions be restarted transparently after a reconnect. If disabled,
+    every subscription raises a SubscriptionDisconnect when the websocket dies. Subscriptions
+    that set a resume cursor in their context extensions (see RESUME_EXTENSION) are restarted
+    from the last cursor they received """
     ssl_context: SSLContext = Field(
         default_factory=lambda: ssl.create_default_context(cafile=certifi.where())
     )
+    codec: JSONCodec = Field(default_factory=get_codec, exclude=True)
+    """ The JSONCodec used to encode and decode messages """
 
     on_connect: Optional[Callable[[InitialConnectPayload], Awaitable[None]]] = Field(
         exclude=True, default=None
@@ -140,35 +172,40 @@ class GraphQLWSLink(AsyncTerminatingLink):
     """ The heartbeat interval in milliseconds (None means no heartbeats are 
     being send) """
 
+    subscription_buffer_size: int = 0
+    """ The number of events that are buffered for each subscription (0 means unbounded).
+    Can be set per operation with the buffer_size of its context """
+    overflow_policy: OverflowPolicy = "block"
+    """ What happens when the buffer of a subscription is full: block the receiver,
+    drop the oldest or the newest event, or only keep the latest event. Can be set per
+    operation with the overflow_policy of its context """
+
+    subprotocol: ClassVar[str] = GQL_WS_SUBPROTOCOL
+    """ The websocket subprotocol of the link """
+    data_type: ClassVar[str] = GQL_DATA
+    """ The message type of the results of an operation """
+
     _connection_lock: Optional[asyncio.Lock] = None
     _connected: bool = False
     _alive: bool = False
-    _send_queue: Optional[asyncio.Queue[str]] = None
     _connection_task: Optional[asyncio.Task[None]] = None
-    _ongoing_subscriptions: Optional[Dict[str, asyncio.Queue[TransportMessage]]] = None
-
-    async def aforward(self, message: str) -> None:
-        """Forward a message to the server
-
-        Puts the message in the send queue. If the queue is full, this will block until
-        the queue is not full anymore.
-
-        Parameters
-        ----------
-        message : str
-            The message to send
-        """
-        if not self._send_queue:
-            raise LinkNotConnectedError("Link is not connected")
-
-        await self._send_queue.put(message)
+    _ongoing_subscriptions: Optional[Dict[str, SubscriptionQueue[TransportMessage]]] = None
+    _live_subscriptions: Dict[str, Operation] = {}
+    _pending_resubscriptions: Set[str] = set()
+    _resume_cursors: Dict[str, Any] = {}
+    _acknowledged: bool = False
+    _ack_event: Optional[asyncio.Event] = None
+    _connection_dead: bool = False
 
     async def __aenter__(self) -> Self:
         """Enter the link, and initialize the connection"""
 
         self._ongoing_subscriptions = {}
+        self._live_subscriptions = {}
+        self._pending_resubscriptions = set()
+        self._resume_cursors = {}
         self._connection_lock = asyncio.Lock()
-        self._send_queue = asyncio.Queue()
+        self.open_send_queue()
         return self
 
     async def aconnect(self, operation: Operation) -> None:
@@ -234,101 +271,160 @@ class GraphQLWSLink(AsyncTerminatingLink):
         """The main websocket loop
 
         This is the main loop that handles the websocket connection.
-        It handles all the sending and receiving of messages.
+        It handles all the sending and receiving of messages, and reconnects
+        (in this loop, not recursively) until it is cancelled or gives up.
         """
-        send_task = None
-        receive_task = None
-        try:
+        while True:
+            send_task = None
+            receive_task = None
+            self._acknowledged = False
+            self._ack_event = asyncio.Event()
             try:
-                url = await self.abuild_url(initiating_operation)
-                async with websockets.connect(  # type: ignore
-                    url,
-                    subprotocols=[
-                        GQL_WS_SUBPROTOCOL,  # type: ignore
-                    ],
-                    ssl=self.ssl_context if url.startswith("wss") else None,
-                ) as client:  # type: ignore
-                    logger.info("Websocket successfully connected")
-
-                    send_task = asyncio.create_task(
-                        self.sending(
-                            client,
-                            initiating_operation,
+                try:
+                    url = await self.abuild_url(initiating_operation)
+                    async with websockets.connect(  # type: ignore
+                        url,
+                        subprotocols=[
+                            self.subprotocol,  # type: ignore
+                        ],
+                        ssl=self.ssl_context if url.startswith("wss") else None,
+                    ) as client:  # type: ignore
+                        logger.info("Websocket successfully connected")
+
+                        send_task = asyncio.create_task(
+                            self.sending(
+                                client,
+                                initiating_operation,
+                            )
                         )
-                    )
-                    receive_task = asyncio.create_task(
-                        self.receiving(client, initial_connection_future)
-                    )
+                        receive_task = asyncio.create_task(
+                            self.receiving(client, initial_connection_future)
+                        )
+
+                        self._alive = True
+                        done, pending = await asyncio.wait(
+                            (send_task, receive_task),
+                            return_when=asyncio.FIRST_COMPLETED,
+                        )
+                        self._alive = False
+
+                        for task in pending:
+                            task.cancel()
 
-                    self._alive = True
-                    done, pending = await asyncio.wait(
-                        (send_task, receive_task),
-                        return_when=asyncio.FIRST_EXCEPTION,
+                        for task in done:
+                            exception = task.exception()
+                            if exception:
+                                raise exception
+                            else:
+                                raise CorrectableConnectionFail(
+                                    f"Websocket connection closed without exception: This is unexpected behaviours. Results ist {task.result()}"
+                                )
+
+                except Exception as e:
+                    logger.warning(
+                        f"Websocket excepted. Trying to recover for the {retry + 1}/{self.max_retries} time",
+                        exc_info=True,
                     )
-                    self._alive = False
-
-                    for task in pending:
-                        task.cancel()
-
-                    for task in done:
-                        exception = task.exception()
-                        if exception:
-                            raise exception
-                        else:
-                            raise CorrectableConnectionFail(
-                                f"Websocket connection closed without exception: This is unexpected behaviours. Results ist {task.result()}"
-                            )
+                    raise CorrectableConnectionFail from e
 
-            except Exception as e:
-                logger.warning(
-                    f"Websocket excepted. Trying to recover for the {retry + 1}/{self.max_retries} time",
-                    exc_info=True,
+            except CorrectableConnectionFail as e:
+                logger.info(
+                    f"Trying to Recover from Exception {e} Reconnect is {self.allow_reconnect} Retry: {retry}"
                 )
-                raise CorrectableConnectionFail from e
+                if self._acknowledged:
+                    # the connection was established, so this is a new series of failures
+                    retry = 0
+
+                if retry > self.max_retries or not self.allow_reconnect:
+                    logger.error("Max retries reached. Aborting")
+                    # nothing will be resumed anymore, so every operation needs to know
+                    self._live_subscriptions = {}
+                    await self.broadcast(
+                        {"type": WEBSOCKET_DEAD, "error": e}, initial_connection_future
+                    )
+                    if not initial_connection_future.done():
+                        initial_connection_future.set_exception(
+                            DefiniteConnectionFail("Could not connect to the websocket")
+                        )
+                    self._connection_dead = True
+                    raise DefiniteConnectionFail("Exceeded Number of Retries")
+
+                # live subscriptions are restarted by aresubscribe once the next connection
+                # is acknowledged, and all other operations are told that the websocket
+                # died, so sending what was queued for the failed connection would start
+                # operations twice
+                self.discard_send_queue()
+                # operations that are not resubscribed need to know about the disconnect
+                await self.broadcast(
+                    {"type": WEBSOCKET_DEAD, "error": e}, initial_connection_future
+                )
+                self._pending_resubscriptions = set(self._live_subscriptions)
+
+            except asyncio.CancelledError as e:
+                logger.info("Websocket got cancelled. Trying to shutdown graceully")
+                if send_task and receive_task:
+                    send_task.cancel()
+                    receive_task.cancel()
 
-        except CorrectableConnectionFail as e:
-            logger.info(
-                f"Trying to Recover from Exception {e} Reconnect is {self.allow_reconnect} Retry: {retry}"
-            )
-            if retry > self.max_retries or not self.allow_reconnect:
-                logger.error("Max retries reached. Aborting")
-                raise DefiniteConnectionFail("Exceeded Number of Retries")
+                    await asyncio.gather(
+                        send_task, receive_task, return_exceptions=True
+                    )  # wait for the tasks to finish
+                raise e
 
-            await asyncio.sleep(self.time_between_retries)
+            except Exception as e:
+                logger.error("Websocket excepted", exc_info=True)
+                self._connection_dead = True
+                raise e
+
+            # reconnect outside of the except block, so that every reconnect
+            # neither nests a frame nor chains the previous failure
+            await asyncio.sleep(self.retry_delay(retry))
             logger.info("Retrying to connect")
-            await self.broadcast(
-                {"type": WEBSOCKET_DEAD, "error": e}, initial_connection_future
-            )
-            await self.websocket_loop(
-                initiating_operation, initial_connection_future, retry=retry + 1
-            )
-
-        except DefiniteConnectionFail as e:
-            logger.error("Websocket excepted closed definetely", exc_info=True)
-            self.connection_dead = True
-            raise e
+            retry += 1
 
-        except asyncio.CancelledError as e:
-            logger.info("Websocket got cancelled. Trying to shutdown graceully")
-            if send_task and receive_task:
-                send_task.cancel()
-                receive_task.cancel()
-
-                await asyncio.gather(
-                    send_task, receive_task, return_exceptions=True
-                )  # wait for the tasks to finish
-            raise e
+    def retry_delay(self, retry: int) -> float:
+        """The sleep time before the given retry
 
-        except Exception as e:
-            logger.error("Websocket excepted", exc_info=True)
-            self.connection_dead = True
-            raise e
+        The delay grows exponentially from time_between_retries up to
+        max_time_between_retries, and is jittered so that many clients that
+        lost their connection at the same time do not reconnect at once.
+
+        Parameters
+        ----------
+        retry : int
+            The number of the retry (starting at 0)
+
+        Returns
+        -------
+        float
+            The delay in seconds
+        """
+        delay = min(self.max_time_between_retries, self.time_between_retries * 2**retry)
+        return random.uniform(delay / 2, delay)
+
+    async def aresubscribe(self) -> None:
+        """Restarts the live subscriptions that were started on a previous connection"""
+        pending, self._pending_resubscriptions = self._pending_resubscriptions, set()
+
+        for id in pending:
+            operation = self._live_subscriptions.get(id)
+            if operation is None:
+                continue
+
+            resume = operation.context.extensions.get(RESUME_EXTENSION)
+            if resume and id in self._resume_cursors:
+                variables = {**operation.variables, resume["variable"]: self._resume_cursors[id]}
+                operation = operation.model_copy(update={"variables": variables})
+
+            logger.info(f"Resubscribing {operation.display_name} ({id})")
+            await self.aforward(self.codec.dumps(self.build_start_message(operation)), control=True)
 
     async def sending(self, client: Any, initiating_operation: Operation) -> None:
         """The sending task
 
         This method is the sending task. It will send messages to the websocket
-        as they are put into the send queue.  It should not be called manually.
+        as they are put into the send queue, once the server acknowledged the
+        connection. It should not be called manually.
         but is called automatically by the websocket loop.
 
 
@@ -345,17 +441,14 @@ class GraphQLWSLink(AsyncTerminatingLink):
             "type": GQL_CONNECTION_INIT,
             "payload": initiating_operation.context.initial_payload,
         }
-        await client.send(json.dumps(payload))
+        await client.send(self.codec.dumps(payload))
 
-        try:
-            while True:
-                if not self._send_queue:
-                    raise LinkNotConnectedError("Link is not connected")
+        # operations may only be started once the server acknowledged the connection
+        if self._ack_event:
+            await self._ack_event.wait()
 
-                message = await self._send_queue.get()
-                logger.debug("GraphQL Websocket: >>>>>> " + message)
-                await client.send(message)
-                self._send_queue.task_done()
+        try:
+            await self.adrain_send_queue(client)
         except asyncio.CancelledError as e:
             logger.debug("Sending Task sucessfully Cancelled")  #
             raise e
@@ -381,14 +474,15 @@ class GraphQLWSLink(AsyncTerminatingLink):
             async for message in client:
                 logger.debug("GraphQL Websocket: <<<<<<< " + message)
                 try:
-                    message = json.loads(message)
-                    await self.broadcast(message, initial_connection_future)
-                except json.JSONDecodeError as err:
+                    message = self.codec.loads(message)
+                except ValueError as err:
                     logger.warning(
                         "Ignoring. Server sent invalid JSON data: %s \n %s",
                         message,
                         err,
                     )
+                    continue
+                await self.broadcast(message, initial_connection_future)
         except Exception as e:
             logger.warning("Websocket excepted. Trying to recover", exc_info=True)
             raise e
@@ -402,7 +496,13 @@ class GraphQLWSLink(AsyncTerminatingLink):
         if type == GQL_CONNECTION_ACK:
             if self.on_connect:
                 await self.on_connect(message.get("payload", {}))
-            initial_connection_future.set_result(True)
+            self._acknowledged = True
+            if self._ack_event:
+                self._ack_event.set()
+            if not initial_connection_future.done():
+                initial_connection_future.set_result(True)
+            if self._pending_resubscriptions:
+                await self.aresubscribe()
             return
 
         if type == GQL_PING:
@@ -410,7 +510,7 @@ class GraphQLWSLink(AsyncTerminatingLink):
                 await self.on_pong(message.get("payload", {}))
 
             payload = message.get("payload", {})
-            await self.aforward(json.dumps({"type": GQL_PONG, "payload": payload}))
+            await self.aforward(self.codec.dumps({"type": GQL_PONG, "payload": payload}), control=True)
 
         if type == GQL_CONNECTION_KEEP_ALIVE:
             return
@@ -420,11 +520,12 @@ class GraphQLWSLink(AsyncTerminatingLink):
             if not self._ongoing_subscriptions:
                 self._ongoing_subscriptions = {}
 
-            for subscription in self._ongoing_subscriptions.values():
-                await subscription.put(message)
+            for id, subscription in self._ongoing_subscriptions.items():
+                if id not in self._live_subscriptions:
+                    await subscription.put_event(message, droppable=False)
             return
 
-        if type in [GQL_DATA, GQL_COMPLETE, GQL_ERROR]:
+        if type in [self.data_type, GQL_COMPLETE, GQL_ERROR]:
             if not self._ongoing_subscriptions:
                 self._ongoing_subscriptions = {}
 
@@ -432,16 +533,47 @@ class GraphQLWSLink(AsyncTerminatingLink):
                 raise InvalidPayload(f"Protocol Violation. Expected 'id' in {message}")
 
             id = message["id"]
-            assert id in self._ongoing_subscriptions, (
-                "Received Result for subscription that is no longer or was never active"
-            )
-            await self._ongoing_subscriptions[id].put(message)
+            if id not in self._ongoing_subscriptions:
+                # e.g. the complete message of a query, that already returned its result
+                logger.debug(f"Ignoring message for operation {id} that is no longer active")
+                return
+            await self._ongoing_subscriptions[id].put_event(message, droppable=type == self.data_type)
+
+    def build_start_message(self, operation: Operation) -> Dict[str, Any]:
+        """Builds the message that starts an operation
+
+        Parameters
+        ----------
+        operation : Operation
+            The operation to start
+
+        Returns
+        -------
+        Dict[str, Any]
+            The message
+        """
+        return {
+            "id": operation.id,
+            "type": GQL_START,
+            "payload": {
+                "headers": operation.context.headers,
+                "query": operation.document,
+                "variables": operation.variables,
+            },
+        }
+
+    def build_stop_message(self, id: str) -> Dict[str, Any]:
+        """Builds the message that stops the operation with the given id"""
+        return {"id": id, "type": GQL_STOP}
 
     async def aexecute(self, operation: Operation) -> AsyncIterator[GraphQLResult]:
         """Executes an operation against the link
 
         This link will send the operation to the websocket, and then
-        wait for the result.
+        wait for the result. Queries and mutations are multiplexed over the
+        same connection as subscriptions, and return after their first result.
+        Operations that are started while the link reconnects are sent once the
+        new connection is acknowledged.
 
         Parameters
         ----------
@@ -461,31 +593,26 @@ class GraphQLWSLink(AsyncTerminatingLink):
                 # we need to start a new connection
                 await self.aconnect(operation)
 
-        assert operation.node.operation == OperationType.SUBSCRIPTION, (
-            "Operation is not a subscription"
-        )
         assert not operation.context.files, "We cannot send files through websockets"
 
         id = operation.id
-        subscribe_queue: asyncio.Queue[TransportMessage] = asyncio.Queue()  # type: ignore
+        is_subscription = operation.node.operation == OperationType.SUBSCRIPTION
+        subscribe_queue: SubscriptionQueue[TransportMessage] = SubscriptionQueue(
+            operation.context.buffer_size
+            if operation.context.buffer_size is not None
+            else self.subscription_buffer_size,
+            operation.context.overflow_policy or self.overflow_policy,
+        )
         if not self._ongoing_subscriptions:
             self._ongoing_subscriptions = {}
 
         self._ongoing_subscriptions[id] = subscribe_queue
-
-        send_payload: Dict[str, Any] = {
-            "headers": operation.context.headers,
-            "query": operation.document,
-            "variables": operation.variables,
-        }
+        if is_subscription and self.resubscribe_on_reconnect:
+            self._live_subscriptions[id] = operation
+        resume = operation.context.extensions.get(RESUME_EXTENSION)
 
         try:
-            frame: Dict[str, Any] = {
-                "id": id,
-                "type": GQL_START,
-                "payload": send_payload,
-            }
-            await self.aforward(json.dumps(frame))
+            await self.aforward(self.codec.dumps(self.build_start_message(operation)))
             logger.debug(f"Subcription started {operation}")
 
             while True:
@@ -505,9 +632,9 @@ class GraphQLWSLink(AsyncTerminatingLink):
                         "\n".join([e["message"] for e in error_list])
                     )
 
-                if answer["type"] == GQL_DATA:
+                if answer["type"] == self.data_type:
                     assert "payload" in answer, (
-                        "Protocol Violation. Expected 'payload' in GQL_DATA"
+                        f"Protocol Violation. Expected 'payload' in {self.data_type}"
                     )
                     payload = answer["payload"]
 
@@ -517,6 +644,18 @@ class GraphQLWSLink(AsyncTerminatingLink):
                         )
 
                     if "data" in payload:
+                        if not is_subscription:
+                            # single result operations are done now, forget them before
+                            # yielding, as the consumer might not resume this generator
+                            self._ongoing_subscriptions.pop(id, None)
+                            yield GraphQLResult(data=payload["data"])
+                            return
+
+                        if resume:
+                            cursor = get_path(payload["data"], resume["path"])
+                            if cursor is not None:
+                                self._resume_cursors[id] = cursor
+
                         yield GraphQLResult(data=payload["data"])
                         subscribe_queue.task_done()
 
@@ -531,5 +670,11 @@ class GraphQLWSLink(AsyncTerminatingLink):
 
         except asyncio.CancelledError as e:
             logger.debug(f"Subcription ended {operation}")
-            await self.aforward(json.dumps({"id": id, "type": GQL_STOP}))
+            await self.aforward(self.codec.dumps(self.build_stop_message(id)), control=True)
             raise e
+
+        finally:
+            if self._ongoing_subscriptions:
+                self._ongoing_subscriptions.pop(id, None)
+            self._live_subscriptions.pop(id, None)
+            self._resume_cursors.pop(id, None)
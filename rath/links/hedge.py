@@ -0,0 +1,172 @@
+import asyncio
+from collections import deque
+import logging
+import time
+from typing import AsyncIterator, Deque, NamedTuple, Optional
+
+from graphql import OperationType
+
+from rath.errors import NotComposedError
+from rath.links.base import ContinuationLink
+from rath.links.incremental import uses_incremental_delivery
+from rath.operation import GraphQLResult, Operation, new_operation_id
+
+logger = logging.getLogger(__name__)
+
+
+class HedgeInfo(NamedTuple):
+    """Statistics of a HedgeLink"""
+
+    queries: int
+    hedged: int
+    hedge_wins: int
+    delay: Optional[float]
+
+
+class HedgeLink(ContinuationLink):
+    """HedgeLink reduces the tail latency of queries by hedging them.
+
+    If a query has not answered after a delay, an identical copy of it is sent
+    down the chain. Whichever attempt answers first is used, and the other one
+    is cancelled. The delay is either fixed (hedge_delay), or the observed
+    latency percentile (hedge_percentile) of the last queries, so that only the
+    slowest queries are hedged.
+
+    Only queries are hedged, as mutations and subscriptions are not idempotent.
+    To not overload a degraded backend, the link hedges at most max_hedge_rate
+    of the queries.
+    """
+
+    hedge_delay: Optional[float] = None
+    """ The time (in seconds) after which a query is hedged. If None, the
+    hedge_percentile of the observed latencies is used """
+    hedge_percentile: float = 0.95
+    """ The percentile of the observed latencies after which a query is hedged """
+    latency_window: int = 100
+    """ The number of latencies the percentile is computed from """
+    min_samples: int = 20
+    """ The number of observed latencies needed, before queries are hedged by percentile """
+    max_hedge_rate: float = 0.1
+    """ The maximum fraction of queries that are hedged """
+
+    _latencies: Deque[float] = deque()
+    _hedge_tokens: float = 1
+    _queries: int = 0
+    _hedged: int = 0
+    _hedge_wins: int = 0
+
+    def current_delay(self) -> Optional[float]:
+        """The delay after which a query is hedged (None if it is not hedged)"""
+        if self.hedge_delay is not None:
+            return self.hedge_delay
+        if len(self._latencies) < self.min_samples:
+            return None
+
+        latencies = sorted(self._latencies)
+        index = min(len(latencies) - 1, int(self.hedge_percentile * len(latencies)))
+        return latencies[index]
+
+    def info(self) -> HedgeInfo:
+        """Get the statistics of the link"""
+        return HedgeInfo(
+            queries=self._queries,
+            hedged=self._hedged,
+            hedge_wins=self._hedge_wins,
+            delay=self.current_delay(),
+        )
+
+    def should_hedge(self, operation: Operation) -> bool:
+        """Checks if an operation can be hedged"""
+        return (
+            operation.node.operation == OperationType.QUERY
+            and not operation.context.files
+            and not operation.context.stream_path
+            and not uses_incremental_delivery(operation)
+        )
+
+    def _take_hedge_token(self) -> bool:
+        """Take a token to hedge a query, if the hedge rate allows it"""
+        if self._hedge_tokens < 1:
+            return False
+        self._hedge_tokens -= 1
+        return True
+
+    async def _afirst(self, operation: Operation) -> Optional[GraphQLResult]:
+        """The first result of an attempt"""
+        assert self.next, "No next link set"
+        iterator = self.next.aexecute(operation)
+        try:
+            async for result in iterator:
+                return result
+            return None
+        finally:
+            await iterator.aclose()  # type: ignore[attr-defined]
+
+    async def aexecute(self, operation: Operation) -> AsyncIterator[GraphQLResult]:
+        """Executes an operation against the link
+
+        Queries are hedged if they do not answer in time, all other operations
+        are passed to the next link.
+
+        Parameters
+        ----------
+        operation : Operation
+            The operation to execute
+
+        Yields
+        ------
+        GraphQLResult
+            The result of the operation
+        """
+        if not self.next:
+            raise NotComposedError("No next link set")
+
+        if not self.should_hedge(operation):
+            async for result in self.next.aexecute(operation):
+                yield result
+            return
+
+        self._queries += 1
+        self._hedge_tokens = min(1, self._hedge_tokens + self.max_hedge_rate)
+        delay = self.current_delay()
+
+        start = time.monotonic()
+        first = asyncio.create_task(self._afirst(operation))
+        attempts = [first]
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=delay)
+            if not done and self._take_hedge_token():
+                logger.debug(f"Hedging {operation.display_name} after {delay}s")
+                self._hedged += 1
+                hedge = operation.model_copy(
+                    update={"id": new_operation_id(), "context": operation.context.model_copy(deep=True)}
+                )
+                attempts.append(asyncio.create_task(self._afirst(hedge)))
+
+            winner = None
+            pending = set(attempts)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                succeeded = [task for task in done if task.exception() is None]
+                if succeeded:
+                    winner = succeeded[0]
+                    break
+
+            if winner is None:
+                # all attempts failed, raise the error of the first one
+                result = first.result()
+            else:
+                if winner is not first:
+                    self._hedge_wins += 1
+                result = winner.result()
+        finally:
+            for task in attempts:
+                task.cancel()
+            await asyncio.gather(*attempts, return_exceptions=True)
+
+        self._latencies.append(time.monotonic() - start)
+        while len(self._latencies) > self.latency_window:
+            self._latencies.popleft()
+
+        if result is not None:
+            yield result
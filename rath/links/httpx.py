@@ -1,32 +1,49 @@
 from http import HTTPStatus
+import importlib.util
 import json
-from typing import Any, Dict, List, Type, AsyncIterator
+from typing import Any, Dict, List, Optional, Self, Type, AsyncIterator
+from urllib.parse import urlencode
 import httpx
 from graphql import OperationType
-from pydantic import Field
-from rath.operation import GraphQLException, GraphQLResult, Operation
-from rath.links.base import AsyncTerminatingLink
-from rath.links.errors import AuthenticationError, MalformedResponseError
+from pydantic import Field, model_validator
+from rath.operation import GraphQLResult, Operation
+from rath.links.batch import BatchResult, BatchingTerminatingLink
+from rath.links.codec import JSONCodec, StdlibCodec, get_codec
+from rath.links.codec import DateTimeEncoder  # noqa: F401 (kept for backwards compatibility)
+from rath.links.errors import (
+    AuthenticationError,
+    HTTPStatusError,
+    MalformedResponseError,
+    TerminatingLinkError,
+)
+from rath.links.incremental import (
+    INCREMENTAL_ACCEPT,
+    aparse_multipart_response,
+    is_multipart,
+    uses_incremental_delivery,
+)
+from rath.links.streaming import aparse_streamed_response
+from rath.links.upload import MultipartUpload, UploadProgressCallback
+from rath.links.utils import build_payload, build_query_params, parse_graphql_response, parse_retry_after
 import logging
 from rath.links.types import Payload
-from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
 
-class DateTimeEncoder(json.JSONEncoder):
-    """DateTimeEncoder is a JSONEncoder that extends the default python json decoder to serialize"""
+def _h2_installed() -> bool:
+    """Checks if the h2 package (needed for HTTP/2) is installed"""
+    return importlib.util.find_spec("h2") is not None
 
-    def default(self, o: Any):  # noqa
-        """Override the default method to serialize datetime objects to ISO 8601 strings"""
-        if isinstance(o, datetime):
-            return o.isoformat()
 
-        return json.JSONEncoder.default(self, o)
+class HttpxLink(BatchingTerminatingLink):
+    """HttpxLink is a terminating link that sends operations over HTTP using httpx
 
+    While the link is entered, all operations share one pooled httpx client, so
+    connections are reused (and multiplexed if http2 is enabled).
 
-class HttpxLink(AsyncTerminatingLink):
-    """HttpxLink is a terminating link that sends operations over HTTP using httpx"""
+    This link supports batching, so it can be composed with a BatchLink.
+    """
 
     endpoint_url: str
     """endpoint_url is the URL to send operations to."""
@@ -37,14 +54,134 @@ class HttpxLink(AsyncTerminatingLink):
         ]
     )
     """auth_errors is a list of HTTPStatus codes that indicate an authentication error."""
-    json_encoder: Type[json.JSONEncoder] = Field(default=DateTimeEncoder, exclude=True)
+    status_errors: List[HTTPStatus] = Field(
+        default_factory=lambda: [
+            HTTPStatus.TOO_MANY_REQUESTS,
+            HTTPStatus.BAD_GATEWAY,
+            HTTPStatus.SERVICE_UNAVAILABLE,
+            HTTPStatus.GATEWAY_TIMEOUT,
+        ]
+    )
+    """status_errors is a list of HTTPStatus codes that indicate a (possibly transient)
+    failure of the server. They raise an HTTPStatusError (carrying the Retry-After
+    header), instead of trying to decode the body."""
+    codec: JSONCodec = Field(default_factory=get_codec, exclude=True)
+    """codec is the JSONCodec used to encode payloads and decode responses. By default,
+    this is the fastest installed codec (orjson, msgspec or the standard library)."""
+    json_encoder: Optional[Type[json.JSONEncoder]] = Field(default=None, exclude=True)
+    """json_encoder is a JSONEncoder to use when serializing the payload. If set, the
+    standard library codec is used with this encoder (overriding codec)."""
+
+    client_per_request: bool = False
+    """client_per_request makes the link create (and close) a new httpx client for
+    every operation, instead of reusing the client that is opened when the link is
+    entered. This disables connection pooling."""
+    http2: bool = False
+    """http2 enables HTTP/2 so that concurrent operations are multiplexed over a
+    few connections. Requires the optional `h2` package (`pip install rath[http2]`)."""
+    max_connections: Optional[int] = 100
+    """max_connections is the maximum number of connections in the pool (None means no limit)."""
+    max_keepalive_connections: Optional[int] = 20
+    """max_keepalive_connections is the maximum number of idle connections that are
+    kept open for reuse (None means no limit)."""
+    keepalive_expiry: Optional[float] = 5.0
+    """keepalive_expiry is the number of seconds an idle connection is kept open."""
+    timeout: Optional[float] = 5.0
+    """timeout is the default timeout in seconds for reading, writing and acquiring a
+    connection from the pool (None disables the timeout)."""
+    connect_timeout: Optional[float] = None
+    """connect_timeout is the timeout in seconds for establishing a connection.
+    Defaults to timeout if not set."""
+
+    get_persisted_queries: bool = False
+    """get_persisted_queries sends queries that omit their document (e.g. the hashed
+    queries of an ApqLink) as GET requests with a query string, so that CDNs and
+    reverse proxies can cache them. Mutations are always sent as POST requests."""
+    max_get_url_length: int = 2048
+    """max_get_url_length is the maximum length of the URL of a GET request. Queries
+    with larger variables are sent as POST requests."""
+    stream_chunk_size: int = 64 * 1024
+    """stream_chunk_size is the size of the chunks a streamed response (an operation
+    with a stream_path) is read and decoded in."""
+    upload_chunk_size: int = 64 * 1024
+    """upload_chunk_size is the size of the chunks files are uploaded in. Files are
+    streamed, and never read into memory as a whole."""
+    on_upload_progress: Optional[UploadProgressCallback] = Field(exclude=True, default=None)
+    """on_upload_progress is called with the UploadProgress of a file after every
+    uploaded chunk (it can be async), e.g. to show a progress bar."""
+
+    _client: Optional[httpx.AsyncClient] = None
+
+    @model_validator(mode="after")
+    def _use_json_encoder(self) -> Self:
+        """Use the standard library codec if a custom json_encoder is set"""
+        if self.json_encoder is not None:
+            self.codec = StdlibCodec(encoder=self.json_encoder)
+        return self
+
+    def _build_client(self) -> httpx.AsyncClient:
+        """Builds a new httpx client with the configured pool limits and timeouts
+
+        Returns
+        -------
+        httpx.AsyncClient
+            The configured client
+
+        Raises
+        ------
+        ImportError
+            If http2 is enabled, but the h2 package is not installed
+        """
+        if self.http2 and not _h2_installed():
+            raise ImportError(
+                "HttpxLink(http2=True) requires the h2 package. "
+                "Install it with `pip install rath[http2]` (or `pip install httpx[http2]`)."
+            )
+        return httpx.AsyncClient(
+            http2=self.http2,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(
+                self.timeout,
+                connect=self.connect_timeout
+                if self.connect_timeout is not None
+                else self.timeout,
+            ),
+        )
+
+    async def __aenter__(self) -> Self:
+        """Entery point for the async context manager
+
+        Opens the pooled httpx client that is shared by all operations
+        executed while the link is entered (unless client_per_request is set).
+        """
+        if not self.client_per_request and self._client is None:
+            self._client = self._build_client()
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_val: Optional[BaseException],
+        traceback: Optional[Any],
+    ) -> None:
+        """Exit point for the async context manager
+
+        Closes the pooled httpx client and all of its connections.
+        """
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
 
     async def aexecute(self, operation: Operation) -> AsyncIterator[GraphQLResult]:
         """Executes an operation against the link
 
-        This link will create a new httpx session for each request. While
-        we could also reuse the session, we currently don't do this. If
-        you feel like this should be changed, please open an issue.
+        This link will reuse the pooled client that was opened when the link
+        was entered. If the link was not entered (or client_per_request is set),
+        a new client is created and closed for this request.
 
         Parameters
         ----------
@@ -57,7 +194,8 @@ class HttpxLink(AsyncTerminatingLink):
             The result of the operation
         """
 
-        payload: Payload = {"query": operation.document}
+        payload: Payload = build_payload(operation)
+        headers = operation.context.headers
 
         if operation.node.operation == OperationType.SUBSCRIPTION:
             raise NotImplementedError(
@@ -66,56 +204,182 @@ class HttpxLink(AsyncTerminatingLink):
             )
 
         if len(operation.context.files.items()) > 0:
-            payload["variables"] = operation.variables
+            upload = MultipartUpload.from_operation(
+                operation,
+                payload,
+                self.codec.dumps,
+                chunk_size=self.upload_chunk_size,
+                on_progress=self.on_upload_progress,
+            )
+            headers = {**headers, **upload.headers}
+            request_kwargs: Dict[str, Any] = {"content": upload}
+            method = "POST"
+
+        else:
+            params = self._get_params(operation, payload)
+            if params is not None:
+                method, request_kwargs = "GET", {"params": params}
+            else:
+                headers = {"Content-Type": "application/json", **headers}
+                method, request_kwargs = "POST", {"content": self.codec.dumpb(payload)}
+
+        incremental = uses_incremental_delivery(operation)
+        if operation.context.stream_path or incremental:
+            if incremental and "Accept" not in headers:
+                headers = {**headers, "Accept": INCREMENTAL_ACCEPT}
+            async for result in self._astream(method, headers, operation, request_kwargs):
+                yield result
+            return
+
+        response = await self._arequest(method, headers, request_kwargs)
+        if response.status_code != HTTPStatus.OK:
+            raise TerminatingLinkError(
+                f"Request to {self.endpoint_url} failed with status {response.status_code}"
+            )
 
-            files = operation.context.files
+        json_response = self.codec.loads(response.content)
+        yield parse_graphql_response(json_response, operation, self.endpoint_url)
 
-            file_map = {str(i): [path] for i, path in enumerate(files)}
+    async def aexecute_batch(self, operations: List[Operation]) -> List[BatchResult]:
+        """Executes a batch of operations in a single request
 
-            # Enumerate the file streams
-            # Will generate something like {'0': <_io.BufferedReader ...>}
-            file_streams = {str(i): files[path] for i, path in enumerate(files)}
-            operations_str = json.dumps(payload, cls=self.json_encoder)
-            file_map_str = json.dumps(file_map)
+        The operations are sent as a JSON array, and the server is expected
+        to answer with a JSON array of results in the same order.
 
-            post_kwargs: Dict[str, Any] = {
-                "data": {
-                    "operations": operations_str,
-                    "map": file_map_str,
-                },
-                "files": file_streams,
-            }
+        Parameters
+        ----------
+        operations : List[Operation]
+            The operations to execute, they all share the same headers
+
+        Returns
+        -------
+        List[BatchResult]
+            The result (or error) of each operation, in the same order
+        """
+        headers = {"Content-Type": "application/json", **operations[0].context.headers}
+        content = self.codec.dumpb([build_payload(operation) for operation in operations])
+
+        response = await self._arequest("POST", headers, {"content": content})
+
+        if response.status_code != HTTPStatus.OK:
+            raise TerminatingLinkError(
+                f"Batch request to {self.endpoint_url} failed with status {response.status_code}"
+            )
+
+        json_response = self.codec.loads(response.content)
+        if not isinstance(json_response, list) or len(json_response) != len(operations):
+            raise MalformedResponseError(
+                f"Batch response from {self.endpoint_url} is not a list of "
+                f"{len(operations)} results: {json_response}"
+            )
+
+        results: List[BatchResult] = []
+        for operation, result in zip(operations, json_response):
+            try:
+                results.append(parse_graphql_response(result, operation, self.endpoint_url))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def _get_params(self, operation: Operation, payload: Payload) -> Optional[Dict[str, str]]:
+        """The query string of an operation, if it should be sent as a GET request
+
+        Only persisted queries (that omit their document) are sent as GET requests,
+        and only if the URL stays within max_get_url_length.
+        """
+        if not (
+            self.get_persisted_queries
+            and operation.context.omit_document
+            and operation.node.operation == OperationType.QUERY
+        ):
+            return None
 
+        params = build_query_params(payload, self.codec.dumps)
+        if len(self.endpoint_url) + len(urlencode(params)) + 1 > self.max_get_url_length:
+            return None
+        return params
+
+    async def _arequest(self, method: str, headers: Dict[str, str], request_kwargs: Dict[str, Any]) -> httpx.Response:
+        """Sends a request to the endpoint and returns the response
+
+        Uses the pooled client, or a new client if the link was not
+        entered (or client_per_request is set).
+        """
+        if self._client is None or self.client_per_request:
+            async with self._build_client() as client:
+                response = await client.request(
+                    method, self.endpoint_url, headers=headers, **request_kwargs
+                )
         else:
-            payload["variables"] = operation.variables
-            post_kwargs = {"json": payload}
+            response = await self._client.request(
+                method, self.endpoint_url, headers=headers, **request_kwargs
+            )
+
+        self._raise_for_status(response, headers)
+        return response
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                self.endpoint_url, headers=operation.context.headers, **post_kwargs
+    def _raise_for_status(self, response: httpx.Response, headers: Dict[str, str]) -> None:
+        """Raises if the status of the response is an auth error or a status error"""
+        if response.status_code in self.auth_errors:
+            raise AuthenticationError(f"Token Expired Error {headers}")
+        if response.status_code in self.status_errors:
+            raise HTTPStatusError(
+                f"Request to {self.endpoint_url} failed with status {response.status_code}",
+                response.status_code,
+                parse_retry_after(response.headers.get("Retry-After")),
             )
 
-            if response.status_code in self.auth_errors:
-                raise AuthenticationError(
-                    f"Token Expired Error {operation.context.headers}"
+    async def _astream(
+        self,
+        method: str,
+        headers: Dict[str, str],
+        operation: Operation,
+        request_kwargs: Dict[str, Any],
+    ) -> AsyncIterator[GraphQLResult]:
+        """Sends a request and decodes the response incrementally
+
+        A multipart/mixed response (for operations with @defer or @stream) yields
+        the merged result after every part. Otherwise a partial result is yielded
+        for every chunk that completes items of the list at the stream_path of the
+        operation, and finally the rest of the response.
+        """
+        if self._client is None or self.client_per_request:
+            async with self._build_client() as client:
+                async for result in self._astream_with(client, method, headers, operation, request_kwargs):
+                    yield result
+        else:
+            async for result in self._astream_with(self._client, method, headers, operation, request_kwargs):
+                yield result
+
+    async def _astream_with(
+        self,
+        client: httpx.AsyncClient,
+        method: str,
+        headers: Dict[str, str],
+        operation: Operation,
+        request_kwargs: Dict[str, Any],
+    ) -> AsyncIterator[GraphQLResult]:
+        """Sends a request with the given client and decodes the response incrementally"""
+        async with client.stream(method, self.endpoint_url, headers=headers, **request_kwargs) as response:
+            self._raise_for_status(response, headers)
+            if response.status_code != HTTPStatus.OK:
+                raise TerminatingLinkError(
+                    f"Request to {self.endpoint_url} failed with status {response.status_code}"
+                )
+
+            content_type = response.headers.get("Content-Type", "")
+            chunks = response.aiter_bytes(self.stream_chunk_size)
+            if is_multipart(content_type):
+                results = aparse_multipart_response(
+                    chunks, content_type, operation, self.codec.loads, self.endpoint_url
                 )
+            elif operation.context.stream_path:
+                results = aparse_streamed_response(chunks, operation, self.codec.loads, self.endpoint_url)
+            else:
+                # the server does not support incremental delivery
+                json_response = self.codec.loads(await response.aread())
+                yield parse_graphql_response(json_response, operation, self.endpoint_url)
+                return
 
-            if response.status_code == HTTPStatus.OK:
-                json_response = response.json()
-
-                if "errors" in json_response:
-                    raise GraphQLException(
-                        "\n".join([e["message"] for e in json_response["errors"]]),
-                        operation=operation,
-                        endpoint_url=self.endpoint_url,
-                        errors=json_response["errors"],
-                    )
-
-                if "data" not in json_response:
-                    raise MalformedResponseError(
-                        f"Response from {self.endpoint_url} for operation "
-                        f"'{operation.display_name}' contains neither "
-                        f"'data' nor 'errors': {json_response}"
-                    )
-
-                yield GraphQLResult(data=json_response["data"])
+            async for result in results:
+                yield result
@@ -0,0 +1,244 @@
+"""Incremental delivery of results (@defer and @stream) over HTTP.
+
+Servers answer operations with @defer or @stream directives with a
+multipart/mixed response: the first part carries the initial result, and
+every following part carries patches (deferred fragments and streamed list
+items) that are merged into it. A MultipartParser splits the body into its
+parts as the chunks arrive, and apply_patches merges the patches into the
+result, copying only the containers along the patched paths, so that the
+results that were handed out before are never modified.
+"""
+
+import re
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Union
+
+from rath.links.errors import MalformedResponseError
+from rath.operation import GraphQLException, GraphQLResult, Operation
+
+INCREMENTAL_ACCEPT = "multipart/mixed;deferSpec=20220824, application/json"
+"""The Accept header of operations that use incremental delivery"""
+
+_INCREMENTAL_DIRECTIVE = re.compile(r"@(defer|stream)\b")
+_BOUNDARY = re.compile(r'boundary="?([^";]+)"?')
+
+Path = Sequence[Union[str, int]]
+
+
+def uses_incremental_delivery(operation: Operation) -> bool:
+    """Checks if an operation uses @defer or @stream"""
+    return "@" in operation.document and _INCREMENTAL_DIRECTIVE.search(operation.document) is not None
+
+
+def is_multipart(content_type: Optional[str]) -> bool:
+    """Checks if a content type is multipart/mixed"""
+    return bool(content_type) and content_type.lower().startswith("multipart/mixed")  # type: ignore[union-attr]
+
+
+def parse_boundary(content_type: str) -> str:
+    """Get the boundary of a multipart content type (defaults to "-")"""
+    match = _BOUNDARY.search(content_type)
+    return match.group(1).strip() if match else "-"
+
+
+class MultipartParser:
+    """Splits a multipart body into the bodies of its parts, as the chunks arrive"""
+
+    def __init__(self, boundary: str) -> None:
+        """Initialize the parser
+
+        Parameters
+        ----------
+        boundary : str
+            The boundary of the multipart body
+        """
+        self._delimiter = b"\r\n--" + boundary.encode("latin-1")
+        # the first delimiter is not preceded by a line break
+        self._buffer = bytearray(b"\r\n")
+        self._started = False
+        self.done = False
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        """Feed the next chunk of the body
+
+        Parameters
+        ----------
+        chunk : bytes
+            The chunk
+
+        Returns
+        -------
+        List[bytes]
+            The bodies of the parts that were completed by the chunk
+        """
+        bodies: List[bytes] = []
+        if self.done:
+            return bodies
+
+        self._buffer += chunk
+        while True:
+            index = self._buffer.find(self._delimiter)
+            if index == -1 or len(self._buffer) < index + len(self._delimiter) + 2:
+                # wait for the two bytes after the delimiter, that tell if it is the last one
+                break
+
+            part = bytes(self._buffer[:index])
+            del self._buffer[: index + len(self._delimiter)]
+            if self._started:
+                body = part.split(b"\r\n\r\n", 1)[1] if b"\r\n\r\n" in part else part
+                if body.strip():
+                    bodies.append(body)
+            self._started = True
+
+            if self._buffer[:2] == b"--":
+                # the closing delimiter
+                self.done = True
+                break
+        return bodies
+
+
+def _set(data: Any, path: Path, update: Callable[[Any], Any]) -> Any:
+    """Return a copy of data, with the value at path replaced by update(value)"""
+    if not path:
+        return update(data)
+
+    key, rest = path[0], path[1:]
+    if isinstance(data, list) and isinstance(key, int):
+        if not 0 <= key < len(data):
+            raise GraphQLException(f"Can not apply a patch at {list(path)}: the list has {len(data)} items")
+        copy = list(data)
+        copy[key] = _set(copy[key], rest, update)
+        return copy
+    if isinstance(data, dict) and isinstance(key, str):
+        copy = dict(data)
+        copy[key] = _set(copy.get(key), rest, update)
+        return copy
+    raise GraphQLException(f"Can not apply a patch at {list(path)} to {data}")
+
+
+def _merge(target: Any, patch: Any) -> Any:
+    """Deep merge a patch into a copy of target"""
+    if not isinstance(target, dict) or not isinstance(patch, dict):
+        return patch
+    merged = dict(target)
+    for key, value in patch.items():
+        merged[key] = _merge(merged[key], value) if key in merged else value
+    return merged
+
+
+def _insert_items(items: List[Any], index: int) -> Callable[[Any], Any]:
+    """An update that places streamed items at index of a list"""
+
+    def update(value: Any) -> Any:
+        current = list(value or [])
+        if not 0 <= index <= len(current):
+            raise GraphQLException(f"Can not stream items to index {index} of a list with {len(current)} items")
+        current[index : index + len(items)] = items
+        return current
+
+    return update
+
+
+def apply_patches(data: Dict[str, Any], payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Apply the patches of a subsequent payload to the data of a result
+
+    Supports the current format (a list of "incremental" patches) as well as
+    the older format (a single patch with "data" or "items" and "path").
+
+    Parameters
+    ----------
+    data : Dict[str, Any]
+        The data of the result so far (it is not modified)
+    payload : Dict[str, Any]
+        The payload of a part
+
+    Returns
+    -------
+    Dict[str, Any]
+        The patched data
+    """
+    patches = payload.get("incremental")
+    if patches is None:
+        patches = [payload] if "path" in payload else []
+
+    for patch in patches:
+        errors = patch.get("errors")
+        if errors:
+            raise GraphQLException("\n".join([e["message"] for e in errors]))
+
+        path = patch.get("path") or []
+        if "items" in patch:
+            if not path or not isinstance(path[-1], int):
+                raise GraphQLException(f"Streamed items need a path that ends with an index, got {path}")
+            *parent, index = path
+            data = _set(data, parent, _insert_items(patch["items"], index))
+        elif patch.get("data") is not None:
+            patch_data = patch["data"]
+            data = _set(data, path, lambda value: _merge(value, patch_data))
+    return data
+
+
+async def aparse_multipart_response(
+    chunks: AsyncIterator[bytes],
+    content_type: str,
+    operation: Operation,
+    loads: Callable[[bytes], Any],
+    endpoint_url: Optional[str] = None,
+) -> AsyncIterator[GraphQLResult]:
+    """Parse a multipart/mixed response, yielding the merged result after every part
+
+    Parameters
+    ----------
+    chunks : AsyncIterator[bytes]
+        The chunks of the response body
+    content_type : str
+        The content type of the response (with the boundary)
+    operation : Operation
+        The operation the response belongs to
+    loads : Callable[[bytes], Any]
+        The function that decodes JSON
+    endpoint_url : Optional[str], optional
+        The endpoint that was queried (for error messages), by default None
+
+    Yields
+    ------
+    GraphQLResult
+        The result with all patches received so far
+    """
+    parser = MultipartParser(parse_boundary(content_type))
+    data: Optional[Dict[str, Any]] = None
+
+    async for chunk in chunks:
+        for body in parser.feed(chunk):
+            payload = loads(body)
+            if not isinstance(payload, dict):
+                raise MalformedResponseError(
+                    f"Part of the response from {endpoint_url} for operation "
+                    f"'{operation.display_name}' is not a JSON object: {payload}"
+                )
+
+            if payload.get("errors"):
+                raise GraphQLException("\n".join([e["message"] for e in payload["errors"]]))
+
+            if data is None:
+                if "data" not in payload:
+                    # e.g. a heartbeat, before the initial result
+                    continue
+                data = payload["data"] or {}
+            else:
+                data = apply_patches(data, payload)
+                if "incremental" not in payload and "path" not in payload:
+                    continue
+
+            yield GraphQLResult(data=data)
+
+            if payload.get("hasNext") is False:
+                return
+
+        if parser.done:
+            break
+
+    if data is None:
+        raise MalformedResponseError(
+            f"Multipart response from {endpoint_url} for operation "
+            f"'{operation.display_name}' contained no result"
+        )
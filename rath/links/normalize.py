@@ -0,0 +1,486 @@
+"""An entity normalized cache.
+
+Results are split into entities, that are keyed by their `__typename` and `id`
+(`Typename:id`, the same convention that federated entity references use), and
+stored once per entity. Queries are answered from the entities they reference,
+so a mutation (or subscription) result that returns an updated entity updates
+every cached query that references it.
+"""
+
+from collections import OrderedDict
+import threading
+from typing import Any, Dict, Hashable, Iterator, List, NamedTuple, Optional
+
+from graphql import (
+    FieldNode,
+    FragmentDefinitionNode,
+    FragmentSpreadNode,
+    InlineFragmentNode,
+    OperationType,
+    SelectionSetNode,
+    value_from_ast_untyped,
+)
+from graphql.language import DirectiveNode
+from pydantic import Field
+
+from rath.links.cache import BaseCacheLink, canonical_json
+from rath.operation import GraphQLResult, Operation
+
+ROOT_QUERY = "ROOT_QUERY"
+"""The key of the record that holds the root fields of queries"""
+
+Record = Dict[str, Any]
+Fragments = Dict[str, FragmentDefinitionNode]
+
+
+class MissingFieldError(KeyError):
+    """Raised when a query can not be read from the store, because a field is missing"""
+
+    pass
+
+
+class NormalizedStoreInfo(NamedTuple):
+    """Statistics of a NormalizedStore"""
+
+    hits: int
+    misses: int
+    evictions: int
+    root_fields: int
+    entities: Dict[str, int]
+
+
+def _should_include(directives: Optional[List[DirectiveNode]], variables: Dict[str, Any]) -> bool:
+    """Evaluates the @skip and @include directives of a selection"""
+    for directive in directives or []:
+        if directive.name.value not in ("skip", "include"):
+            continue
+        condition = False
+        for argument in directive.arguments:
+            if argument.name.value == "if":
+                condition = bool(value_from_ast_untyped(argument.value, variables))
+        if (directive.name.value == "skip") == condition:
+            return False
+    return True
+
+
+def storage_key(field: FieldNode, variables: Dict[str, Any]) -> str:
+    """The key a field is stored under: its name, and its arguments if it has any
+
+    Parameters
+    ----------
+    field : FieldNode
+        The field
+    variables : Dict[str, Any]
+        The variables of the operation, to resolve variable arguments
+
+    Returns
+    -------
+    str
+        The storage key, e.g. `beasts` or `beast({"id":"1"})`
+    """
+    if not field.arguments:
+        return field.name.value
+    arguments = {argument.name.value: value_from_ast_untyped(argument.value, variables) for argument in field.arguments}
+    return f"{field.name.value}({canonical_json(arguments)})"
+
+
+def collect_fields(
+    selection_set: SelectionSetNode,
+    typename: Optional[str],
+    fragments: Fragments,
+    variables: Dict[str, Any],
+    required: bool = True,
+) -> Iterator[tuple[FieldNode, bool]]:
+    """Flattens a selection set into its fields
+
+    Fields of fragments whose type condition does not match the typename can
+    not be resolved without the schema (the condition might be an interface),
+    so they are marked as not required.
+
+    Yields
+    ------
+    tuple[FieldNode, bool]
+        The field and whether it needs to be present on the object
+    """
+    for selection in selection_set.selections:
+        if not _should_include(selection.directives, variables):
+            continue
+
+        if isinstance(selection, FieldNode):
+            yield selection, required
+            continue
+
+        if isinstance(selection, InlineFragmentNode):
+            condition = selection.type_condition
+            sub_selection_set = selection.selection_set
+        elif isinstance(selection, FragmentSpreadNode):
+            fragment = fragments.get(selection.name.value)
+            if fragment is None:
+                continue
+            condition = fragment.type_condition
+            sub_selection_set = fragment.selection_set
+        else:  # pragma: no cover
+            continue
+
+        matches = condition is None or condition.name.value == typename
+        yield from collect_fields(sub_selection_set, typename, fragments, variables, required and matches)
+
+
+class NormalizedStore:
+    """A store of normalized entities.
+
+    Objects that have a `__typename` and an `id` are stored as entities under
+    `Typename:id`, and referenced from their parents as `{"__ref": key}`. All
+    other objects are stored inline in their parent. Fields are stored under
+    their name and arguments, so aliases and different arguments to the
+    same field do not collide.
+
+    Memory is bounded per type: every type holds at most max_entities_per_type
+    entities (or its limit in type_limits), and the least recently used entities
+    are evicted first. The root fields of queries are bounded by max_root_fields.
+    A query that references an evicted entity is simply not read from the store
+    anymore. The store is thread safe.
+    """
+
+    def __init__(
+        self,
+        max_entities_per_type: int = 1000,
+        max_root_fields: int = 1000,
+        type_limits: Optional[Dict[str, int]] = None,
+    ) -> None:
+        """Initialize the store
+
+        Parameters
+        ----------
+        max_entities_per_type : int, optional
+            The maximum number of entities of one type, by default 1000
+        max_root_fields : int, optional
+            The maximum number of stored root fields, by default 1000
+        type_limits : Optional[Dict[str, int]], optional
+            Limits for specific types, that override max_entities_per_type
+        """
+        self.max_entities_per_type = max_entities_per_type
+        self.max_root_fields = max_root_fields
+        self.type_limits = type_limits or {}
+        self._root: "OrderedDict[str, Any]" = OrderedDict()
+        self._entities: Dict[str, "OrderedDict[str, Record]"] = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def identify(self, obj: Record) -> Optional[str]:
+        """The key of an object in the store, or None if it is not an entity
+
+        Parameters
+        ----------
+        obj : Record
+            The object, as returned by the server
+
+        Returns
+        -------
+        Optional[str]
+            The key, e.g. `Beast:1`
+        """
+        typename = obj.get("__typename")
+        id = obj.get("id")
+        if typename is None or id is None:
+            return None
+        return f"{typename}:{id}"
+
+    def _entity(self, key: str) -> Optional[Record]:
+        """Gets an entity, marking it as recently used"""
+        typename = key.split(":", 1)[0]
+        entities = self._entities.get(typename)
+        if entities is None or key not in entities:
+            return None
+        entities.move_to_end(key)
+        return entities[key]
+
+    def _put_entity(self, key: str, record: Record) -> None:
+        """Merges the fields of record into an entity, evicting old entities of the type"""
+        typename = key.split(":", 1)[0]
+        entities = self._entities.setdefault(typename, OrderedDict())
+        existing = entities.get(key)
+        entities[key] = _merge(existing, record) if existing is not None else record
+        entities.move_to_end(key)
+
+        limit = self.type_limits.get(typename, self.max_entities_per_type)
+        while len(entities) > limit:
+            entities.popitem(last=False)
+            self._evictions += 1
+
+    def _normalize(
+        self,
+        value: Any,
+        selection_set: Optional[SelectionSetNode],
+        fragments: Fragments,
+        variables: Dict[str, Any],
+    ) -> Any:
+        """Normalizes a value, storing the entities it contains"""
+        if selection_set is None or value is None:
+            return value
+        if isinstance(value, list):
+            return [self._normalize(item, selection_set, fragments, variables) for item in value]
+
+        record: Record = {}
+        for field, _ in collect_fields(selection_set, value.get("__typename"), fragments, variables):
+            response_key = field.alias.value if field.alias else field.name.value
+            if response_key not in value:
+                continue
+            record[storage_key(field, variables)] = self._normalize(
+                value[response_key], field.selection_set, fragments, variables
+            )
+
+        key = self.identify(value)
+        if key is None:
+            return record
+
+        self._put_entity(key, record)
+        return {"__ref": key}
+
+    def write(self, operation: Operation, data: Dict[str, Any]) -> None:
+        """Writes the result of an operation to the store
+
+        The entities in the result are always stored. The root fields are only
+        stored for queries, as the root fields of mutations and subscriptions
+        can not be queried.
+
+        Parameters
+        ----------
+        operation : Operation
+            The operation
+        data : Dict[str, Any]
+            The data of its result
+        """
+        fragments = _fragments(operation)
+        with self._lock:
+            root = self._normalize(data, operation.node.selection_set, fragments, operation.variables)
+            if operation.node.operation != OperationType.QUERY:
+                return
+
+            for key, value in root.items():
+                existing = self._root.get(key)
+                self._root[key] = _merge(existing, value) if isinstance(existing, dict) else value
+                self._root.move_to_end(key)
+            while len(self._root) > self.max_root_fields:
+                self._root.popitem(last=False)
+                self._evictions += 1
+
+    def _denormalize(
+        self,
+        value: Any,
+        selection_set: Optional[SelectionSetNode],
+        fragments: Fragments,
+        variables: Dict[str, Any],
+    ) -> Any:
+        """Reads a value from the store, resolving the entities it references"""
+        if selection_set is None or value is None:
+            return value
+        if isinstance(value, list):
+            return [self._denormalize(item, selection_set, fragments, variables) for item in value]
+
+        if "__ref" in value:
+            record = self._entity(value["__ref"])
+            if record is None:
+                raise MissingFieldError(value["__ref"])
+        else:
+            record = value
+
+        result: Record = {}
+        for field, required in collect_fields(selection_set, record.get("__typename"), fragments, variables):
+            key = storage_key(field, variables)
+            if key not in record:
+                if required:
+                    raise MissingFieldError(key)
+                continue
+            response_key = field.alias.value if field.alias else field.name.value
+            result[response_key] = self._denormalize(record[key], field.selection_set, fragments, variables)
+
+        return result
+
+    def read(self, operation: Operation) -> Optional[Dict[str, Any]]:
+        """Reads the data of a query from the store
+
+        Parameters
+        ----------
+        operation : Operation
+            The query
+
+        Returns
+        -------
+        Optional[Dict[str, Any]]
+            The data, or None if not every field of the query is in the store
+        """
+        fragments = _fragments(operation)
+        with self._lock:
+            try:
+                data = self._denormalize(self._root, operation.node.selection_set, fragments, operation.variables)
+            except MissingFieldError:
+                self._misses += 1
+                return None
+
+            self._hits += 1
+            return data
+
+    def get(self, key: str) -> Optional[Record]:
+        """Get the normalized record of an entity (e.g. `Beast:1`)"""
+        with self._lock:
+            return self._entity(key)
+
+    def evict(self, key: Optional[str] = None) -> int:
+        """Evict entities from the store
+
+        Parameters
+        ----------
+        key : Optional[str], optional
+            The key of an entity (`Beast:1`) or the name of a type (`Beast`) to evict,
+            by default None (evict everything, including the root fields)
+
+        Returns
+        -------
+        int
+            The number of evicted entities (the evictions of the statistics
+            also count the root fields that were evicted)
+        """
+        with self._lock:
+            if key is None:
+                evicted = sum(len(entities) for entities in self._entities.values())
+                self._evictions += evicted + len(self._root)
+                self._entities.clear()
+                self._root.clear()
+                return evicted
+
+            if ":" not in key:
+                evicted = len(self._entities.pop(key, {}))
+            else:
+                entities = self._entities.get(key.split(":", 1)[0], {})
+                evicted = 1 if entities.pop(key, None) is not None else 0
+            self._evictions += evicted
+            return evicted
+
+    def info(self) -> NormalizedStoreInfo:
+        """Get the statistics of the store"""
+        with self._lock:
+            return NormalizedStoreInfo(
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                root_fields=len(self._root),
+                entities={typename: len(entities) for typename, entities in self._entities.items()},
+            )
+
+
+def _fragments(operation: Operation) -> Fragments:
+    """The fragment definitions of the document of an operation"""
+    return {
+        definition.name.value: definition
+        for definition in operation.document_node.definitions
+        if isinstance(definition, FragmentDefinitionNode)
+    }
+
+
+def _merge(existing: Any, incoming: Any) -> Any:
+    """Merges an incoming normalized value into an existing one
+
+    Inline objects are merged field by field (so that queries that select
+    different fields of the same object do not overwrite each other), everything
+    else is replaced.
+    """
+    if (
+        isinstance(existing, dict)
+        and isinstance(incoming, dict)
+        and "__ref" not in existing
+        and "__ref" not in incoming
+    ):
+        merged = dict(existing)
+        for key, value in incoming.items():
+            merged[key] = _merge(existing.get(key), value)
+        return merged
+    return incoming
+
+
+class NormalizedCacheLink(BaseCacheLink):
+    """NormalizedCacheLink is a link that caches queries in a NormalizedStore.
+
+    Every result that passes through the link (queries, mutations and subscription
+    events) is split into entities keyed by `__typename:id`. A query is answered
+    from the store if every field it selects is in the store, so queries that
+    were never sent before can be answered from entities that other queries
+    fetched, and a mutation that returns an updated entity updates every cached
+    query that references it. Queries that can only partially be read from the
+    store are fetched, and their result is merged into the store.
+
+    By default, operations with different headers (e.g. a different Authorization
+    header) use different stores, so that entities fetched by one caller are never
+    served to another. Only objects that select both `__typename` and `id` are
+    normalized. See BaseCacheLink for the supported cache policies.
+    """
+
+    store: NormalizedStore = Field(default_factory=NormalizedStore, exclude=True)
+    """The store of operations without headers (or of all operations, if vary_on_headers
+    is disabled). The stores for other headers are created with its limits. Pass a
+    store to configure the limits, or to share it between links."""
+    vary_on_headers: bool = True
+    """Should operations with different headers use different stores. Disable only if
+    all callers are allowed to see the same data."""
+    max_stores: int = 100
+    """The maximum number of stores for different headers (the least recently used
+    store is dropped first)."""
+
+    _stores: "OrderedDict[str, NormalizedStore]" = OrderedDict()
+
+    def cache_key(self, operation: Operation) -> Hashable:
+        """The store is keyed by the fields of the operation, so only the headers are part of the key"""
+        if not self.vary_on_headers or not operation.context.headers:
+            return None
+        return canonical_json(operation.context.headers)
+
+    def _store_for_key(self, key: Hashable) -> NormalizedStore:
+        """Gets (or creates) the store for a cache key"""
+        if key is None:
+            return self.store
+
+        store = self._stores.get(key)  # type: ignore[arg-type]
+        if store is None:
+            store = NormalizedStore(
+                max_entities_per_type=self.store.max_entities_per_type,
+                max_root_fields=self.store.max_root_fields,
+                type_limits=self.store.type_limits,
+            )
+            self._stores[key] = store  # type: ignore[index]
+        self._stores.move_to_end(key)  # type: ignore[arg-type]
+        while len(self._stores) > self.max_stores:
+            self._stores.popitem(last=False)
+        return store
+
+    def store_for(self, operation: Operation) -> NormalizedStore:
+        """Get the store that an operation is read from and written to
+
+        Parameters
+        ----------
+        operation : Operation
+            The operation
+
+        Returns
+        -------
+        NormalizedStore
+            The store for the headers of the operation
+        """
+        return self._store_for_key(self.cache_key(operation))
+
+    def read(self, key: Hashable, operation: Operation) -> Optional[GraphQLResult]:
+        """Reads the result of a query from the store"""
+        data = self._store_for_key(key).read(operation)
+        if data is None:
+            return None
+        return GraphQLResult(data=data)
+
+    def write(self, key: Hashable, operation: Operation, result: GraphQLResult) -> None:
+        """Writes the result of a query to the store"""
+        self._store_for_key(key).write(operation, result.data)
+
+    def update(self, operation: Operation, result: GraphQLResult) -> None:
+        """Writes the entities of a mutation or subscription result to the store"""
+        if result.data:
+            self.store_for(operation).write(operation, result.data)
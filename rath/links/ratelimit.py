@@ -0,0 +1,227 @@
+import asyncio
+from http import HTTPStatus
+import logging
+import threading
+import time
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from pydantic import Field
+
+from rath.errors import NotComposedError
+from rath.links.base import ContinuationLink
+from rath.links.errors import HTTPStatusError
+from rath.operation import GraphQLResult, Operation
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """A token bucket that refills with rate tokens per second, up to burst tokens
+
+    Tokens are reserved: an acquirer takes a token even if none is left, and
+    waits until it would have been refilled. This keeps the order of the
+    acquirers, and lets the bucket be shared by links running in different
+    threads and event loops.
+    """
+
+    def __init__(self, rate: float, burst: float) -> None:
+        """Initialize the (full) bucket
+
+        Parameters
+        ----------
+        rate : float
+            The tokens added per second
+        burst : float
+            The maximum number of tokens
+        """
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    @property
+    def tokens(self) -> float:
+        """The tokens that are available right now (negative if acquirers are waiting)"""
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+    def reserve(self) -> float:
+        """Take a token
+
+        Returns
+        -------
+        float
+            The time (in seconds) to wait until the token can be used
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._blocked_until - now)
+
+    def refund(self) -> None:
+        """Give back a reserved token, that was not used"""
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + 1)
+
+    def block(self, seconds: float) -> None:
+        """Do not hand out tokens for the given time, e.g. when the server asked to retry later"""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    async def acquire(self) -> float:
+        """Wait for a token
+
+        Returns
+        -------
+        float
+            The time (in seconds) that was waited
+        """
+        wait = self.reserve()
+        if wait > 0:
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                self.refund()
+                raise
+        return wait
+
+
+_buckets: Dict[Tuple[str, Optional[str]], TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def get_bucket(endpoint: str, operation: Optional[str], rate: float, burst: float) -> TokenBucket:
+    """Get the process wide bucket of an endpoint (and operation)
+
+    Buckets are created on first use, so all links (of all Rath instances) that
+    limit the same endpoint share the same budget, with the rate of the link that
+    used it first.
+
+    Parameters
+    ----------
+    endpoint : str
+        The name of the endpoint
+    operation : Optional[str]
+        The display name of the operation, or None for the bucket of the endpoint
+    rate : float
+        The rate of a new bucket
+    burst : float
+        The burst of a new bucket
+
+    Returns
+    -------
+    TokenBucket
+        The bucket
+    """
+    with _buckets_lock:
+        key = (endpoint, operation)
+        if key not in _buckets:
+            _buckets[key] = TokenBucket(rate, burst)
+        return _buckets[key]
+
+
+class RateLimitLink(ContinuationLink):
+    """RateLimitLink keeps operations within the request quota of an endpoint.
+
+    Every operation takes a token from the bucket of the endpoint, and from the
+    bucket of its operation name if operation_rates has a quota for it. If no
+    token is available, the operation waits instead of failing. Buckets are
+    shared by all links in the process that limit the same endpoint. A link
+    without an endpoint has buckets of its own, so unrelated links never
+    throttle each other.
+
+    If the server still answers with 429 (Too Many Requests), the bucket is
+    blocked for the Retry-After of the response, and the operation is sent
+    again once a token is available.
+    """
+
+    endpoint: Optional[str] = None
+    """ The name of the endpoint (e.g. its url), links with the same endpoint share their
+    quota. If None, the quota belongs to this link alone """
+    rate: float = 10
+    """ The number of operations per second allowed for the endpoint """
+    burst: Optional[float] = None
+    """ The number of operations that can be sent at once (defaults to rate) """
+    operation_rates: Dict[str, float] = Field(default_factory=dict)
+    """ Additional quotas (operations per second) for operations by their display name,
+    allowing a burst of one second worth of operations """
+    default_retry_after: float = 1
+    """ The time (in seconds) to wait after a 429 response without a Retry-After header """
+    max_rate_limited_retries: int = 3
+    """ How often an operation is sent again after a 429 response, before the error is raised """
+    rate_limit_statuses: List[HTTPStatus] = Field(
+        default_factory=lambda: [HTTPStatus.TOO_MANY_REQUESTS]
+    )
+    """ The statuses that signal that the quota is exceeded """
+
+    _own_buckets: Dict[Optional[str], TokenBucket] = {}
+
+    def _bucket(self, operation: Optional[str], rate: float, burst: float) -> TokenBucket:
+        """The bucket of the endpoint (or operation), shared if the link has an endpoint"""
+        if self.endpoint is not None:
+            return get_bucket(self.endpoint, operation, rate, burst)
+        if operation not in self._own_buckets:
+            self._own_buckets[operation] = TokenBucket(rate, burst)
+        return self._own_buckets[operation]
+
+    def buckets(self, operation: Operation) -> List[TokenBucket]:
+        """The buckets an operation takes a token from"""
+        buckets = [self._bucket(None, self.rate, self.burst or max(1.0, self.rate))]
+        rate = self.operation_rates.get(operation.display_name)
+        if rate:
+            buckets.append(self._bucket(operation.display_name, rate, max(1.0, rate)))
+        return buckets
+
+    async def aexecute(self, operation: Operation) -> AsyncIterator[GraphQLResult]:
+        """Executes an operation against the link
+
+        Waits for the tokens of the operation, before it is passed to the next link.
+
+        Parameters
+        ----------
+        operation : Operation
+            The operation to execute
+
+        Yields
+        ------
+        GraphQLResult
+            The result of the operation
+        """
+        if not self.next:
+            raise NotComposedError("No next link set")
+
+        buckets = self.buckets(operation)
+        retry = 0
+        while True:
+            for bucket in buckets:
+                wait = await bucket.acquire()
+                if wait:
+                    logger.debug(f"Rate limited {operation.display_name} for {wait:.2f}s")
+
+            try:
+                async for result in self.next.aexecute(operation):
+                    yield result
+                return
+
+            except HTTPStatusError as e:
+                if e.status not in self.rate_limit_statuses and e.retry_after is None:
+                    raise
+
+                retry_after = e.retry_after if e.retry_after is not None else self.default_retry_after
+                for bucket in buckets:
+                    bucket.block(retry_after)
+
+                if e.status not in self.rate_limit_statuses or retry >= self.max_rate_limited_retries:
+                    raise
+
+                logger.info(f"{operation.display_name} was rate limited, retrying after {retry_after}s")
+                retry += 1
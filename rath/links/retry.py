@@ -1,6 +1,13 @@
-from typing import AsyncIterator, Optional
+from http import HTTPStatus
+import random
+import threading
+from typing import AsyncIterator, List, Optional, Tuple, Type
+
+from graphql import OperationType
+from pydantic import Field
 
 from rath.links.base import ContinuationLink
+from rath.links.errors import HTTPStatusError
 from rath.operation import (
     GraphQLException,
     GraphQLResult,
@@ -14,24 +21,168 @@ from rath.errors import NotComposedError
 logger = logging.getLogger(__name__)
 
 
+def transient_errors() -> Tuple[Type[BaseException], ...]:
+    """The exceptions that signal a transient failure of the transport
+
+    Connection errors and timeouts of the installed HTTP clients (aiohttp, httpx)
+    are included if they are installed, as well as disconnects of subscriptions.
+
+    Returns
+    -------
+    Tuple[Type[BaseException], ...]
+        The exception types
+    """
+    errors: List[Type[BaseException]] = [
+        SubscriptionDisconnect,
+        ConnectionError,
+        asyncio.TimeoutError,
+    ]
+    try:
+        import aiohttp
+
+        errors += [aiohttp.ClientConnectionError, aiohttp.ServerTimeoutError]
+    except ImportError:  # pragma: no cover
+        pass
+    try:
+        import httpx
+
+        errors += [httpx.TransportError]
+    except ImportError:  # pragma: no cover
+        pass
+    return tuple(errors)
+
+
+class RetryBudget:
+    """A token bucket that limits the number of retries
+
+    Every failed attempt withdraws a token and every successful operation deposits
+    token_ratio tokens, up to max_tokens. Retries are only allowed while more than
+    half of the tokens are left, so when most operations fail (e.g. during an
+    outage) retries stop, instead of multiplying the load on the server.
+
+    A budget can be shared by multiple links, to limit their retries together.
+    """
+
+    def __init__(self, max_tokens: float = 10, token_ratio: float = 0.1) -> None:
+        """Initialize the budget
+
+        Parameters
+        ----------
+        max_tokens : float, optional
+            The size of the bucket, by default 10
+        token_ratio : float, optional
+            The tokens deposited by a success, by default 0.1
+        """
+        self.max_tokens = max_tokens
+        self.token_ratio = token_ratio
+        self._tokens = max_tokens
+        self._lock = threading.Lock()
+
+    @property
+    def tokens(self) -> float:
+        """The tokens that are left"""
+        return self._tokens
+
+    def record_success(self) -> None:
+        """Deposit tokens for a successful operation"""
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.token_ratio)
+
+    def record_failure(self) -> bool:
+        """Withdraw a token for a failed attempt
+
+        Returns
+        -------
+        bool
+            Whether a retry is allowed
+        """
+        with self._lock:
+            self._tokens = max(0.0, self._tokens - 1)
+            return self._tokens > self.max_tokens / 2
+
+
 class RetryLink(ContinuationLink):
     """RetriyLink is a link that retries a operation  fails.
-    This link is stateful, and will keep track of the number of times the
-    subscription has been retried."""
+
+    Operations are retried if they fail with a transient error: a connection error,
+    a timeout, a disconnected subscription or a server error status (e.g. 502, 503
+    or 504). Between retries the link waits with exponential backoff and full jitter,
+    and honors the Retry-After header of the server.
+
+    All operations of the link share a retry budget, so that retries can not
+    amplify an outage. This link is stateful, and will keep track of the budget."""
 
     maximum_retry_attempts: int = 3
-    """The maximum number of times the operation function will be called, before the operation fails."""
-    sleep_interval: Optional[int] = None
-    """The number of seconds to wait before retrying the operation."""
+    """The maximum number of times an operation is retried, before the operation fails."""
+    sleep_interval: Optional[float] = 0.1
+    """The base delay (in seconds) of the backoff. The n-th retry waits a random time
+    between 0 and sleep_interval * 2**n seconds (None retries immediately)."""
+    max_sleep_interval: float = 10
+    """The maximum delay (in seconds) between two retries, also caps the Retry-After of the server."""
+    retry_statuses: List[HTTPStatus] = Field(
+        default_factory=lambda: [
+            HTTPStatus.BAD_GATEWAY,
+            HTTPStatus.SERVICE_UNAVAILABLE,
+            HTTPStatus.GATEWAY_TIMEOUT,
+        ]
+    )
+    """The HTTP status codes that are retried."""
+    retry_mutations: bool = False
+    """Should mutations be retried? Mutations might not be idempotent, and a timed out
+    mutation might have been executed, so they are not retried by default."""
+    budget: RetryBudget = Field(default_factory=RetryBudget, exclude=True)
+    """The retry budget of the link, pass the same budget to multiple links to share it."""
+
+    def should_retry(self, operation: Operation, error: BaseException) -> bool:
+        """Checks if an operation should be retried after the error
+
+        Parameters
+        ----------
+        operation : Operation
+            The failed operation
+        error : BaseException
+            The error the operation failed with
+
+        Returns
+        -------
+        bool
+            Whether the error is transient, and the operation should be retried
+        """
+        if operation.node.operation == OperationType.MUTATION and not self.retry_mutations:
+            return False
+        if isinstance(error, HTTPStatusError):
+            return error.status in self.retry_statuses
+        return isinstance(error, transient_errors())
 
-    async def aexecute(
-        self, operation: Operation, retry: int = 0
-    ) -> AsyncIterator[GraphQLResult]:
+    def retry_delay(self, retry: int, error: BaseException) -> float:
+        """The time to wait before the given retry
+
+        Parameters
+        ----------
+        retry : int
+            The number of the retry (starting at 0)
+        error : BaseException
+            The error of the failed attempt
+
+        Returns
+        -------
+        float
+            The delay in seconds
+        """
+        delay = 0.0
+        if self.sleep_interval:
+            delay = random.uniform(0, min(self.max_sleep_interval, self.sleep_interval * 2**retry))
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after is not None:
+            delay = max(delay, min(self.max_sleep_interval, retry_after))
+        return delay
+
+    async def aexecute(self, operation: Operation) -> AsyncIterator[GraphQLResult]:
         """Executes an operation against the link
 
-        This link will retry the operation if it fails.
-        It will retry the operation a maximum of maximum_retry_attempts times.
-        If a sleep_interval is set, it will wait that many seconds before retrying.
+        This link will retry the operation if it fails with a transient error.
+        It will retry the operation a maximum of maximum_retry_attempts times,
+        as long as the retry budget allows it.
 
         Parameters
         ----------
@@ -47,18 +198,34 @@ class RetryLink(ContinuationLink):
         if not self.next:
             raise NotComposedError("No next link set")
 
-        try:
-            async for result in self.next.aexecute(operation):
-                yield result
-
-        except SubscriptionDisconnect as e:
-            if retry > self.maximum_retry_attempts:
-                raise GraphQLException(
-                    "Maximum refresh attempts reached. Trying to rescribe to"
-                ) from e
-            if self.sleep_interval:
-                await asyncio.sleep(self.sleep_interval)
-
-            logger.info(f"Subscription {operation} disconnected. Retrying {retry}")
-            async for result in self.aexecute(operation, retry=retry + 1):
-                yield result
+        retry = 0
+        while True:
+            try:
+                succeeded = False
+                async for result in self.next.aexecute(operation):
+                    if not succeeded:
+                        # before yielding, as the consumer might not resume this generator
+                        self.budget.record_success()
+                        succeeded = True
+                    yield result
+                return
+
+            except Exception as e:
+                if not self.should_retry(operation, e):
+                    raise
+
+                if not self.budget.record_failure():
+                    logger.warning(f"Retry budget exhausted, not retrying {operation.display_name}")
+                    raise
+
+                if retry >= self.maximum_retry_attempts:
+                    raise GraphQLException(
+                        f"Maximum retry attempts reached for {operation.display_name}"
+                    ) from e
+
+                delay = self.retry_delay(retry, e)
+                logger.info(
+                    f"Operation {operation.display_name} failed with {e!r}. Retrying {retry + 1} in {delay:.2f}s"
+                )
+                await asyncio.sleep(delay)
+                retry += 1
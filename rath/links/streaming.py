@@ -0,0 +1,220 @@
+"""Incremental decoding of large responses.
+
+A response with a large list (e.g. tens of thousands of objects) does not need
+to be buffered and decoded as a whole. A JSONListStream is fed the chunks of a
+response as they arrive, and hands out the items of the list at a chosen path
+as soon as they are complete. Only the current item and the rest of the
+document (everything outside of the list) are kept in memory.
+"""
+
+import json
+import re
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence
+
+from rath.links.errors import MalformedResponseError
+from rath.links.utils import parse_graphql_response
+from rath.operation import GraphQLResult, Operation
+
+_TOKEN = re.compile(rb'[{}\[\],:"]')
+_STRING = re.compile(rb'"(?:[^"\\]|\\.)*"', re.DOTALL)
+
+
+class JSONListStream:
+    """Incrementally extracts the items of the list at a path of a JSON document
+
+    The document is scanned for its structure only: items are sliced out of
+    the stream as raw bytes, and decoded one by one with the loads function
+    (e.g. the loads of the codec of a link).
+    """
+
+    def __init__(self, path: Sequence[str], loads: Callable[[bytes], Any] = json.loads) -> None:
+        """Initialize the stream
+
+        Parameters
+        ----------
+        path : Sequence[str]
+            The keys of the objects that lead to the list, e.g. ["data", "items"]
+        loads : Callable[[bytes], Any], optional
+            The function that decodes an item, by default json.loads
+        """
+        self.path = list(path)
+        self.loads = loads
+        self._buffer = bytearray()
+        self._pos = 0
+        # one entry per open container: [is_object, current key, expects a key]
+        self._stack: List[List[Any]] = []
+        self._rest = bytearray()
+        self._list_depth: Optional[int] = None
+        self._item_start = 0
+        self._found = False
+
+    def _at_path(self) -> bool:
+        """Is the scanner at the value of the path?"""
+        return (
+            len(self._stack) == len(self.path)
+            and all(entry[0] for entry in self._stack)
+            and [entry[1] for entry in self._stack] == self.path
+        )
+
+    def _end_item(self, end: int, items: List[Any]) -> None:
+        """Decode the item that ends at end (if there is one)"""
+        raw = bytes(self._buffer[self._item_start : end]).strip()
+        if raw:
+            items.append(self.loads(raw))
+        self._item_start = end + 1
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        """Feed the next chunk of the document
+
+        Parameters
+        ----------
+        chunk : bytes
+            The chunk
+
+        Returns
+        -------
+        List[Any]
+            The items of the list that were completed by the chunk
+        """
+        items: List[Any] = []
+        buffer = self._buffer
+        buffer += chunk
+        pos = self._pos
+
+        while True:
+            match = _TOKEN.search(buffer, pos)
+            if match is None:
+                if self._list_depth is None:
+                    self._rest += buffer[pos:]
+                pos = len(buffer)
+                break
+
+            index = match.start()
+            token = buffer[index : index + 1]
+            in_list = self._list_depth is not None
+            if not in_list:
+                self._rest += buffer[pos:index]
+
+            if token == b'"':
+                string = _STRING.match(buffer, index)
+                if string is None:
+                    # the string continues in the next chunk
+                    pos = index
+                    break
+                pos = string.end()
+                if not in_list:
+                    self._rest += buffer[index:pos]
+                if self._stack and self._stack[-1][0] and self._stack[-1][2]:
+                    self._stack[-1][1] = json.loads(buffer[index:pos])
+                continue
+
+            pos = index + 1
+            if token == b"[" and not in_list and not self._found and self._at_path():
+                self._found = True
+                self._stack.append([False, None, False])
+                self._list_depth = len(self._stack)
+                self._item_start = pos
+                self._rest += b"["
+                continue
+
+            if token == b"," and self._list_depth == len(self._stack):
+                self._end_item(index, items)
+                continue
+
+            if token == b"]" and self._list_depth == len(self._stack):
+                self._end_item(index, items)
+                self._list_depth = None
+                self._stack.pop()
+                self._rest += b"]"
+                continue
+
+            if token == b"{":
+                self._stack.append([True, None, True])
+            elif token == b"[":
+                self._stack.append([False, None, False])
+            elif token in (b"}", b"]"):
+                if not self._stack:
+                    raise MalformedResponseError("Unbalanced JSON document")
+                self._stack.pop()
+            elif token == b":":
+                self._stack[-1][2] = False
+            elif token == b"," and self._stack and self._stack[-1][0]:
+                self._stack[-1][2] = True
+
+            if not in_list:
+                self._rest += token
+
+        # only keep what is still needed: the current item, or an unfinished string
+        keep = min(pos, self._item_start) if self._list_depth is not None else pos
+        del buffer[:keep]
+        self._item_start -= keep
+        self._pos = pos - keep
+        return items
+
+    def close(self) -> Any:
+        """Finish the document
+
+        Returns
+        -------
+        Any
+            The document without the items of the list (the list is empty)
+        """
+        if self._stack or self._list_depth is not None or self._buffer[self._pos :].strip():
+            raise MalformedResponseError("The JSON document ended unexpectedly")
+        return self.loads(bytes(self._rest))
+
+
+def nest(path: Sequence[str], value: Any) -> Dict[str, Any]:
+    """Nest a value in objects along a path, e.g. nest(["a", "b"], 1) == {"a": {"b": 1}}"""
+    for key in reversed(path):
+        value = {key: value}
+    return value
+
+
+def get_items(data: Any, path: Sequence[str]) -> List[Any]:
+    """Get the list at a path of the data (an empty list if there is none)"""
+    for key in path:
+        if not isinstance(data, dict):
+            return []
+        data = data.get(key)
+    return data if isinstance(data, list) else []
+
+
+async def aparse_streamed_response(
+    chunks: AsyncIterator[bytes],
+    operation: Operation,
+    loads: Callable[[bytes], Any],
+    endpoint_url: Optional[str] = None,
+) -> AsyncIterator[GraphQLResult]:
+    """Parse a response incrementally, yielding the items of the stream path as they arrive
+
+    For every chunk that completes items of the list at operation.context.stream_path,
+    a partial result is yielded, that only contains these items (nested along the path).
+    Finally the rest of the response is yielded (with an empty list at the path).
+
+    Parameters
+    ----------
+    chunks : AsyncIterator[bytes]
+        The chunks of the response body
+    operation : Operation
+        The operation the response belongs to
+    loads : Callable[[bytes], Any]
+        The function that decodes JSON
+    endpoint_url : Optional[str], optional
+        The endpoint that was queried (for error messages), by default None
+
+    Yields
+    ------
+    GraphQLResult
+        The partial results, and the rest of the response
+    """
+    assert operation.context.stream_path, "The operation has no stream path"
+    path = list(operation.context.stream_path)
+    stream = JSONListStream(path, loads)
+
+    async for chunk in chunks:
+        items = stream.feed(chunk)
+        if items:
+            yield GraphQLResult(data=nest(path[1:], items))
+
+    yield parse_graphql_response(stream.close(), operation, endpoint_url)
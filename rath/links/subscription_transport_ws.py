@@ -13,7 +13,6 @@ from typing import (
 from graphql import OperationType
 from pydantic import Field
 import websockets
-import json
 import asyncio
 import logging
 import ssl
@@ -26,12 +25,15 @@ from rath.links.errors import (
 
 
 from rath.operation import (
+    OverflowPolicy,
     GraphQLException,
     GraphQLResult,
     Operation,
     SubscriptionDisconnect,
 )
-from rath.links.base import AsyncTerminatingLink
+from rath.buffer import SubscriptionQueue
+from rath.links.codec import JSONCodec, get_codec
+from rath.links.websocket import QueuedWebsocketLink
 
 
 logger = logging.getLogger(__name__)
@@ -104,7 +106,7 @@ class TransportMessage(TypedDict):
     error: NotRequired[Exception]
 
 
-class SubscriptionTransportWsLink(AsyncTerminatingLink):
+class SubscriptionTransportWsLink(QueuedWebsocketLink):
     """WebSocketLink is a terminating link that sends operations over websockets using
       websockets via the subscription-transport-ws protocol. This is a
       deprecated protocol, and should not be used for new projects.
@@ -126,38 +128,31 @@ class SubscriptionTransportWsLink(AsyncTerminatingLink):
         default_factory=lambda: ssl.create_default_context(cafile=certifi.where())
     )
     """ The SSL Context to use for the connection """
+    codec: JSONCodec = Field(default_factory=get_codec, exclude=True)
+    """ The JSONCodec used to encode and decode messages """
     payload_token_to_querystring: bool = True
     """Should the payload token be sent as a querystring instead (as connection params
       is not supported by all servers)"""
 
+    subscription_buffer_size: int = 0
+    """ The number of events that are buffered for each subscription (0 means unbounded).
+    Can be set per operation with the buffer_size of its context """
+    overflow_policy: OverflowPolicy = "block"
+    """ What happens when the buffer of a subscription is full: block the receiver,
+    drop the oldest or the newest event, or only keep the latest event. Can be set per
+    operation with the overflow_policy of its context """
+
     _connection_lock: Optional[asyncio.Lock] = None
     _connected: bool = False
     _alive: bool = False
-    _send_queue: Optional[asyncio.Queue[str]] = None
+    _connection_dead: bool = False
     _connection_task: Optional[asyncio.Task[None]] = None
-    _ongoing_subscriptions: Optional[Dict[str, asyncio.Queue[TransportMessage]]] = None
-
-    async def aforward(self, message: str) -> None:
-        """Forwards a message to the websocket
-
-        Parameters
-        ----------
-        message : str
-            The message to forward
-
-        Raises
-        ------
-        LinkNotConnectedError
-            Raised if the link is not connected
-        """
-        if not self._send_queue:
-            raise LinkNotConnectedError("Link is not connected")
-        await self._send_queue.put(message)
+    _ongoing_subscriptions: Optional[Dict[str, SubscriptionQueue[TransportMessage]]] = None
 
     async def __aenter__(self) -> Self:
         """Enters the context manager of the link"""
         self._ongoing_subscriptions = {}
-        self._send_queue = asyncio.Queue()
+        self.open_send_queue()
         self._connection_lock = asyncio.Lock()
         return self
 
@@ -239,86 +234,87 @@ class SubscriptionTransportWsLink(AsyncTerminatingLink):
 
         This method is the main websocket loop. It will try to connect to the
         websocket, and will retry if it fails. It will also try to reconnect
-        if the connection is lost.
+        if the connection is lost (in this loop, not recursively).
         You should not call this method manually.
         """
-        send_task = None
-        receive_task = None
-        try:
+        while True:
+            send_task = None
+            receive_task = None
             try:
-                url = await self.build_url(operation)
-                async with websockets.connect(  # type: ignore
-                    url,
-                    subprotocols=[GQL_WS_SUBPROTOCOL],  # type: ignore
-                    ssl=self.ssl_context if url.startswith("wss") else None,
-                ) as client:  # type: ignore
-                    logger.info("Websocket successfully connected")
-
-                    send_task = asyncio.create_task(self.sending(client, operation))
-                    receive_task = asyncio.create_task(
-                        self.receiving(client, operation, connection_future)
-                    )
-
-                    self._alive = True
-                    done, pending = await asyncio.wait(
-                        [send_task, receive_task],
-                        return_when=asyncio.FIRST_EXCEPTION,
-                    )
-                    self._alive = False
-
-                    for task in pending:
-                        task.cancel()
+                try:
+                    url = await self.build_url(operation)
+                    async with websockets.connect(  # type: ignore
+                        url,
+                        subprotocols=[GQL_WS_SUBPROTOCOL],  # type: ignore
+                        ssl=self.ssl_context if url.startswith("wss") else None,
+                    ) as client:  # type: ignore
+                        logger.info("Websocket successfully connected")
+
+                        send_task = asyncio.create_task(self.sending(client, operation))
+                        receive_task = asyncio.create_task(
+                            self.receiving(client, operation, connection_future)
+                        )
 
-                    for task in done:
-                        exception = task.exception()
-                        if exception:
-                            raise exception
-                        else:
-                            raise CorrectableConnectionFail(
-                                f"Websocket connection closed without exception: This is unexpected behaviours. Results ist {task.result()}"
-                            )
+                        self._alive = True
+                        done, pending = await asyncio.wait(
+                            [send_task, receive_task],
+                            return_when=asyncio.FIRST_EXCEPTION,
+                        )
+                        self._alive = False
+
+                        for task in pending:
+                            task.cancel()
+
+                        for task in done:
+                            exception = task.exception()
+                            if exception:
+                                raise exception
+                            else:
+                                raise CorrectableConnectionFail(
+                                    f"Websocket connection closed without exception: This is unexpected behaviours. Results ist {task.result()}"
+                                )
+
+                except Exception as e:
+                    logger.warning("Websocket excepted. Trying to recover", exc_info=True)
+                    raise CorrectableConnectionFail from e
+
+            except CorrectableConnectionFail as e:
+                logger.info(
+                    f"Trying to Recover from Exception {e} Reconnect is {self.allow_reconnect} Retry: {retry}"
+                )
+                if retry > self.max_retries or not self.allow_reconnect:
+                    logger.error("Max retries reached. Aborting")
+                    self._connection_dead = True
+                    error = DefiniteConnectionFail("Exceeded Number of Retries")
+                    if connection_future and not connection_future.done():
+                        connection_future.set_exception(error)
+                    raise error
+                failure = e
+
+            except asyncio.CancelledError as e:
+                logger.info("Websocket got cancelled. Trying to shutdown graceully")
+                if send_task and receive_task:
+                    send_task.cancel()
+                    receive_task.cancel()
+
+                    await asyncio.gather(send_task, receive_task, return_exceptions=True)
+                raise e
 
             except Exception as e:
-                logger.warning("Websocket excepted. Trying to recover", exc_info=True)
-                raise CorrectableConnectionFail from e
-
-        except CorrectableConnectionFail as e:
-            logger.info(
-                f"Trying to Recover from Exception {e} Reconnect is {self.allow_reconnect} Retry: {retry}"
-            )
-            if retry > self.max_retries or not self.allow_reconnect:
-                logger.error("Max retries reached. Aborting")
-                raise DefiniteConnectionFail("Exceeded Number of Retries")
-
+                logger.error("Websocket excepted", exc_info=True)
+                self._connection_dead = True
+                if connection_future and not connection_future.done():
+                    connection_future.set_exception(e)
+                raise e
+
+            # reconnect outside of the except block, so that every reconnect
+            # neither nests a frame nor chains the previous failure
             await asyncio.sleep(self.time_between_retries)
             logger.info("Retrying to connect")
             await self.broadcast(
-                {"type": WEBSOCKET_DEAD, "error": e}, connection_future
+                {"type": WEBSOCKET_DEAD, "error": failure}, connection_future
             )
-            await self.websocket_loop(operation, connection_future, retry=retry + 1)
-
-        except DefiniteConnectionFail as e:
-            logger.error("Websocket excepted closed definetely", exc_info=True)
-            self.connection_dead = True
-            if connection_future and not connection_future.done():
-                connection_future.set_exception(e)
-            raise e
-
-        except asyncio.CancelledError as e:
-            logger.info("Websocket got cancelled. Trying to shutdown graceully")
-            if send_task and receive_task:
-                send_task.cancel()
-                receive_task.cancel()
-
-                await asyncio.gather(send_task, receive_task, return_exceptions=True)
-            raise e
-
-        except Exception as e:
-            logger.error("Websocket excepted", exc_info=True)
-            self.connection_dead = True
-            if connection_future and not connection_future.done():
-                connection_future.set_exception(e)
-            raise e
+            retry += 1
 
     async def sending(self, client: Any, initiating_operation: Operation) -> None:
         """The sending task
@@ -340,17 +336,10 @@ class SubscriptionTransportWsLink(AsyncTerminatingLink):
             "type": GQL_CONNECTION_INIT,
             "payload": {"headers": initiating_operation.context.headers},
         }
-        await client.send(json.dumps(payload))
+        await client.send(self.codec.dumps(payload))
 
         try:
-            while True:
-                if not self._send_queue:
-                    raise LinkNotConnectedError("Link is not connected")
-
-                message = await self._send_queue.get()
-                logger.debug("GraphQL Websocket: >>>>>> " + message)
-                await client.send(message)
-                self._send_queue.task_done()
+            await self.adrain_send_queue(client)
         except asyncio.CancelledError as e:
             logger.debug("Sending Task sucessfully Cancelled")  #
             raise e
@@ -383,14 +372,15 @@ class SubscriptionTransportWsLink(AsyncTerminatingLink):
             async for message in client:
                 logger.debug("GraphQL Websocket: <<<<<<< " + message)
                 try:
-                    message = json.loads(message)
-                    await self.broadcast(message, connection_future)
-                except json.JSONDecodeError as err:
+                    message = self.codec.loads(message)
+                except ValueError as err:
                     logger.warning(
                         "Ignoring. Server sent invalid JSON data: %s \n %s",
                         message,
                         err,
                     )
+                    continue
+                await self.broadcast(message, connection_future)
         except Exception as e:
             logger.warning("Websocket excepted. Trying to recover", exc_info=True)
             raise e
@@ -426,7 +416,7 @@ class SubscriptionTransportWsLink(AsyncTerminatingLink):
                 self._ongoing_subscriptions = {}
 
             for subscription in self._ongoing_subscriptions.values():
-                await subscription.put(message)
+                await subscription.put_event(message, droppable=False)
             return
 
         if type in [GQL_DATA, GQL_COMPLETE]:
@@ -440,7 +430,7 @@ class SubscriptionTransportWsLink(AsyncTerminatingLink):
             assert id in self._ongoing_subscriptions, (
                 "Received Result for subscription that is no longer or was never active"
             )
-            await self._ongoing_subscriptions[id].put(message)
+            await self._ongoing_subscriptions[id].put_event(message, droppable=type == GQL_DATA)
 
     async def aexecute(self, operation: Operation) -> AsyncIterator[GraphQLResult]:
         """Executes an operation against the link
@@ -473,7 +463,12 @@ class SubscriptionTransportWsLink(AsyncTerminatingLink):
         assert not operation.context.files, "We cannot send files through websockets"
 
         id = operation.id
-        subscribe_queue: asyncio.Queue[TransportMessage] = asyncio.Queue()
+        subscribe_queue: SubscriptionQueue[TransportMessage] = SubscriptionQueue(
+            operation.context.buffer_size
+            if operation.context.buffer_size is not None
+            else self.subscription_buffer_size,
+            operation.context.overflow_policy or self.overflow_policy,
+        )
         
         if not self._ongoing_subscriptions:
             self._ongoing_subscriptions = {}
@@ -492,7 +487,7 @@ class SubscriptionTransportWsLink(AsyncTerminatingLink):
                 "type": GQL_START,
                 "payload": send_payload,
             }
-            await self.aforward(json.dumps(frame))
+            await self.aforward(self.codec.dumps(frame))
             logger.debug(f"Subcription started {operation}")
 
             while True:
@@ -524,5 +519,5 @@ class SubscriptionTransportWsLink(AsyncTerminatingLink):
 
         except asyncio.CancelledError as e:
             logger.debug(f"Subcription ended {operation}")
-            await self.aforward(json.dumps({"id": id, "type": GQL_STOP}))
+            await self.aforward(self.codec.dumps({"id": id, "type": GQL_STOP}), control=True)
             raise e
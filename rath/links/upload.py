@@ -0,0 +1,327 @@
+"""Streamed multipart uploads (the GraphQL multipart request spec).
+
+Operations with files (see FileExtraction) are sent as multipart/form-data
+requests. Instead of reading the files into memory, a MultipartUpload builds
+the body as an async iterator of chunks, so that even very large files are
+sent with a bounded buffer:
+
+- regular files are memory mapped, and sent as views of the mapping (no copy
+  into Python buffers is made, and the kernel reads ahead)
+- in-memory buffers (bytes, io.BytesIO) are sent as views of the buffer
+- other file objects are read in a thread, chunk by chunk
+- aiohttp.StreamReader and async generators are passed on as they produce
+
+If the size of every file is known, the request has a Content-Length, so it is
+not sent with chunked transfer encoding (which some servers do not accept).
+"""
+
+import asyncio
+import inspect
+import io
+import mimetypes
+import mmap
+import os
+import stat
+import uuid
+from typing import Any, AsyncIterator, Callable, Dict, List, NamedTuple, Optional, Union
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None  # type: ignore[assignment]
+
+from rath.links.types import Payload
+from rath.operation import Operation
+
+Chunk = Union[bytes, bytearray, memoryview]
+
+
+class UploadProgress(NamedTuple):
+    """The progress of the upload of a file"""
+
+    operation: str
+    """ The display name of the operation """
+    path: str
+    """ The path of the file in the variables, e.g. "variables.file" """
+    sent: int
+    """ The bytes of the file that were sent """
+    total: Optional[int]
+    """ The size of the file in bytes (None if it is not known) """
+
+
+UploadProgressCallback = Callable[[UploadProgress], Any]
+"""A function that is called with the progress after every chunk of a file (it can be async)"""
+
+
+def _regular_fileno(file: Any) -> Optional[int]:
+    """The file descriptor of a file object, if it is backed by a regular file"""
+    if isinstance(file, io.TextIOBase):
+        return None
+    try:
+        fileno = file.fileno()
+    except (AttributeError, OSError, ValueError):
+        return None
+    return fileno if stat.S_ISREG(os.fstat(fileno).st_mode) else None
+
+
+def file_size(file: Any) -> Optional[int]:
+    """The number of bytes that will be uploaded for a file (None if it is not known)
+
+    Parameters
+    ----------
+    file : Any
+        The file (a file object, bytes, an aiohttp.StreamReader or an async generator)
+
+    Returns
+    -------
+    Optional[int]
+        The size, from the current position of the file to its end
+    """
+    if isinstance(file, (bytes, bytearray, memoryview)):
+        return memoryview(file).nbytes
+    if isinstance(file, io.BytesIO):
+        return file.getbuffer().nbytes - file.tell()
+    fileno = _regular_fileno(file)
+    if fileno is not None:
+        return max(0, os.fstat(fileno).st_size - file.tell())
+    return None
+
+
+def _chunks_of(buffer: memoryview, chunk_size: int) -> List[memoryview]:
+    return [buffer[i : i + chunk_size] for i in range(0, buffer.nbytes, chunk_size)]
+
+
+async def _aiter_mapped(file: Any, fileno: int, chunk_size: int) -> AsyncIterator[Chunk]:
+    """Send a regular file as views of its memory mapping"""
+    offset = file.tell()
+    size = os.fstat(fileno).st_size
+    if size <= offset:
+        return
+
+    mapping = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+    try:
+        if hasattr(mmap, "MADV_SEQUENTIAL"):
+            mapping.madvise(mmap.MADV_SEQUENTIAL)
+        view = memoryview(mapping)
+        for start in range(offset, size, chunk_size):
+            yield view[start : start + chunk_size]
+        # the file is consumed, as if it was read
+        file.seek(size)
+    finally:
+        try:
+            mapping.close()
+        except BufferError:
+            # a transport still holds a view, the mapping is closed once it is released
+            pass
+
+
+async def _aiter_read(file: Any, chunk_size: int) -> AsyncIterator[Chunk]:
+    """Read a (possibly blocking) file object in a thread, chunk by chunk"""
+    while True:
+        chunk = await asyncio.to_thread(file.read, chunk_size)
+        if not chunk:
+            return
+        yield chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+
+
+async def aiter_file(file: Any, chunk_size: int = 64 * 1024) -> AsyncIterator[Chunk]:
+    """Iterate over the chunks of a file, without reading it into memory
+
+    Parameters
+    ----------
+    file : Any
+        The file (a file object, bytes, an aiohttp.StreamReader or an async generator)
+    chunk_size : int, optional
+        The maximum size of a chunk, by default 64 KiB (chunks of async
+        generators are passed on as they are)
+
+    Yields
+    ------
+    Chunk
+        The chunks of the file
+    """
+    if isinstance(file, (bytes, bytearray, memoryview)):
+        for chunk in _chunks_of(memoryview(file).cast("B"), chunk_size):
+            yield chunk
+
+    elif isinstance(file, io.BytesIO):
+        buffer = file.getbuffer()
+        start = file.tell()
+        try:
+            for chunk in _chunks_of(buffer[start:], chunk_size):
+                yield chunk
+            file.seek(buffer.nbytes)
+        finally:
+            del buffer
+
+    elif aiohttp is not None and isinstance(file, aiohttp.StreamReader):
+        async for chunk in file.iter_chunked(chunk_size):
+            yield chunk
+
+    elif isinstance(file, io.IOBase):
+        fileno = _regular_fileno(file)
+        chunks = _aiter_mapped(file, fileno, chunk_size) if fileno is not None else _aiter_read(file, chunk_size)
+        async for chunk in chunks:
+            yield chunk
+
+    elif hasattr(file, "__aiter__"):
+        async for chunk in file:
+            yield chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+
+    else:
+        raise TypeError(f"Can not upload {type(file).__name__}, expected a file, bytes or an async generator")
+
+
+def _quote(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', "%22").replace("\r", "%0D").replace("\n", "%0A")
+
+
+class MultipartUpload:
+    """The body of a multipart/form-data request, streamed chunk by chunk
+
+    The form fields are sent first, followed by the files (in the order of the
+    files dict), as the GraphQL multipart request spec demands.
+    """
+
+    def __init__(
+        self,
+        fields: Dict[str, bytes],
+        files: Dict[str, Any],
+        chunk_size: int = 64 * 1024,
+        on_progress: Optional[UploadProgressCallback] = None,
+        operation_name: str = "",
+    ) -> None:
+        """Initialize the upload
+
+        Parameters
+        ----------
+        fields : Dict[str, bytes]
+            The JSON encoded form fields (e.g. "operations" and "map")
+        files : Dict[str, Any]
+            The files by their path in the variables (they are sent as the fields "0", "1", ...)
+        chunk_size : int, optional
+            The maximum size of the chunks the files are read in, by default 64 KiB
+        on_progress : Optional[UploadProgressCallback], optional
+            A function that is called with the progress after every chunk, by default None
+        operation_name : str, optional
+            The display name of the operation (passed on to on_progress)
+        """
+        self.boundary = uuid.uuid4().hex
+        self.fields = fields
+        self.files = files
+        self.chunk_size = chunk_size
+        self.on_progress = on_progress
+        self.operation_name = operation_name
+        self.sizes = {path: file_size(file) for path, file in files.items()}
+
+    @classmethod
+    def from_operation(
+        cls,
+        operation: Operation,
+        payload: Payload,
+        dumps: Callable[[Any], str],
+        chunk_size: int = 64 * 1024,
+        on_progress: Optional[UploadProgressCallback] = None,
+    ) -> "MultipartUpload":
+        """Build the upload of an operation with files (in operation.context.files)
+
+        Parameters
+        ----------
+        operation : Operation
+            The operation
+        payload : Payload
+            The payload of the operation (with the files replaced by nulls)
+        dumps : Callable[[Any], str]
+            The function that encodes JSON
+        chunk_size : int, optional
+            The maximum size of the chunks the files are read in, by default 64 KiB
+        on_progress : Optional[UploadProgressCallback], optional
+            A function that is called with the progress after every chunk, by default None
+
+        Returns
+        -------
+        MultipartUpload
+            The upload
+        """
+        files = operation.context.files
+        file_map = {str(i): [path] for i, path in enumerate(files)}
+        return cls(
+            {"operations": dumps(payload).encode("utf-8"), "map": dumps(file_map).encode("utf-8")},
+            files,
+            chunk_size=chunk_size,
+            on_progress=on_progress,
+            operation_name=operation.display_name,
+        )
+
+    @property
+    def content_type(self) -> str:
+        """The content type of the request (with the boundary)"""
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def _field_header(self, name: str) -> bytes:
+        return (
+            f"--{self.boundary}\r\n"
+            f'Content-Disposition: form-data; name="{_quote(name)}"\r\n'
+            f"Content-Type: application/json\r\n\r\n"
+        ).encode("utf-8")
+
+    def _file_header(self, name: str, file: Any) -> bytes:
+        filename = os.path.basename(str(getattr(file, "name", None) or name))
+        content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        return (
+            f"--{self.boundary}\r\n"
+            f'Content-Disposition: form-data; name="{name}"; filename="{_quote(filename)}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n"
+        ).encode("utf-8")
+
+    def _closing(self) -> bytes:
+        return f"--{self.boundary}--\r\n".encode("utf-8")
+
+    @property
+    def content_length(self) -> Optional[int]:
+        """The length of the body (None if the size of a file is not known)"""
+        if any(size is None for size in self.sizes.values()):
+            return None
+
+        length = len(self._closing())
+        for name, value in self.fields.items():
+            length += len(self._field_header(name)) + len(value) + 2
+        for i, (path, file) in enumerate(self.files.items()):
+            length += len(self._file_header(str(i), file)) + self.sizes[path] + 2  # type: ignore[operator]
+        return length
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        """The headers of the request"""
+        headers = {"Content-Type": self.content_type}
+        length = self.content_length
+        if length is not None:
+            headers["Content-Length"] = str(length)
+        return headers
+
+    async def _report(self, path: str, sent: int) -> None:
+        if self.on_progress:
+            result = self.on_progress(UploadProgress(self.operation_name, path, sent, self.sizes[path]))
+            if inspect.isawaitable(result):
+                await result
+
+    async def __aiter__(self) -> AsyncIterator[Chunk]:
+        """Iterate over the chunks of the body"""
+        for name, value in self.fields.items():
+            yield self._field_header(name) + value + b"\r\n"
+
+        for i, (path, file) in enumerate(self.files.items()):
+            yield self._file_header(str(i), file)
+            sent = 0
+            async for chunk in aiter_file(file, self.chunk_size):
+                yield chunk
+                # the transport took the chunk
+                sent += chunk.nbytes if isinstance(chunk, memoryview) else len(chunk)
+                await self._report(path, sent)
+
+            expected = self.sizes[path]
+            if expected is not None and sent != expected:
+                raise ValueError(f"{path} changed during the upload: expected {expected} bytes, got {sent}")
+            yield b"\r\n"
+
+        yield self._closing()
@@ -1,4 +1,10 @@
-from typing import Dict, Any, Callable, Optional
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, Callable, List, NamedTuple, Optional
+
+from rath.links.errors import MalformedResponseError
+from rath.links.types import Payload
+from rath.operation import GraphQLException, GraphQLResult, Operation
 
 
 def recurse_parse_variables(
@@ -50,3 +56,189 @@ def recurse_parse_variables(
     dicted_variables = recurse_extract(variables)
 
     return dicted_variables
+
+
+def parse_graphql_response(
+    json_response: Any,
+    operation: Operation,
+    endpoint_url: Optional[str] = None,
+) -> GraphQLResult:
+    """Parse a decoded GraphQL response
+
+    Converts a decoded GraphQL response (a dict with data and/or errors) into
+    a GraphQLResult, raising if the server returned errors.
+
+    Args:
+        json_response (Any): The decoded response
+        operation (Operation): The operation the response belongs to
+        endpoint_url (str, optional): The endpoint that was queried (for error messages)
+
+    Raises:
+        GraphQLException: If the response contains errors
+        MalformedResponseError: If the response contains neither data nor errors
+
+    Returns:
+        GraphQLResult: The result of the operation
+    """
+    if not isinstance(json_response, dict):
+        raise MalformedResponseError(
+            f"Response from {endpoint_url} for operation "
+            f"'{operation.display_name}' is not a JSON object: {json_response}"
+        )
+
+    if "errors" in json_response:
+        raise GraphQLException(
+            "\n".join([e["message"] for e in json_response["errors"]]),
+            operation=operation,
+            endpoint_url=endpoint_url,
+            errors=json_response["errors"],
+        )
+
+    if "data" not in json_response:
+        raise MalformedResponseError(
+            f"Response from {endpoint_url} for operation "
+            f"'{operation.display_name}' contains neither "
+            f"'data' nor 'errors': {json_response}"
+        )
+
+    return GraphQLResult(data=json_response["data"])
+
+
+def build_payload(operation: Operation) -> Payload:
+    """Build the JSON payload for a single operation
+
+    The document is left out if the context asks to omit it (e.g. for a
+    persisted query), and the extensions of the context are forwarded.
+
+    Parameters
+    ----------
+    operation : Operation
+        The operation
+
+    Returns
+    -------
+    Payload
+        The payload, containing the query, the variables and the extensions
+    """
+    if operation.context.omit_document:
+        payload: Payload = {"variables": operation.variables}
+    else:
+        payload = {"query": operation.document, "variables": operation.variables}
+    if operation.context.extensions:
+        payload["extensions"] = operation.context.extensions
+    return payload
+
+
+def build_query_params(payload: Dict[str, Any], dumps: Callable[[Any], str]) -> Dict[str, str]:
+    """Builds the query string parameters for a GraphQL GET request
+
+    Following the GraphQL over HTTP convention, the query is sent as is and
+    the variables and extensions are sent as JSON encoded strings.
+
+    Parameters
+    ----------
+    payload : Dict[str, Any]
+        The payload of the operation (see build_payload)
+    dumps : Callable[[Any], str]
+        The function to serialize the variables and extensions to JSON
+
+    Returns
+    -------
+    Dict[str, str]
+        The query string parameters
+    """
+    params = {}
+    for key, value in payload.items():
+        if key == "query":
+            params[key] = value
+        elif value:
+            params[key] = dumps(value)
+    return params
+
+
+class SendQueueInfo(NamedTuple):
+    """Statistics of the send queue of a websocket link"""
+
+    depth: int
+    max_depth: int
+    maxsize: int
+    messages: int
+    bursts: int
+    mean_latency: float
+    max_latency: float
+
+
+class SendQueueStats:
+    """Collects the queue depth and send latency of the send queue of a websocket link.
+
+    The latency of a message is the time between it being put into the queue
+    and it being written to the websocket.
+    """
+
+    def __init__(self) -> None:
+        """Initialize empty statistics"""
+        self.max_depth = 0
+        self.messages = 0
+        self.bursts = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def record_enqueue(self, depth: int) -> None:
+        """Record the depth of the queue after a message was put into it"""
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def record_burst(self, enqueued_at: List[float], sent_at: float) -> None:
+        """Record a burst of messages that were sent together
+
+        Parameters
+        ----------
+        enqueued_at : List[float]
+            The (monotonic) times the messages were put into the queue
+        sent_at : float
+            The (monotonic) time the burst was written to the websocket
+        """
+        self.bursts += 1
+        self.messages += len(enqueued_at)
+        for timestamp in enqueued_at:
+            latency = sent_at - timestamp
+            self.total_latency += latency
+            if latency > self.max_latency:
+                self.max_latency = latency
+
+    def info(self, depth: int, maxsize: int) -> SendQueueInfo:
+        """Get the statistics, together with the current depth of the queue"""
+        return SendQueueInfo(
+            depth=depth,
+            max_depth=self.max_depth,
+            maxsize=maxsize,
+            messages=self.messages,
+            bursts=self.bursts,
+            mean_latency=self.total_latency / self.messages if self.messages else 0.0,
+            max_latency=self.max_latency,
+        )
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse the value of a Retry-After header
+
+    Args:
+        value (str, optional): The header value, either seconds or an HTTP date
+
+    Returns:
+        float, optional: The seconds to wait (never negative), or None if the
+            header is missing or invalid
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
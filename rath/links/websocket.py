@@ -0,0 +1,127 @@
+"""The send path that the websocket links share.
+
+Messages are not written to the websocket by the operations themselves, but
+put into a send queue, that the sending task of the link drains while the
+websocket is connected. This keeps the writes of concurrent operations in
+order, and lets operations be started (and stopped) while the link reconnects.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Optional, Tuple
+
+from rath.links.base import AsyncTerminatingLink
+from rath.links.errors import LinkNotConnectedError, SendQueueFullError
+from rath.links.utils import SendQueueInfo, SendQueueStats
+
+logger = logging.getLogger(__name__)
+
+
+class QueuedWebsocketLink(AsyncTerminatingLink):
+    """QueuedWebsocketLink is the base class of terminating links that send
+    messages over a websocket through a send queue.
+
+    Operations put their messages into the queue with aforward, and the
+    sending task of the link writes them with adrain_send_queue. Messages are
+    taken from the queue in bursts of up to max_send_burst messages, and the
+    messages of a burst are written back to back: websockets only waits for
+    the transport if its write buffer is full, so a burst is written without
+    yielding to the event loop in between. Every message is still sent as its
+    own websocket frame, as the protocols demand.
+    """
+
+    send_queue_size: int = 1000
+    """ The maximum number of messages waiting to be sent (0 means unbounded). Starting
+    an operation while the queue is full raises a SendQueueFullError. Control messages
+    (e.g. stopping operations, pongs and pings) are always queued """
+    max_send_burst: int = 100
+    """ The maximum number of queued messages that are written to the websocket in
+    one burst, before the send loop yields to the event loop again """
+
+    _send_queue: Optional[asyncio.Queue[Tuple[float, str]]] = None
+    _send_stats: SendQueueStats = SendQueueStats()
+
+    def open_send_queue(self) -> None:
+        """Create an empty send queue (and reset its statistics), when the link is entered"""
+        # the queue is bounded by aforward, so that control messages never wait
+        self._send_queue = asyncio.Queue()
+        self._send_stats = SendQueueStats()
+
+    async def aforward(self, message: str, control: bool = False) -> None:
+        """Forward a message to the server
+
+        Puts the message in the send queue, without waiting: the queue is not
+        drained while the websocket is down, so waiting could block forever.
+
+        Parameters
+        ----------
+        message : str
+            The message to send
+        control : bool, optional
+            Whether the message is a control message (e.g. a stop or a pong), that
+            is queued even if the queue is full, by default False
+
+        Raises
+        ------
+        LinkNotConnectedError
+            Raised if the link is not connected
+        SendQueueFullError
+            Raised if the queue is full, and the message is not a control message
+        """
+        if not self._send_queue:
+            raise LinkNotConnectedError("Link is not connected")
+        if not control and self.send_queue_size and self._send_queue.qsize() >= self.send_queue_size:
+            raise SendQueueFullError(
+                f"{self._send_queue.qsize()} messages are waiting to be sent, not starting another operation"
+            )
+
+        self._send_queue.put_nowait((time.monotonic(), message))
+        self._send_stats.record_enqueue(self._send_queue.qsize())
+
+    def send_info(self) -> SendQueueInfo:
+        """Get the statistics of the send queue (queue depth and send latency)"""
+        return self._send_stats.info(
+            self._send_queue.qsize() if self._send_queue else 0,
+            self.send_queue_size,
+        )
+
+    def discard_send_queue(self) -> None:
+        """Drop the messages that were queued for a connection that failed"""
+        if not self._send_queue:
+            return
+
+        discarded = 0
+        while not self._send_queue.empty():
+            self._send_queue.get_nowait()
+            self._send_queue.task_done()
+            discarded += 1
+        if discarded:
+            logger.debug(f"Discarded {discarded} messages queued for the failed connection")
+
+    async def adrain_send_queue(self, client: Any) -> None:
+        """Write the messages of the send queue to the websocket, as they arrive
+
+        This runs until it is cancelled (or the websocket fails), and is
+        called by the sending task of the link.
+
+        Parameters
+        ----------
+        client : websocket.Client
+            The websockets client
+        """
+        while True:
+            if not self._send_queue:
+                raise LinkNotConnectedError("Link is not connected")
+
+            burst = [await self._send_queue.get()]
+            while len(burst) < self.max_send_burst and not self._send_queue.empty():
+                burst.append(self._send_queue.get_nowait())
+
+            for _, message in burst:
+                logger.debug("GraphQL Websocket: >>>>>> %s", message)
+                await client.send(message)
+
+            self._send_stats.record_burst([enqueued_at for enqueued_at, _ in burst], time.monotonic())
+            for _ in burst:
+                self._send_queue.task_done()
@@ -1,4 +1,7 @@
-from typing import Optional, Dict, Any, Union
+from collections import OrderedDict
+import secrets
+import threading
+from typing import List, Literal, NamedTuple, Optional, Dict, Any, Tuple, Type, TypeVar, Union
 from graphql.language import OperationDefinitionNode, print_ast
 from graphql import (
     DocumentNode,
@@ -6,7 +9,60 @@ from graphql import (
     parse,
 )
 from pydantic import BaseModel, ConfigDict, Field
-import uuid
+
+
+TModel = TypeVar("TModel", bound=BaseModel)
+
+_object_setattr = object.__setattr__
+
+
+def new_operation_id() -> str:
+    """Generate a new random operation id (128 bit, hex encoded)
+
+    The ids are drawn from the operating system, not from the random module,
+    so that seeding the random module (as test suites often do) can not
+    repeat them.
+    """
+    return secrets.token_hex(16)
+
+
+def trusted_construct(cls: Type[TModel], values: Dict[str, Any]) -> TModel:
+    """Construct a pydantic model from trusted values, skipping validation.
+
+    This is a leaner version of BaseModel.model_construct for the hot path:
+    values must contain every field of the model (no defaults are applied)
+    and are stored as is (no copies are made). The result is a regular
+    instance of the model.
+
+    Parameters
+    ----------
+    cls : Type[TModel]
+        The model class
+    values : Dict[str, Any]
+        The value of every field of the model
+
+    Returns
+    -------
+    TModel
+        The constructed model
+    """
+    model = cls.__new__(cls)
+    _object_setattr(model, "__dict__", values)
+    _object_setattr(model, "__pydantic_fields_set__", set(values))
+    _object_setattr(model, "__pydantic_extra__", None)
+    _object_setattr(model, "__pydantic_private__", None)
+    return model
+
+
+CachePolicy = Literal["cache-first", "network-only", "cache-and-network"]
+"""How a caching link should treat an operation: serve it from the cache if possible
+(cache-first), always fetch it (network-only), or serve it from the cache while
+fetching a fresh result (cache-and-network)."""
+
+OverflowPolicy = Literal["block", "drop_oldest", "drop_newest", "latest"]
+"""What happens when the buffer of a subscription is full: wait for the consumer
+(block), drop the oldest buffered event (drop_oldest), drop the incoming event
+(drop_newest) or only keep the most recent event (latest)."""
 
 
 class Context(BaseModel):
@@ -18,6 +74,16 @@ class Context(BaseModel):
     kwargs: Dict[str, Any] = Field(default_factory=dict)
     extensions: Dict[str, Any] = Field(default_factory=dict)
     omit_document: bool = False
+    cache_policy: Optional[CachePolicy] = None
+    """The cache policy for this operation, None means the default of the caching link."""
+    buffer_size: Optional[int] = None
+    """The number of events buffered for this subscription, None means the default of the link."""
+    overflow_policy: Optional[OverflowPolicy] = None
+    """What happens when the buffer of this subscription is full, None means the default of the link."""
+    stream_path: Optional[List[str]] = None
+    """The path (e.g. ["data", "items"]) of a list in the response, whose items are decoded
+    incrementally and yielded as partial results as they arrive, None means the response is
+    decoded as a whole."""
 
 
 class Extensions(BaseModel):
@@ -37,7 +103,7 @@ class Operation(BaseModel):
     """
 
     model_config = ConfigDict(arbitrary_types_allowed=True)
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=new_operation_id)
     document_node: DocumentNode
     node: OperationDefinitionNode
     document: str
@@ -101,11 +167,149 @@ class SubscriptionDisconnect(GraphQLException):
     pass
 
 
+class ParsedDocument(NamedTuple):
+    """A parsed document, as stored in the DocumentCache"""
+
+    document_node: DocumentNode
+    node: OperationDefinitionNode
+    document: str
+
+
+class DocumentCacheInfo(NamedTuple):
+    """Statistics of a DocumentCache"""
+
+    hits: int
+    misses: int
+    evictions: int
+    maxsize: int
+    currsize: int
+
+
+class DocumentCache:
+    """A bounded, thread-safe LRU cache of parsed documents.
+
+    Parsing and printing a document is by far the most expensive part of
+    creating an operation, and most applications (e.g. turms generated ones)
+    send the same documents over and over again. The cache is keyed by the
+    query string and the operation name, and stores the parsed DocumentNode,
+    the selected OperationDefinitionNode and the printed document.
+
+    Cached nodes are shared between operations and must not be mutated.
+    """
+
+    def __init__(self, maxsize: int = 512) -> None:
+        """Initialize the cache
+
+        Parameters
+        ----------
+        maxsize : int, optional
+            The maximum number of cached documents (0 disables the cache), by default 512
+        """
+        self.maxsize = maxsize
+        self._entries: OrderedDict[Tuple[str, Optional[str]], ParsedDocument] = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, query: str, operation_name: Optional[str] = None) -> ParsedDocument:
+        """Get the parsed document for a query, parsing it on a cache miss
+
+        Parameters
+        ----------
+        query : str
+            The query string
+        operation_name : Optional[str], optional
+            The name of the operation to select, by default None
+
+        Returns
+        -------
+        ParsedDocument
+            The parsed document
+        """
+        key = (query, operation_name)
+        with self._lock:
+            parsed = self._entries.get(key)
+            if parsed is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return parsed
+            self._misses += 1
+
+        # parse outside of the lock, worst case two threads parse the same document
+        parsed = parse_document(parse(query), operation_name)
+
+        if self.maxsize > 0:
+            with self._lock:
+                self._entries[key] = parsed
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self._evictions += 1
+
+        return parsed
+
+    def resize(self, maxsize: int) -> None:
+        """Change the maximum size of the cache, evicting the least recently used entries"""
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._entries) > max(maxsize, 0):
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def clear(self) -> None:
+        """Remove all entries and reset the statistics"""
+        with self._lock:
+            self._entries.clear()
+            self._hits = 0
+            self._misses = 0
+            self._evictions = 0
+
+    def info(self) -> DocumentCacheInfo:
+        """Get the statistics of the cache"""
+        with self._lock:
+            return DocumentCacheInfo(
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                maxsize=self.maxsize,
+                currsize=len(self._entries),
+            )
+
+
+def parse_document(document: DocumentNode, operation_name: Optional[str] = None) -> ParsedDocument:
+    """Select the operation of a document and print it
+
+    Parameters
+    ----------
+    document : DocumentNode
+        The parsed document
+    operation_name : Optional[str], optional
+        The name of the operation to select, by default None
+
+    Returns
+    -------
+    ParsedDocument
+        The parsed document
+    """
+    op = get_operation_ast(document, operation_name)
+    assert op, f"No operation named {operation_name}"
+    return ParsedDocument(document_node=document, node=op, document=print_ast(document))
+
+
+document_cache = DocumentCache()
+"""The process wide cache of parsed documents used by opify"""
+
+
 def opify(
     query: Union[str, DocumentNode],
     variables: Optional[Dict[str, Any]] = None,
     headers: Optional[Dict[str, Any]] = None,
     operation_name: Optional[str] = None,
+    cache_policy: Optional[CachePolicy] = None,
+    buffer_size: Optional[int] = None,
+    overflow_policy: Optional[OverflowPolicy] = None,
+    stream_path: Optional[List[str]] = None,
     **kwargs: Any,
 ) -> Operation:
     """Opify takes a query, variables, and headers and returns an Operation.
@@ -114,6 +318,11 @@ def opify(
     used to execute queries, mutations, and subscriptions, and can carry additional
     information in their context and extensions.
 
+    Query strings are parsed through the process wide document_cache, so
+    repeated calls with the same query skip parsing entirely. As the inputs
+    are already known to be valid, the Operation, Context and Extensions
+    are constructed without pydantic validation.
+
     Parameters
     ----------
     query : Union[str, DocumentNode]
@@ -124,6 +333,14 @@ def opify(
         The headers to use, by default None
     operation_name : Optional[str], optional
         The operation name to use, by default None
+    cache_policy : Optional[CachePolicy], optional
+        The cache policy for caching links, by default None (the link's default)
+    buffer_size : Optional[int], optional
+        The number of buffered events of a subscription, by default None (the link's default)
+    overflow_policy : Optional[OverflowPolicy], optional
+        What happens when the buffer of a subscription is full, by default None (the link's default)
+    stream_path : Optional[List[str]], optional
+        The path of a list in the response to stream incrementally, by default None
 
     Returns
     -------
@@ -131,15 +348,38 @@ def opify(
         The operation that can be executed
     """
 
-    document = parse(query) if isinstance(query, str) else query
-    op = get_operation_ast(document, operation_name)
-    assert op, f"No operation named {operation_name}"
-    return Operation(
-        node=op,
-        document=print_ast(document),
-        document_node=document,
-        variables=variables or {},
-        operation_name=operation_name,
-        extensions=Extensions(),
-        context=Context(headers=headers or {}, kwargs=kwargs),
+    if isinstance(query, str):
+        parsed = document_cache.get(query, operation_name)
+    else:
+        parsed = parse_document(query, operation_name)
+
+    context = trusted_construct(
+        Context,
+        {
+            "headers": dict(headers) if headers else {},
+            "files": {},
+            "initial_payload": {},
+            "kwargs": kwargs,
+            "extensions": {},
+            "omit_document": False,
+            "cache_policy": cache_policy,
+            "buffer_size": buffer_size,
+            "overflow_policy": overflow_policy,
+            "stream_path": list(stream_path) if stream_path else None,
+        },
+    )
+    extensions = trusted_construct(Extensions, {"pollInterval": None, "maxPolls": None})
+
+    return trusted_construct(
+        Operation,
+        {
+            "id": new_operation_id(),
+            "document_node": parsed.document_node,
+            "node": parsed.node,
+            "document": parsed.document,
+            "variables": dict(variables) if variables else {},
+            "operation_name": operation_name,
+            "extensions": extensions,
+            "context": context,
+        },
     )
@@ -9,13 +9,17 @@ from typing import (
     Any,
     Generator,
     Optional,
+    Sequence,
     Type,
 )
 from typing import Union
 from graphql import (
     DocumentNode,
 )
-from rath.operation import GraphQLResult, Operation, opify
+from rath.buffer import abuffered
+from rath.links.incremental import uses_incremental_delivery
+from rath.links.streaming import get_items
+from rath.operation import GraphQLResult, Operation, OverflowPolicy, opify
 from contextvars import ContextVar, Token
 from koil import unkoil_gen, unkoil
 
@@ -89,12 +93,26 @@ class Rath(KoiledModel):
         return link
 
     async def aquery_operation(self, operation: Operation) -> GraphQLResult:
-        """Asynchronously executes a query or mutation using the Rath client."""
+        """Asynchronously executes a query or mutation using the Rath client.
+
+        Operations with @defer or @stream are delivered incrementally, with a
+        merged result after every part, so the last result is the complete one.
+        Operations with a stream_path are rejected, as their results are only
+        partial chunks of the list (use astream_items instead).
+        """
+        if operation.context.stream_path:
+            raise ValueError(
+                "Queries with a stream_path return their list in chunks, which can not be "
+                "returned as one result. Use astream_items (or stream_items) instead."
+            )
+
         result = None
+        incremental = uses_incremental_delivery(operation)
 
         async for data in self.link.aexecute(operation):
             result = data
-            break
+            if not incremental:
+                break
 
         if not result:
             raise NotConnectedError("Could not retrieve data from the server.")
@@ -115,6 +133,10 @@ class Rath(KoiledModel):
         If provided, the operation_name will be used to identify which operation
         to execute.
 
+        Queries with @defer or @stream return once all parts arrived. To receive
+        the (merged) result after every part, use asubscribe instead. To stream
+        the items of a large list, use astream_items.
+
         Args:
             query (str | DocumentNode): The query string or the DocumentNode.
             variables (Dict[str, Any], optional): The variables. Defaults to None.
@@ -124,6 +146,7 @@ class Rath(KoiledModel):
 
         Raises:
             NotConnectedError: An error when the Rath is not connected and autoload is set to false
+            ValueError: If a stream_path is passed (use astream_items instead)
 
         Returns:
             GraphQLResult: The result of the query
@@ -155,11 +178,12 @@ class Rath(KoiledModel):
 
         Raises:
             NotConnectedError: An error when the Rath is not connected and autoload is set to false
+            ValueError: If a stream_path is passed (use stream_items instead)
 
         Returns:
             GraphQLResult: The result of the query
         """
-        return unkoil(self.aquery, query, variables, headers, operation_name)
+        return unkoil(self.aquery, query, variables, headers, operation_name, **kwargs)
 
     def subscribe(
         self,
@@ -167,6 +191,8 @@ class Rath(KoiledModel):
         variables: Optional[Dict[str, Any]] = None,
         headers: Optional[Dict[str, Any]] = None,
         operation_name: Optional[str] = None,
+        buffer_size: Optional[int] = None,
+        overflow_policy: Optional[OverflowPolicy] = None,
         **kwargs: Any,
     ) -> Generator[GraphQLResult, None, None]:
         """Subscripe to a GraphQL API.
@@ -174,11 +200,18 @@ class Rath(KoiledModel):
         Takes a querystring, variables, and headers and returns an async iterator
         that yields the results.
 
+        If a buffer_size or overflow_policy is set, events are received in the
+        background while the calling thread processes the previous event, and
+        the buffer between the two is bounded by buffer_size and handled by
+        overflow_policy (the same settings are passed to the links).
+
         Args:
             query (str | DocumentNode): The query string or the DocumentNode.
             variables (Dict[str, Any], optional): The variables. Defaults to None.
             headers (Dict[str, Any], optional): Additional headers. Defaults to None.
             operation_name (str, optional): The operation_name to executed. Defaults to all.
+            buffer_size (int, optional): The number of buffered events (0 means unbounded). Defaults to None.
+            overflow_policy (OverflowPolicy, optional): What happens when the buffer is full. Defaults to None.
             **kwargs: Additional arguments to pass to the link chain
 
         Raises:
@@ -187,10 +220,47 @@ class Rath(KoiledModel):
         Yields:
             Iterator[GraphQLResult]: The result of the query as an async iterator
         """
+        if buffer_size is None and overflow_policy is None:
+            return unkoil_gen(
+                self.asubscribe, query, variables, headers, operation_name, **kwargs
+            )
+
         return unkoil_gen(
-            self.asubscribe, query, variables, headers, operation_name, **kwargs
+            self._abuffered_subscribe,
+            query,
+            variables,
+            headers,
+            operation_name,
+            buffer_size,
+            overflow_policy,
+            **kwargs,
         )
 
+    async def _abuffered_subscribe(
+        self,
+        query: str,
+        variables: Optional[Dict[str, Any]],
+        headers: Optional[Dict[str, Any]],
+        operation_name: Optional[str],
+        buffer_size: Optional[int],
+        overflow_policy: Optional[OverflowPolicy],
+        **kwargs: Any,
+    ) -> AsyncGenerator[GraphQLResult, None]:
+        """Subscribes to a GraphQL API, buffering the events in the background"""
+        op = opify(
+            query,
+            variables,
+            headers,
+            operation_name,
+            buffer_size=buffer_size,
+            overflow_policy=overflow_policy,
+            **kwargs,
+        )
+        async for data in abuffered(
+            self.link.aexecute(op), buffer_size or 0, overflow_policy or "block"
+        ):
+            yield data
+
     async def asubscribe(
         self,
         query: str,
@@ -222,6 +292,73 @@ class Rath(KoiledModel):
         async for data in self.link.aexecute(op):
             yield data
 
+    async def astream_items(
+        self,
+        query: Union[str, DocumentNode],
+        path: Union[str, Sequence[str]],
+        variables: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, Any]] = None,
+        operation_name: Optional[str] = None,
+        **kwargs: Any,
+    ) -> AsyncGenerator[Any, None]:
+        """Query the GraphQL API, and iterate over the items of a list in the response.
+
+        The response is decoded incrementally by terminating links that support
+        streaming (e.g. the AIOHttpLink and the HttpxLink), so items are yielded
+        as they arrive, and large lists are never held in memory as a whole.
+        Other links return the whole result, whose items are yielded.
+
+        Args:
+            query (str | DocumentNode): The query string or the DocumentNode.
+            path (str | Sequence[str]): The path of the list in the response, e.g. "data.items".
+            variables (Dict[str, Any], optional): The variables. Defaults to None.
+            headers (Dict[str, Any], optional): Additional headers. Defaults to None.
+            operation_name (str, optional): The operation_name to executed. Defaults to all.
+            **kwargs: Additional arguments to pass to the link chain
+
+        Raises:
+            ValueError: If the path does not start with "data"
+
+        Yields:
+            Any: The items of the list
+        """
+        stream_path = path.split(".") if isinstance(path, str) else list(path)
+        if not stream_path or stream_path[0] != "data":
+            raise ValueError(f"The path {path} needs to start with 'data'")
+
+        op = opify(query, variables, headers, operation_name, stream_path=stream_path, **kwargs)
+        async for result in self.link.aexecute(op):
+            for item in get_items(result.data, stream_path[1:]):
+                yield item
+
+    def stream_items(
+        self,
+        query: Union[str, DocumentNode],
+        path: Union[str, Sequence[str]],
+        variables: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, Any]] = None,
+        operation_name: Optional[str] = None,
+        **kwargs: Any,
+    ) -> Generator[Any, None, None]:
+        """Query the GraphQL API, and iterate over the items of a list in the response.
+
+        See astream_items.
+
+        Args:
+            query (str | DocumentNode): The query string or the DocumentNode.
+            path (str | Sequence[str]): The path of the list in the response, e.g. "data.items".
+            variables (Dict[str, Any], optional): The variables. Defaults to None.
+            headers (Dict[str, Any], optional): Additional headers. Defaults to None.
+            operation_name (str, optional): The operation_name to executed. Defaults to all.
+            **kwargs: Additional arguments to pass to the link chain
+
+        Yields:
+            Iterator[Any]: The items of the list
+        """
+        return unkoil_gen(
+            self.astream_items, query, path, variables, headers, operation_name, **kwargs
+        )
+
     async def __aenter__(self) -> "Rath":
         """Enters the context manager of the link"""
         self._entered = True
@@ -1,9 +1,10 @@
 """Tests for ApqLink (Automatic Persisted Queries)."""
 import hashlib
+import json
 import pytest
 from typing import AsyncIterator
 
-from rath.links.apq import ApqLink
+from rath.links.apq import ApqLink, ManifestEntry, hash_document, load_manifest
 from rath.links.base import AsyncTerminatingLink
 from rath.links import compose
 from rath.errors import NotComposedError
@@ -133,8 +134,8 @@ async def test_apq_retries_with_full_query_on_persisted_query_not_found():
     assert results == [GraphQLResult(data={"hello": "from-cache"})]
 
 
-async def test_apq_clears_persisted_query_on_fallback():
-    """On fallback the persistedQuery extension is removed from context."""
+async def test_apq_keeps_persisted_query_on_fallback():
+    """On fallback the persistedQuery extension is kept, so the server registers the hash."""
     terminal, state = _make_apq_server_link("PersistedQueryNotFound")
     link = compose(ApqLink(), terminal)
 
@@ -142,9 +143,8 @@ async def test_apq_clears_persisted_query_on_fallback():
         async for _ in link.aexecute(opify(QUERY)):
             pass
 
-    # Second call (fallback) should not have persistedQuery in extensions
     second_op: Operation = state["received"][1]
-    assert "persistedQuery" not in second_op.context.extensions
+    assert second_op.context.extensions["persistedQuery"]["sha256Hash"] == _sha256(second_op.document)
 
 
 async def test_apq_restores_omit_document_on_fallback():
@@ -206,3 +206,101 @@ async def test_apq_raises_not_composed_error_without_next():
     with pytest.raises(NotComposedError):
         async for _ in apq.aexecute(opify(QUERY)):
             pass
+
+
+# ---------------------------------------------------------------------------
+# Hash cache, known persisted queries and manifests
+# ---------------------------------------------------------------------------
+
+
+def test_hash_document_is_cached():
+    hash_document.cache_clear()
+    hash_document("query { a }")
+    hash_document("query { a }")
+
+    assert hash_document.cache_info().hits == 1
+
+
+async def test_apq_registers_unknown_documents_with_the_fallback():
+    """Once the fallback registered the document, only its hash is sent."""
+    registered: set = set()
+    requests: list = []
+
+    class ApqServerLink(AsyncTerminatingLink):
+        async def aexecute(self, operation: Operation) -> AsyncIterator[GraphQLResult]:
+            sha256_hash = operation.context.extensions["persistedQuery"]["sha256Hash"]
+            requests.append(operation.context.omit_document)
+            if operation.context.omit_document:
+                if sha256_hash not in registered:
+                    raise GraphQLException("PersistedQueryNotFound")
+            else:
+                # a server only registers a hash that arrives together with its document
+                registered.add(sha256_hash)
+            yield GraphQLResult(data={"hello": "world"})
+
+    link = compose(ApqLink(), ApqServerLink())
+
+    async with link:
+        for _ in range(3):
+            async for _ in link.aexecute(opify(QUERY)):
+                pass
+
+    # hash only, hash with document (registration), then hash only
+    assert requests == [True, False, True, True]
+    assert registered == {_sha256(opify(QUERY).document)}
+
+
+async def test_apq_uses_manifest_hashes(tmp_path):
+    manifest = tmp_path / "manifest.json"
+    manifest.write_text(
+        json.dumps(
+            {
+                "format": "apollo-persisted-query-manifest",
+                "version": 1,
+                "operations": [{"id": "hello-hash", "name": None, "type": "query", "body": QUERY}],
+            }
+        )
+    )
+    terminal, received = _make_capturing_link()
+    link = compose(ApqLink(manifest=str(manifest)), terminal)
+
+    async with link:
+        async for _ in link.aexecute(opify(QUERY)):
+            pass
+
+    assert received[0].context.extensions["persistedQuery"]["sha256Hash"] == "hello-hash"
+    assert received[0].context.omit_document is True
+
+
+def test_load_manifest_accepts_plain_mappings():
+    assert load_manifest({"abc": "query { hello }"}) == {
+        opify("query { hello }").document: ManifestEntry("abc", "query { hello }")
+    }
+
+
+async def test_apq_registers_manifest_documents_with_their_original_body():
+    """The server re-hashes the document of a registration, so the manifest body is sent."""
+    body = "query Hello { hello }"
+    registered: set = set()
+
+    class HashCheckingServerLink(AsyncTerminatingLink):
+        async def aexecute(self, operation: Operation) -> AsyncIterator[GraphQLResult]:
+            sha256_hash = operation.context.extensions["persistedQuery"]["sha256Hash"]
+            if operation.context.omit_document:
+                if sha256_hash not in registered:
+                    raise GraphQLException("PersistedQueryNotFound")
+            else:
+                if _sha256(operation.document) != sha256_hash:
+                    raise GraphQLException("provided sha does not match query")
+                registered.add(sha256_hash)
+            yield GraphQLResult(data={"hello": "world"})
+
+    link = compose(ApqLink(manifest={_sha256(body): body}), HashCheckingServerLink())
+
+    async with link:
+        for _ in range(2):
+            async for result in link.aexecute(opify(body)):
+                assert result.data == {"hello": "world"}
+
+    assert registered == {_sha256(body)}
+    assert opify(body).document != body
@@ -0,0 +1,136 @@
+"""Tests for the BatchLink and the batching support of the HTTP links."""
+import asyncio
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from rath import Rath
+from rath.links import compose
+from rath.links.aiohttp import AIOHttpLink
+from rath.links.batch import BatchLink
+from rath.links.httpx import HttpxLink
+from rath.operation import GraphQLException, opify
+
+
+def _resolve(payload: dict) -> dict:
+    if "broken" in payload["query"]:
+        return {"errors": [{"message": "broken is broken"}]}
+    return {"data": {"echo": payload["variables"].get("i")}}
+
+
+@pytest.fixture
+async def batch_server():
+    """A local server that answers single and batched requests."""
+    requests: list = []
+
+    async def handle(request: web.Request) -> web.Response:
+        body = await request.json()
+        requests.append((dict(request.headers), body))
+        if isinstance(body, list):
+            return web.json_response([_resolve(payload) for payload in body])
+        return web.json_response(_resolve(body))
+
+    app = web.Application()
+    app.router.add_post("/graphql", handle)
+    async with TestServer(app) as server:
+        server.requests = requests
+        yield server
+
+
+@pytest.fixture(params=[AIOHttpLink, HttpxLink])
+def http_link(request, batch_server):
+    return request.param(endpoint_url=str(batch_server.make_url("/graphql")))
+
+
+QUERY = "query Echo($i: Int) { echo(i: $i) }"
+
+
+async def test_batch_coalesces_concurrent_queries(batch_server, http_link):
+    rath = Rath(link=compose(BatchLink(batch_interval=0.05), http_link))
+
+    async with rath:
+        results = await asyncio.gather(
+            *[rath.aquery(QUERY, variables={"i": i}) for i in range(5)]
+        )
+
+    assert [r.data["echo"] for r in results] == list(range(5))
+    assert len(batch_server.requests) == 1
+    assert len(batch_server.requests[0][1]) == 5
+
+
+async def test_batch_isolates_errors(batch_server, http_link):
+    rath = Rath(link=compose(BatchLink(batch_interval=0.05), http_link))
+
+    async with rath:
+        results = await asyncio.gather(
+            rath.aquery(QUERY, variables={"i": 1}),
+            rath.aquery("query Broken { broken }"),
+            rath.aquery(QUERY, variables={"i": 3}),
+            return_exceptions=True,
+        )
+
+    assert results[0].data == {"echo": 1}
+    assert isinstance(results[1], GraphQLException)
+    assert "broken is broken" in results[1].message
+    assert results[1].operation.display_name == "Broken"
+    assert results[2].data == {"echo": 3}
+    assert len(batch_server.requests) == 1
+
+
+async def test_batch_flushes_at_max_batch_size(batch_server, http_link):
+    rath = Rath(
+        link=compose(BatchLink(batch_interval=10, max_batch_size=2), http_link)
+    )
+
+    async with rath:
+        results = await asyncio.wait_for(
+            asyncio.gather(
+                *[rath.aquery(QUERY, variables={"i": i}) for i in range(4)]
+            ),
+            timeout=5,
+        )
+
+    assert [r.data["echo"] for r in results] == list(range(4))
+    assert [len(body) for _, body in batch_server.requests] == [2, 2]
+
+
+async def test_batch_separates_headers(batch_server, http_link):
+    rath = Rath(link=compose(BatchLink(batch_interval=0.05), http_link))
+
+    async with rath:
+        await asyncio.gather(
+            rath.aquery(QUERY, variables={"i": 1}, headers={"Authorization": "a"}),
+            rath.aquery(QUERY, variables={"i": 2}, headers={"Authorization": "b"}),
+            rath.aquery(QUERY, variables={"i": 3}, headers={"Authorization": "a"}),
+        )
+
+    batches = {headers["Authorization"]: body for headers, body in batch_server.requests}
+    assert [p["variables"]["i"] for p in batches["a"]] == [1, 3]
+    assert [p["variables"]["i"] for p in batches["b"]] == [2]
+
+
+async def test_batch_forwards_mutations_by_default(batch_server, http_link):
+    link = compose(BatchLink(batch_interval=0.05), http_link)
+
+    async with link:
+        results = [
+            r async for r in link.aexecute(opify("mutation Echo { echo }"))
+        ]
+
+    assert results[0].data == {"echo": None}
+    assert isinstance(batch_server.requests[0][1], dict)
+
+
+async def test_batch_cancelled_caller_is_not_sent(batch_server, http_link):
+    rath = Rath(link=compose(BatchLink(batch_interval=0.05), http_link))
+
+    async with rath:
+        cancelled = asyncio.create_task(rath.aquery(QUERY, variables={"i": 1}))
+        kept = asyncio.create_task(rath.aquery(QUERY, variables={"i": 2}))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        result = await kept
+
+    assert result.data == {"echo": 2}
+    assert [p["variables"]["i"] for p in batch_server.requests[0][1]] == [2]
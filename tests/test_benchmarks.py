@@ -0,0 +1,157 @@
+"""Benchmarks for the hot path of rath.
+
+These are not strict performance assertions (timings vary between machines),
+but they print per-size timings (run with ``-s``) and assert the structural
+properties that keep the hot path fast, e.g. that a response body is only
+decoded once.
+"""
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from rath.links.aiohttp import AIOHttpLink
+from rath.links.codec import CODECS, StdlibCodec, get_codec
+from rath.operation import Context, Extensions, Operation, document_cache, opify
+
+
+QUERY = "query GetBeasts { beasts { id legs commonName } }"
+
+RESPONSE_SIZES = [10, 1_000, 50_000]
+
+
+def _beasts(n: int) -> dict:
+    return {
+        "data": {
+            "beasts": [
+                {"id": str(i), "legs": i % 8, "commonName": f"Beast {i}"}
+                for i in range(n)
+            ]
+        }
+    }
+
+
+@pytest.fixture
+async def beasts_server():
+    bodies = {size: web.json_response(_beasts(size)).body for size in RESPONSE_SIZES}
+
+    async def handle(request: web.Request) -> web.Response:
+        size = int(request.query["size"])
+        return web.Response(body=bodies[size], content_type="application/json")
+
+    app = web.Application()
+    app.router.add_post("/graphql", handle)
+    async with TestServer(app) as server:
+        yield server
+
+
+class CountingCodec(StdlibCodec):
+    """A stdlib codec that counts how often a body is decoded."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.decodes = 0
+
+    def loads(self, data):
+        self.decodes += 1
+        return super().loads(data)
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("size", RESPONSE_SIZES)
+async def test_aiohttp_decodes_response_once(beasts_server, size):
+    codec = CountingCodec()
+    link = AIOHttpLink(
+        endpoint_url=str(beasts_server.make_url(f"/graphql?size={size}")),
+        codec=codec,
+    )
+    rounds = 5
+
+    async with link:
+        start = time.perf_counter()
+        for _ in range(rounds):
+            results = [r async for r in link.aexecute(opify(QUERY))]
+        elapsed = (time.perf_counter() - start) / rounds
+
+    assert len(results[0].data["beasts"]) == size
+    assert codec.decodes == rounds
+    print(f"\naiohttp decode {size:>6} items: {elapsed * 1000:.3f} ms/response")
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("codec_name", list(CODECS))
+@pytest.mark.parametrize("size", RESPONSE_SIZES)
+def test_codec_roundtrip(codec_name, size):
+    try:
+        codec = get_codec(codec_name)
+    except ImportError:
+        pytest.skip(f"{codec_name} is not installed")
+
+    payload = _beasts(size)
+    payload["data"]["fetchedAt"] = datetime(2024, 1, 1, 12, 30)
+    rounds = 5
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        encoded = codec.dumpb(payload)
+    encode_time = (time.perf_counter() - start) / rounds
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        decoded = codec.loads(encoded)
+    decode_time = (time.perf_counter() - start) / rounds
+
+    assert decoded["data"]["fetchedAt"] == "2024-01-01T12:30:00"
+    assert len(decoded["data"]["beasts"]) == size
+    print(
+        f"\n{codec_name:>7} {size:>6} items: encode {encode_time * 1000:.3f} ms, "
+        f"decode {decode_time * 1000:.3f} ms"
+    )
+
+
+def _validated_operation(query: str, variables: dict) -> Operation:
+    """Builds an operation the way opify did before the fast path (parsing cached)."""
+    parsed = document_cache.get(query)
+    return Operation(
+        id=str(uuid.uuid4()),
+        node=parsed.node,
+        document=parsed.document,
+        document_node=parsed.document_node,
+        variables=variables,
+        operation_name=None,
+        extensions=Extensions(),
+        context=Context(headers={}, kwargs={}),
+    )
+
+
+def _measure(build, rounds: int = 2_000) -> tuple:
+    build()  # warm up caches
+    start = time.perf_counter()
+    for _ in range(rounds):
+        build()
+    elapsed = (time.perf_counter() - start) / rounds
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    kept = [build() for _ in range(100)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, "filename")) / len(kept)
+    return elapsed, allocated
+
+
+@pytest.mark.benchmark
+def test_operation_construction():
+    variables = {"id": "1"}
+    validated_time, validated_bytes = _measure(lambda: _validated_operation(QUERY, variables))
+    fast_time, fast_bytes = _measure(lambda: opify(QUERY, variables))
+
+    print(
+        f"\nvalidated operation: {validated_time * 1e6:.2f} us, {validated_bytes:.0f} B/op"
+        f"\nopify fast path:     {fast_time * 1e6:.2f} us, {fast_bytes:.0f} B/op"
+    )
+    assert opify(QUERY, variables).document == _validated_operation(QUERY, variables).document
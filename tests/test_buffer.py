@@ -0,0 +1,118 @@
+"""Tests for the bounded subscription buffers."""
+import asyncio
+import time
+from typing import AsyncIterator
+
+import pytest
+
+from rath import Rath
+from rath.buffer import SubscriptionQueue, abuffered
+from rath.links.base import AsyncTerminatingLink
+from rath.operation import GraphQLResult, Operation
+
+
+async def _fill(queue: SubscriptionQueue, n: int) -> list:
+    for i in range(n):
+        await queue.put_event(i)
+    await queue.put_event("complete", droppable=False)
+    return [queue.get_nowait() for _ in range(queue.qsize())]
+
+
+@pytest.mark.parametrize(
+    "policy, expected",
+    [
+        ("drop_oldest", [7, 8, 9, "complete"]),
+        ("drop_newest", [0, 1, 2, "complete"]),
+        ("latest", [9, "complete"]),
+    ],
+)
+async def test_queue_overflow_policies(policy, expected):
+    queue = SubscriptionQueue(3, policy)
+
+    assert await _fill(queue, 10) == expected
+    assert queue.dropped == 10 - len(expected) + 1
+
+
+@pytest.mark.parametrize("policy", ["drop_oldest", "latest"])
+async def test_queue_never_drops_control_messages(policy):
+    queue = SubscriptionQueue(1, policy)
+    await queue.put_event("disconnect", droppable=False)
+    await queue.put_event(1)
+    await queue.put_event(2)
+    await queue.put_event("complete", droppable=False)
+    await queue.put_event(3)
+
+    assert [queue.get_nowait() for _ in range(queue.qsize())] == ["disconnect", "complete", 3]
+    assert queue.dropped == 2
+    for _ in range(3):
+        queue.task_done()
+    # every item that was put is either consumed or dropped
+    await asyncio.wait_for(queue.join(), timeout=0.05)
+
+
+async def test_queue_unbounded_by_default():
+    queue = SubscriptionQueue()
+
+    assert len(await _fill(queue, 100)) == 101
+    assert queue.dropped == 0
+
+
+async def test_queue_blocks_when_full():
+    queue = SubscriptionQueue(2, "block")
+    await queue.put_event(1)
+    await queue.put_event(2)
+
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(queue.put_event(3), timeout=0.05)
+
+
+async def _count(n: int) -> AsyncIterator[int]:
+    for i in range(n):
+        yield i
+
+
+async def test_abuffered_decouples_slow_consumers():
+    received = []
+    async for item in abuffered(_count(100), 5, "latest"):
+        received.append(item)
+        await asyncio.sleep(0.01)
+
+    assert received[-1] == 99
+    assert len(received) < 100
+
+
+async def test_abuffered_propagates_errors():
+    async def failing() -> AsyncIterator[int]:
+        yield 1
+        raise ValueError("broken")
+
+    with pytest.raises(ValueError, match="broken"):
+        async for _ in abuffered(failing(), 5):
+            pass
+
+
+class FirehoseLink(AsyncTerminatingLink):
+    """Yields a fast stream of events, and records the context of the operation."""
+
+    contexts: list = []
+
+    async def aexecute(self, operation: Operation) -> AsyncIterator[GraphQLResult]:
+        self.contexts.append(operation.context)
+        for i in range(50):
+            await asyncio.sleep(0.001)
+            yield GraphQLResult(data={"count": i})
+
+
+def test_sync_subscribe_buffers_with_overflow_policy():
+    link = FirehoseLink(contexts=[])
+    received = []
+
+    with Rath(link=link) as rath:
+        for event in rath.subscribe("subscription { count }", buffer_size=1, overflow_policy="latest"):
+            received.append(event.data["count"])
+            time.sleep(0.02)
+
+    assert received[-1] == 49
+    assert len(received) < 50
+    assert link.contexts[0].overflow_policy == "latest"
+    assert link.contexts[0].buffer_size == 1
@@ -0,0 +1,212 @@
+"""Tests for the CacheLink."""
+import asyncio
+from typing import AsyncIterator
+
+import pytest
+
+from rath import Rath
+from rath.links import compose
+from rath.links.base import AsyncTerminatingLink
+from rath.links.cache import CacheLink
+from rath.operation import GraphQLResult, Operation, opify
+
+
+QUERY = "query Beasts($legs: Int) { beasts(legs: $legs) { id } }"
+OTHER_QUERY = "query Hello { hello }"
+
+
+class CountingLink(AsyncTerminatingLink):
+    """Answers every operation with an increasing counter."""
+
+    calls: int = 0
+
+    async def aexecute(self, operation: Operation) -> AsyncIterator[GraphQLResult]:
+        object.__setattr__(self, "calls", self.calls + 1)
+        yield GraphQLResult(data={"call": self.calls})
+
+
+def _make_rath(**kwargs):
+    terminal = CountingLink()
+    cache = CacheLink(**kwargs)
+    return Rath(link=compose(cache, terminal)), cache, terminal
+
+
+async def test_cache_first_serves_hits_without_network():
+    rath, cache, terminal = _make_rath()
+    async with rath:
+        first = await rath.aquery(QUERY, variables={"legs": 4})
+        second = await rath.aquery(QUERY, variables={"legs": 4})
+
+    assert first.data == second.data == {"call": 1}
+    assert terminal.calls == 1
+    assert cache.info().hits == 1
+
+
+async def test_cache_key_canonicalizes_variables():
+    rath, cache, terminal = _make_rath()
+    async with rath:
+        await rath.aquery(QUERY, variables={"legs": 4, "name": "cat"})
+        await rath.aquery(QUERY, variables={"name": "cat", "legs": 4})
+        await rath.aquery(QUERY, variables={"legs": 2, "name": "cat"})
+
+    assert terminal.calls == 2
+
+
+async def test_cache_varies_on_headers():
+    rath, cache, terminal = _make_rath()
+    async with rath:
+        await rath.aquery(QUERY, headers={"Authorization": "a"})
+        await rath.aquery(QUERY, headers={"Authorization": "b"})
+
+    assert terminal.calls == 2
+
+
+async def test_network_only_always_fetches_and_updates_cache():
+    rath, cache, terminal = _make_rath()
+    async with rath:
+        await rath.aquery(QUERY)
+        fresh = await rath.aquery(QUERY, cache_policy="network-only")
+        cached = await rath.aquery(QUERY)
+
+    assert fresh.data == {"call": 2}
+    assert cached.data == {"call": 2}
+    assert terminal.calls == 2
+
+
+async def test_cache_and_network_yields_cached_then_fresh():
+    rath, cache, terminal = _make_rath()
+    async with rath:
+        await rath.aquery(QUERY)
+
+        link = rath.link
+        results = [
+            r.data
+            async for r in link.aexecute(opify(QUERY, cache_policy="cache-and-network"))
+        ]
+
+    assert results == [{"call": 1}, {"call": 2}]
+
+
+async def test_cache_and_network_refreshes_in_background():
+    rath, cache, terminal = _make_rath()
+    async with rath:
+        await rath.aquery(QUERY)
+        stale = await rath.aquery(QUERY, cache_policy="cache-and-network")
+        await asyncio.sleep(0.01)
+        refreshed = await rath.aquery(QUERY)
+
+    assert stale.data == {"call": 1}
+    assert refreshed.data == {"call": 2}
+
+
+async def test_cache_evicts_least_recently_used():
+    rath, cache, terminal = _make_rath(maxsize=2)
+    async with rath:
+        await rath.aquery(QUERY, variables={"legs": 1})
+        await rath.aquery(QUERY, variables={"legs": 2})
+        await rath.aquery(QUERY, variables={"legs": 1})
+        await rath.aquery(QUERY, variables={"legs": 3})  # evicts legs=2
+        await rath.aquery(QUERY, variables={"legs": 1})
+        await rath.aquery(QUERY, variables={"legs": 2})
+
+    assert terminal.calls == 4
+    assert cache.info().evictions == 2
+
+
+async def test_cache_entries_expire(monkeypatch):
+    import rath.links.cache as cache_module
+
+    now = 1000.0
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now)
+
+    rath, cache, terminal = _make_rath(ttl=10)
+    async with rath:
+        await rath.aquery(QUERY)
+        now += 5
+        await rath.aquery(QUERY)
+        now += 10
+        await rath.aquery(QUERY)
+
+    assert terminal.calls == 2
+
+
+async def test_mutation_invalidates_queries_with_same_root_field():
+    rath, cache, terminal = _make_rath()
+    async with rath:
+        await rath.aquery(QUERY)
+        await rath.aquery(OTHER_QUERY)
+        await rath.aquery("mutation { beasts { id } }")
+        await rath.aquery(QUERY)
+        await rath.aquery(OTHER_QUERY)
+
+    # mutation + refetch of the beasts query, hello stays cached
+    assert terminal.calls == 4
+    assert cache.info().invalidations == 1
+
+
+async def test_mutation_invalidates_mapped_fields():
+    rath, cache, terminal = _make_rath(invalidates={"createBeast": ["beasts"]})
+    async with rath:
+        await rath.aquery(QUERY)
+        await rath.aquery("mutation { createBeast { id } }")
+        await rath.aquery(QUERY)
+
+    assert terminal.calls == 3
+
+
+class BeastLink(AsyncTerminatingLink):
+    """Answers queries with beasts and hellos, and mutations with a new beast."""
+
+    calls: int = 0
+
+    async def aexecute(self, operation: Operation) -> AsyncIterator[GraphQLResult]:
+        object.__setattr__(self, "calls", self.calls + 1)
+        beast = {"__typename": "Beast", "id": str(self.calls)}
+        if operation.node.operation.value == "mutation":
+            yield GraphQLResult(data={"createBeast": beast})
+        elif "beasts" in operation.document:
+            yield GraphQLResult(data={"__typename": "Query", "beasts": [beast]})
+        else:
+            yield GraphQLResult(data={"__typename": "Query", "hello": {"__typename": "Greeting", "text": "hi"}})
+
+
+async def test_mutation_invalidates_queries_by_typename():
+    terminal = BeastLink()
+    cache = CacheLink()
+    rath = Rath(link=compose(cache, terminal))
+
+    async with rath:
+        await rath.aquery("query { __typename beasts { __typename id } }")
+        await rath.aquery("query { __typename hello { __typename text } }")
+        # the root fields differ (createBeast and beasts), but both return a Beast
+        await rath.aquery("mutation { createBeast { __typename id } }")
+        beasts = await rath.aquery("query { __typename beasts { __typename id } }")
+        await rath.aquery("query { __typename hello { __typename text } }")
+
+    assert beasts.data["beasts"] == [{"__typename": "Beast", "id": "4"}]
+    # mutation + refetch of the beasts query, hello stays cached
+    assert terminal.calls == 4
+    assert cache.info().invalidations == 1
+
+
+async def test_typename_invalidation_can_be_disabled():
+    terminal = BeastLink()
+    rath = Rath(link=compose(CacheLink(invalidate_by_typename=False), terminal))
+
+    async with rath:
+        await rath.aquery("query { beasts { __typename id } }")
+        await rath.aquery("mutation { createBeast { __typename id } }")
+        await rath.aquery("query { beasts { __typename id } }")
+
+    assert terminal.calls == 2
+
+
+@pytest.mark.parametrize("document", ["subscription { beasts { id } }"])
+async def test_subscriptions_are_not_cached(document):
+    rath, cache, terminal = _make_rath()
+    async with rath:
+        await rath.aquery(document)
+        await rath.aquery(document)
+
+    assert terminal.calls == 2
+    assert cache.info().currsize == 0
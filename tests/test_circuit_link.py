@@ -0,0 +1,129 @@
+"""Tests for the CircuitBreakerLink."""
+import asyncio
+from typing import AsyncIterator, List
+
+import pytest
+
+from rath import Rath
+from rath.links.base import AsyncTerminatingLink
+from rath.links.circuit import CircuitBreakerLink, CircuitOpenError
+from rath.links.compose import compose
+from rath.links.split import split
+from rath.operation import GraphQLException, GraphQLResult, Operation
+
+QUERY = "query { beast { id } }"
+
+
+class SwitchableLink(AsyncTerminatingLink):
+    """Fails while broken is set, and answers with its name otherwise."""
+
+    name: str = "primary"
+    broken: bool = False
+    delay: float = 0
+    calls: int = 0
+
+    async def aexecute(self, operation: Operation) -> AsyncIterator[GraphQLResult]:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.broken:
+            raise ConnectionError("backend is down")
+        yield GraphQLResult(data={"link": self.name})
+
+
+async def _fail(rath: Rath, n: int) -> None:
+    for _ in range(n):
+        with pytest.raises((ConnectionError, CircuitOpenError)):
+            await rath.aquery(QUERY)
+
+
+async def test_circuit_opens_and_fails_fast():
+    transitions: List[tuple] = []
+
+    async def on_transition(previous, state):
+        transitions.append((previous, state))
+
+    primary = SwitchableLink(broken=True)
+    breaker = CircuitBreakerLink(minimum_calls=4, reset_timeout=60, on_transition=on_transition)
+    rath = Rath(link=[breaker, primary])
+
+    async with rath:
+        await _fail(rath, 4)
+        assert breaker.state == "open"
+
+        with pytest.raises(CircuitOpenError):
+            await rath.aquery(QUERY)
+
+    assert primary.calls == 4
+    assert transitions == [("closed", "open")]
+    info = breaker.info()
+    assert info.state == "open"
+    assert info.failures == 4
+    assert info.failure_rate == 1.0
+    assert info.rejected == 1
+
+
+async def test_circuit_ignores_graphql_errors():
+    class ErrorLink(AsyncTerminatingLink):
+        async def aexecute(self, operation: Operation) -> AsyncIterator[GraphQLResult]:
+            raise GraphQLException("Field not found")
+            yield
+
+    breaker = CircuitBreakerLink(minimum_calls=2)
+    rath = Rath(link=[breaker, ErrorLink()])
+
+    async with rath:
+        for _ in range(4):
+            with pytest.raises(GraphQLException):
+                await rath.aquery(QUERY)
+
+    assert breaker.state == "closed"
+    assert breaker.info().failures == 0
+
+
+async def test_circuit_counts_slow_calls():
+    breaker = CircuitBreakerLink(minimum_calls=2, slow_call_duration=0.01)
+    rath = Rath(link=[breaker, SwitchableLink(delay=0.02)])
+
+    async with rath:
+        await rath.aquery(QUERY)
+        await rath.aquery(QUERY)
+
+    assert breaker.state == "open"
+
+
+async def test_circuit_half_opens_with_probes():
+    primary = SwitchableLink(broken=True)
+    breaker = CircuitBreakerLink(minimum_calls=2, reset_timeout=0.05, half_open_probes=2)
+    rath = Rath(link=[breaker, primary])
+
+    async with rath:
+        await _fail(rath, 2)
+        await asyncio.sleep(0.06)
+        assert breaker.state == "half_open"
+
+        # a failing probe opens the circuit again
+        await _fail(rath, 1)
+        assert breaker.state == "open"
+
+        await asyncio.sleep(0.06)
+        primary.broken = False
+        await rath.aquery(QUERY)
+        assert breaker.state == "half_open"
+        await rath.aquery(QUERY)
+        assert breaker.state == "closed"
+
+    assert breaker.info().transitions == 5
+
+
+async def test_circuit_falls_back_with_split_link():
+    primary = SwitchableLink(broken=True)
+    secondary = SwitchableLink(name="secondary")
+    breaker = CircuitBreakerLink(minimum_calls=2, reset_timeout=60)
+    rath = Rath(link=split(compose(breaker, primary), secondary, lambda op: breaker.available))
+
+    async with rath:
+        await _fail(rath, 2)
+        result = await rath.aquery(QUERY)
+
+    assert result.data == {"link": "secondary"}
+    assert primary.calls == 2
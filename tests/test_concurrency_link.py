@@ -0,0 +1,132 @@
+"""Tests for the ConcurrencyLimitLink."""
+import asyncio
+from typing import AsyncIterator, List
+
+import pytest
+
+from rath import Rath
+from rath.links.base import AsyncTerminatingLink
+from rath.links.concurrency import ConcurrencyLimitLink
+from rath.operation import GraphQLResult, Operation
+
+QUERY = "query Echo($i: Int) { echo(i: $i) }"
+
+
+class BackendLink(AsyncTerminatingLink):
+    """Answers after a delay, recording the operations in flight and the start order."""
+
+    delay: float = 0.01
+    fail: bool = False
+    in_flight: int = 0
+    max_in_flight: int = 0
+    order: List[int] = []
+
+    async def aexecute(self, operation: Operation) -> AsyncIterator[GraphQLResult]:
+        self.order.append(operation.variables["i"])
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.fail:
+                raise ConnectionError("overloaded")
+        finally:
+            self.in_flight -= 1
+        yield GraphQLResult(data={"echo": operation.variables["i"]})
+
+
+async def test_bounds_operations_in_flight_and_queues_fairly():
+    backend = BackendLink()
+    limiter = ConcurrencyLimitLink(initial_limit=3, max_limit=3)
+    rath = Rath(link=[limiter, backend])
+
+    async with rath:
+        results = await asyncio.gather(*[rath.aquery(QUERY, variables={"i": i}) for i in range(20)])
+
+    assert [result.data["echo"] for result in results] == list(range(20))
+    assert backend.max_in_flight == 3
+    assert backend.order == list(range(20))
+    info = limiter.info()
+    assert info.in_flight == 0
+    assert info.queued == 0
+    assert info.operations == 20
+    assert info.max_wait >= info.mean_wait > 0
+
+
+async def test_limit_grows_while_busy():
+    limiter = ConcurrencyLimitLink(initial_limit=2, latency_tolerance=100)
+    rath = Rath(link=[limiter, BackendLink()])
+
+    async with rath:
+        for _ in range(5):
+            await asyncio.gather(*[rath.aquery(QUERY, variables={"i": i}) for i in range(10)])
+
+    assert limiter.limit > 2
+
+
+async def test_limit_shrinks_on_errors():
+    limiter = ConcurrencyLimitLink(initial_limit=10, min_limit=2)
+    rath = Rath(link=[limiter, BackendLink(fail=True)])
+
+    async with rath:
+        for i in range(30):
+            with pytest.raises(ConnectionError):
+                await rath.aquery(QUERY, variables={"i": i})
+
+    assert limiter.limit == 2
+
+
+async def test_limit_shrinks_when_latency_rises():
+    backend = BackendLink(delay=0.001)
+    limiter = ConcurrencyLimitLink(initial_limit=10)
+    rath = Rath(link=[limiter, backend])
+
+    async with rath:
+        await rath.aquery(QUERY, variables={"i": 0})
+        backend.delay = 0.05
+        await rath.aquery(QUERY, variables={"i": 1})
+
+    assert limiter.limit == pytest.approx(9)
+
+
+async def test_cancelled_waiters_leave_the_queue():
+    limiter = ConcurrencyLimitLink(initial_limit=1, max_limit=1)
+    rath = Rath(link=[limiter, BackendLink(delay=0.05)])
+
+    async with rath:
+        first = asyncio.create_task(rath.aquery(QUERY, variables={"i": 0}))
+        await asyncio.sleep(0.01)
+        waiting = asyncio.create_task(rath.aquery(QUERY, variables={"i": 1}))
+        await asyncio.sleep(0.01)
+        assert limiter.info().queued == 1
+
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        assert limiter.info().queued == 0
+
+        await first
+        assert (await rath.aquery(QUERY, variables={"i": 2})).data == {"echo": 2}
+
+
+async def test_limit_decreases_once_for_operations_that_failed_together():
+    limiter = ConcurrencyLimitLink(initial_limit=10)
+    rath = Rath(link=[limiter, BackendLink(fail=True)])
+
+    async with rath:
+        results = await asyncio.gather(
+            *[rath.aquery(QUERY, variables={"i": i}) for i in range(10)], return_exceptions=True
+        )
+
+    assert all(isinstance(result, ConnectionError) for result in results)
+    assert limiter.limit == pytest.approx(9)
+
+
+def test_latency_jitter_is_not_overload():
+    limiter = ConcurrencyLimitLink(initial_limit=10)
+    # an unusually fast first operation, and then ordinary jitter
+    latencies = [0.008] + [0.010, 0.010, 0.010, 0.010, 0.018] * 40
+
+    for started_at, latency in enumerate(latencies):
+        limiter._adapt(latency, False, float(started_at))
+
+    assert limiter.limit == 10
+    assert limiter.info().latency == pytest.approx(0.0116, abs=0.001)
@@ -0,0 +1,133 @@
+"""Tests for the DedupLink."""
+import asyncio
+from typing import AsyncIterator
+
+import pytest
+
+from rath import Rath
+from rath.links import compose
+from rath.links.base import AsyncTerminatingLink
+from rath.links.dedup import DedupLink
+from rath.operation import GraphQLResult, Operation
+
+
+class SlowLink(AsyncTerminatingLink):
+    """Answers every operation after a short delay, counting the calls."""
+
+    calls: int = 0
+    fail: bool = False
+
+    async def aexecute(self, operation: Operation) -> AsyncIterator[GraphQLResult]:
+        object.__setattr__(self, "calls", self.calls + 1)
+        await asyncio.sleep(0.05)
+        if self.fail:
+            raise ValueError("The server is on fire")
+        yield GraphQLResult(data={"call": self.calls, "variables": operation.variables})
+
+
+class SlowCancellingLink(SlowLink):
+    """Takes a while to clean up when it is cancelled."""
+
+    async def aexecute(self, operation: Operation) -> AsyncIterator[GraphQLResult]:
+        try:
+            async for result in super().aexecute(operation):
+                yield result
+        except asyncio.CancelledError:
+            await asyncio.sleep(0.05)
+            raise
+
+
+QUERY = "query Beasts($legs: Int) { beasts(legs: $legs) }"
+
+
+def _make_rath(**kwargs):
+    terminal = SlowLink(**kwargs)
+    dedup = DedupLink()
+    return Rath(link=compose(dedup, terminal)), dedup, terminal
+
+
+async def test_dedup_coalesces_identical_queries():
+    rath, dedup, terminal = _make_rath()
+
+    async with rath:
+        results = await asyncio.gather(*[rath.aquery(QUERY, variables={"legs": 4}) for _ in range(5)])
+
+    assert terminal.calls == 1
+    assert dedup.deduplicated == 4
+    assert all(result.data == results[0].data for result in results)
+
+
+async def test_dedup_separates_variables_and_headers():
+    rath, dedup, terminal = _make_rath()
+
+    async with rath:
+        await asyncio.gather(
+            rath.aquery(QUERY, variables={"legs": 4}),
+            rath.aquery(QUERY, variables={"legs": 2}),
+            rath.aquery(QUERY, variables={"legs": 4}, headers={"Authorization": "other"}),
+        )
+
+    assert terminal.calls == 3
+
+
+async def test_dedup_only_while_in_flight():
+    rath, dedup, terminal = _make_rath()
+
+    async with rath:
+        await rath.aquery(QUERY, variables={"legs": 4})
+        await rath.aquery(QUERY, variables={"legs": 4})
+
+    assert terminal.calls == 2
+
+
+async def test_dedup_bypasses_mutations():
+    rath, dedup, terminal = _make_rath()
+
+    async with rath:
+        await asyncio.gather(*[rath.aquery("mutation Create { create }") for _ in range(3)])
+
+    assert terminal.calls == 3
+
+
+async def test_dedup_shares_errors():
+    rath, dedup, terminal = _make_rath(fail=True)
+
+    async with rath:
+        results = await asyncio.gather(*[rath.aquery(QUERY) for _ in range(3)], return_exceptions=True)
+
+    assert terminal.calls == 1
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+async def test_dedup_cancelling_one_caller_keeps_the_query():
+    rath, dedup, terminal = _make_rath()
+
+    async with rath:
+        first = asyncio.create_task(rath.aquery(QUERY))
+        second = asyncio.create_task(rath.aquery(QUERY))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        result = await second
+
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+    assert result.data["call"] == 1
+    assert terminal.calls == 1
+
+
+async def test_dedup_does_not_attach_to_a_cancelled_query():
+    terminal = SlowCancellingLink()
+    rath = Rath(link=compose(DedupLink(), terminal))
+
+    async with rath:
+        first = asyncio.create_task(rath.aquery(QUERY))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+        # the first query is still cleaning up
+        result = await rath.aquery(QUERY)
+
+    assert result.data["call"] == 2
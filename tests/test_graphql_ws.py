@@ -0,0 +1,463 @@
+"""Tests for the websocket links against a local server.
+
+The server speaks both the graphql-ws and the graphql-transport-ws protocol,
+depending on the negotiated subprotocol.
+"""
+import asyncio
+import json
+import sys
+
+import pytest
+import websockets
+
+from rath import Rath
+from rath.links.graphql_transport_ws import GraphQLTransportWSLink
+from rath.links.errors import SendQueueFullError, TerminatingLinkError
+from rath.links.graphql_ws import GraphQLWSLink
+from rath.links.subscription_transport_ws import SubscriptionTransportWsLink
+from rath.operation import SubscriptionDisconnect, opify
+
+
+@pytest.fixture
+async def ws_server():
+    """A local GraphQL websocket server.
+
+    Subscriptions receive three events, queries and mutations a single result.
+    Every received message is recorded.
+    """
+    received: list = []
+
+    async def handler(websocket, path=None):
+        transport_ws = websocket.subprotocol == "graphql-transport-ws"
+        data_type = "next" if transport_ws else "data"
+
+        async for raw in websocket:
+            message = json.loads(raw)
+            received.append(message)
+            if message["type"] == "connection_init":
+                await websocket.send(json.dumps({"type": "connection_ack"}))
+                if transport_ws:
+                    await websocket.send(json.dumps({"type": "ping"}))
+            elif message["type"] == "ping":
+                await websocket.send(json.dumps({"type": "pong"}))
+            elif message["type"] in ("start", "subscribe"):
+                id = message["id"]
+                query = message["payload"]["query"]
+                if query.startswith("subscription"):
+                    for i in range(3):
+                        await websocket.send(json.dumps({"id": id, "type": data_type, "payload": {"data": {"count": i}}}))
+                else:
+                    answer = {"echo": message["payload"]["variables"].get("i")}
+                    await websocket.send(json.dumps({"id": id, "type": data_type, "payload": {"data": answer}}))
+                await websocket.send(json.dumps({"id": id, "type": "complete"}))
+
+    async with websockets.serve(
+        handler, "127.0.0.1", 0, subprotocols=["graphql-ws", "graphql-transport-ws"]
+    ) as server:
+        port = server.sockets[0].getsockname()[1]
+        server.url = f"ws://127.0.0.1:{port}/graphql"
+        server.received = received
+        yield server
+
+
+@pytest.fixture(params=[GraphQLWSLink, GraphQLTransportWSLink])
+def ws_link_class(request):
+    return request.param
+
+
+async def test_ws_executes_queries(ws_server, ws_link_class):
+    rath = Rath(link=ws_link_class(ws_endpoint_url=ws_server.url))
+
+    async with rath:
+        results = await asyncio.gather(
+            *[rath.aquery("query Echo($i: Int) { echo(i: $i) }", variables={"i": i}) for i in range(5)]
+        )
+        mutation = await rath.aquery("mutation Echo($i: Int) { echo(i: $i) }", variables={"i": 7})
+        await asyncio.sleep(0.05)
+
+        assert rath.link._ongoing_subscriptions == {}
+
+    assert [result.data["echo"] for result in results] == list(range(5))
+    assert mutation.data == {"echo": 7}
+    # everything was multiplexed over a single connection
+    assert [m["type"] for m in ws_server.received].count("connection_init") == 1
+
+
+async def test_ws_executes_subscriptions(ws_server, ws_link_class):
+    rath = Rath(link=ws_link_class(ws_endpoint_url=ws_server.url))
+
+    async with rath:
+        events = [event async for event in rath.asubscribe("subscription Count { count }")]
+
+    assert [event.data["count"] for event in events] == [0, 1, 2]
+
+
+async def test_transport_ws_speaks_the_new_protocol(ws_server):
+    pongs: list = []
+
+    async def on_pong(payload):
+        pongs.append(payload)
+
+    link = GraphQLTransportWSLink(ws_endpoint_url=ws_server.url, heartbeat_interval_ms=20, on_pong=on_pong)
+    rath = Rath(link=link)
+
+    async with rath:
+        await rath.aquery("query Echo($i: Int) { echo(i: $i) }", variables={"i": 1}, operation_name="Echo")
+        await asyncio.sleep(0.1)
+
+    types = [m["type"] for m in ws_server.received]
+    subscribe = next(m for m in ws_server.received if m["type"] == "subscribe")
+    assert "start" not in types
+    assert subscribe["payload"]["operationName"] == "Echo"
+    # the ping of the server was answered, and the heartbeat pings were answered by the server
+    assert "pong" in types
+    assert types.count("ping") >= 2
+    assert len(pongs) >= 2
+
+
+async def test_ws_sends_in_bursts(ws_server, ws_link_class):
+    rath = Rath(link=ws_link_class(ws_endpoint_url=ws_server.url))
+
+    async with rath:
+        await rath.aquery("query Echo($i: Int) { echo(i: $i) }", variables={"i": 0})
+        await asyncio.gather(
+            *[rath.aquery("query Echo($i: Int) { echo(i: $i) }", variables={"i": i}) for i in range(50)]
+        )
+        info = rath.link.send_info()
+
+    assert info.messages >= 51
+    assert info.bursts < info.messages
+    assert info.max_depth > 1
+    assert info.depth == 0
+    assert info.max_latency >= info.mean_latency > 0
+
+
+@pytest.mark.parametrize("ws_link_class", [GraphQLWSLink, GraphQLTransportWSLink, SubscriptionTransportWsLink])
+async def test_ws_writes_a_burst_without_yielding(ws_link_class):
+    events: list = []
+
+    class Client:
+        async def send(self, message):
+            events.append(message)
+
+    async def other_task():
+        events.append("other task")
+
+    link = ws_link_class(ws_endpoint_url="ws://127.0.0.1:1/graphql")
+    async with link:
+        for message in ("a", "b", "c"):
+            await link.aforward(message)
+
+        drain = asyncio.create_task(link.adrain_send_queue(Client()))
+        other = asyncio.create_task(other_task())
+        await other
+        await link._send_queue.join()
+        drain.cancel()
+
+    # the other task did not run in between the writes of the burst
+    assert events == ["a", "b", "c", "other task"]
+    assert link.send_info().bursts == 1
+
+
+@pytest.mark.parametrize("ws_link_class", [GraphQLWSLink, GraphQLTransportWSLink, SubscriptionTransportWsLink])
+async def test_ws_send_queue_rejects_operations_when_full(ws_link_class):
+    link = ws_link_class(ws_endpoint_url="ws://127.0.0.1:1/graphql", send_queue_size=2)
+
+    async with link:
+        await link.aforward("a")
+        await link.aforward("b")
+        with pytest.raises(SendQueueFullError):
+            await link.aforward("c")
+
+        # stopping an operation never waits for the (undrained) queue
+        await asyncio.wait_for(link.aforward("stop", control=True), timeout=0.05)
+        assert link.send_info().depth == 3
+
+
+async def test_ws_subscription_overflow_policy(ws_server, ws_link_class):
+    rath = Rath(link=ws_link_class(ws_endpoint_url=ws_server.url, subscription_buffer_size=1, overflow_policy="latest"))
+
+    async with rath:
+        events = []
+        async for event in rath.asubscribe("subscription Count { count }"):
+            events.append(event.data["count"])
+            await asyncio.sleep(0.05)
+
+    # the slow consumer only sees the latest event, but still gets the completion
+    assert events[-1] == 2
+    assert len(events) < 3
+
+
+@pytest.fixture
+async def flaky_ws_server():
+    """A server that drops every connection after sending two events of a subscription.
+
+    Events count up from the `since` variable, so a resumed subscription continues
+    where it left off.
+    """
+    starts: list = []
+
+    async def handler(websocket, path=None):
+        transport_ws = websocket.subprotocol == "graphql-transport-ws"
+        data_type = "next" if transport_ws else "data"
+
+        async for raw in websocket:
+            message = json.loads(raw)
+            if message["type"] == "connection_init":
+                await websocket.send(json.dumps({"type": "connection_ack"}))
+            elif message["type"] in ("start", "subscribe"):
+                starts.append(message)
+                since = message["payload"]["variables"].get("since") or 0
+                for i in range(since + 1, since + 3):
+                    payload = {"data": {"events": {"cursor": i}}}
+                    await websocket.send(json.dumps({"id": message["id"], "type": data_type, "payload": payload}))
+                if len(starts) >= 3:
+                    await websocket.send(json.dumps({"id": message["id"], "type": "complete"}))
+                else:
+                    await websocket.close()
+                    return
+
+    async with websockets.serve(
+        handler, "127.0.0.1", 0, subprotocols=["graphql-ws", "graphql-transport-ws"]
+    ) as server:
+        port = server.sockets[0].getsockname()[1]
+        server.url = f"ws://127.0.0.1:{port}/graphql"
+        server.starts = starts
+        yield server
+
+
+SUBSCRIPTION = "subscription Events($since: Int) { events(since: $since) { cursor } }"
+
+
+async def test_ws_resubscribes_with_resume_cursor(flaky_ws_server, ws_link_class):
+    link = ws_link_class(ws_endpoint_url=flaky_ws_server.url, time_between_retries=0.01, max_retries=1)
+    operation = opify(SUBSCRIPTION, variables={"since": 0})
+    # the subscription restarts from its cursor, not from the beginning
+    operation.context.extensions["resume"] = {"variable": "since", "path": ["events", "cursor"]}
+
+    async with link:
+        events = [event.data["events"]["cursor"] async for event in link.aexecute(operation)]
+
+    # three connections were needed, but the consumer saw one uninterrupted stream
+    assert events == [1, 2, 3, 4, 5, 6]
+    assert [start["id"] for start in flaky_ws_server.starts] == [operation.id] * 3
+    assert [start["payload"]["variables"]["since"] for start in flaky_ws_server.starts] == [0, 2, 4]
+    assert "resume" not in flaky_ws_server.starts[1]["payload"].get("extensions", {})
+
+
+async def test_ws_disconnects_subscriptions_without_resubscribe(flaky_ws_server, ws_link_class):
+    link = ws_link_class(
+        ws_endpoint_url=flaky_ws_server.url,
+        time_between_retries=0.01,
+        resubscribe_on_reconnect=False,
+    )
+    rath = Rath(link=link)
+
+    async with rath:
+        with pytest.raises(SubscriptionDisconnect):
+            async for _ in rath.asubscribe(SUBSCRIPTION):
+                pass
+
+
+def test_ws_retry_delay_is_jittered_exponential_backoff():
+    link = GraphQLWSLink(ws_endpoint_url="ws://example.com", time_between_retries=1, max_time_between_retries=5)
+
+    for retry, cap in [(0, 1), (1, 2), (2, 4), (5, 5)]:
+        delays = [link.retry_delay(retry) for _ in range(50)]
+        assert all(cap / 2 <= delay <= cap for delay in delays)
+
+
+@pytest.fixture
+async def strict_ws_server():
+    """A server that acknowledges connections late, and enforces the protocol.
+
+    Like a graphql-ws server, it closes the connection with 4401 if an operation
+    starts before the acknowledgement, and with 4409 if an id is started twice.
+    The first connection is dropped after the first event of a subscription.
+    Every frame is recorded per connection, with whether it arrived after the ack.
+    """
+    connections: list = []
+
+    async def handler(websocket, path=None):
+        transport_ws = websocket.subprotocol == "graphql-transport-ws"
+        data_type = "next" if transport_ws else "data"
+        first = not connections
+        frames: list = []
+        connections.append(frames)
+        acked = False
+        started: set = set()
+
+        async def acknowledge():
+            nonlocal acked
+            await asyncio.sleep(0 if first else 0.1)
+            acked = True
+            await websocket.send(json.dumps({"type": "connection_ack"}))
+
+        async for raw in websocket:
+            message = json.loads(raw)
+            frames.append((message["type"], message.get("id"), acked))
+            if message["type"] == "connection_init":
+                asyncio.create_task(acknowledge())
+            elif message["type"] in ("start", "subscribe"):
+                id = message["id"]
+                if not acked:
+                    await websocket.close(4401, "Unauthorized")
+                    return
+                if id in started:
+                    await websocket.close(4409, f"Subscriber for {id} already exists")
+                    return
+                started.add(id)
+
+                if message["payload"]["query"].startswith("subscription"):
+                    await websocket.send(json.dumps({"id": id, "type": data_type, "payload": {"data": {"count": 0}}}))
+                    if first:
+                        await websocket.close()
+                        return
+                else:
+                    answer = {"echo": message["payload"]["variables"].get("i")}
+                    await websocket.send(json.dumps({"id": id, "type": data_type, "payload": {"data": answer}}))
+                await websocket.send(json.dumps({"id": id, "type": "complete"}))
+
+    async with websockets.serve(
+        handler, "127.0.0.1", 0, subprotocols=["graphql-ws", "graphql-transport-ws"]
+    ) as server:
+        port = server.sockets[0].getsockname()[1]
+        server.url = f"ws://127.0.0.1:{port}/graphql"
+        server.connections = connections
+        yield server
+
+
+async def _collect(link, operation):
+    return [event.data async for event in link.aexecute(operation)]
+
+
+async def test_ws_reconnect_sends_operations_after_the_ack(strict_ws_server, ws_link_class):
+    link = ws_link_class(ws_endpoint_url=strict_ws_server.url, time_between_retries=0.01, max_retries=1)
+    live = opify("subscription Count { count }")
+    pending = opify("subscription Count { count }")
+
+    async with link:
+        live_task = asyncio.create_task(_collect(link, live))
+        while len(strict_ws_server.connections) < 2:
+            await asyncio.sleep(0.005)
+        # started while the link reconnects, before the new connection is acknowledged
+        pending_events = await _collect(link, pending)
+        live_events = await live_task
+
+    # the live subscription was resubscribed transparently
+    assert live_events == [{"count": 0}, {"count": 0}]
+    assert pending_events == [{"count": 0}]
+
+    init, *frames = strict_ws_server.connections[1]
+    assert init == ("connection_init", None, False)
+    # nothing was sent before the ack, and every operation was started once
+    assert all(acked for _, _, acked in frames)
+    starts = [id for type, id, _ in frames if type in ("start", "subscribe")]
+    assert sorted(starts) == sorted([live.id, pending.id])
+
+
+async def test_ws_queries_during_a_reconnect_wait_for_the_ack(strict_ws_server, ws_link_class):
+    link = ws_link_class(ws_endpoint_url=strict_ws_server.url, time_between_retries=0.01, max_retries=1)
+    query = opify("query Echo($i: Int) { echo(i: $i) }", variables={"i": 3})
+
+    async with link:
+        live_task = asyncio.create_task(_collect(link, opify("subscription Count { count }")))
+        while len(strict_ws_server.connections) < 2:
+            await asyncio.sleep(0.005)
+        # issued while the link reconnects, before the new connection is acknowledged
+        results = await _collect(link, query)
+        await live_task
+
+    assert results == [{"echo": 3}]
+    sent = [frame for frame in strict_ws_server.connections[1] if frame[1] == query.id]
+    assert sent == [("subscribe" if ws_link_class is GraphQLTransportWSLink else "start", query.id, True)]
+
+
+@pytest.mark.parametrize("ws_link_class", [GraphQLWSLink, GraphQLTransportWSLink, SubscriptionTransportWsLink])
+async def test_ws_only_ignores_invalid_json(ws_link_class):
+    link = ws_link_class(ws_endpoint_url="ws://127.0.0.1:1/graphql")
+    handled: list = []
+
+    async def broadcast(message, future):
+        handled.append(message)
+        raise ValueError("invalid message")
+
+    object.__setattr__(link, "broadcast", broadcast)
+
+    async def client():
+        yield "not json"
+        yield json.dumps({"type": "ka"})
+
+    # the legacy link also passes the initiating operation
+    args = [opify("query { a }")] if ws_link_class is SubscriptionTransportWsLink else []
+    # errors while handling a valid message are not mistaken for invalid JSON
+    with pytest.raises(ValueError, match="invalid message"):
+        await link.receiving(client(), *args, asyncio.get_running_loop().create_future())
+    assert handled == [{"type": "ka"}]
+
+
+def _frame_depth() -> int:
+    frame, depth = sys._getframe(1), 0
+    while frame is not None:
+        frame, depth = frame.f_back, depth + 1
+    return depth
+
+
+class _AckThenFail:
+    """A websocket connection that is acknowledged, and then fails"""
+
+    def __init__(self, depths: list, reconnects: int, done: asyncio.Event) -> None:
+        self.depths = depths
+        self.reconnects = reconnects
+        self.done = done
+
+    async def __aenter__(self):
+        self.depths.append(_frame_depth())
+        if len(self.depths) > self.reconnects:
+            self.done.set()
+            await asyncio.Event().wait()
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        return None
+
+    async def send(self, message: str) -> None:
+        return None
+
+    async def __aiter__(self):
+        yield json.dumps({"type": "connection_ack"})
+        raise ConnectionError("The connection dropped")
+
+
+@pytest.mark.parametrize("ws_link_class", [GraphQLWSLink, GraphQLTransportWSLink, SubscriptionTransportWsLink])
+async def test_ws_reconnects_do_not_nest(ws_link_class, monkeypatch):
+    depths: list = []
+    done = asyncio.Event()
+    monkeypatch.setattr(websockets, "connect", lambda *args, **kwargs: _AckThenFail(depths, 50, done))
+
+    link = ws_link_class(
+        ws_endpoint_url="ws://127.0.0.1:1/graphql",
+        time_between_retries=0,
+        max_retries=100,
+    )
+    async with link:
+        await link.aconnect(opify("subscription { count }"))
+        await asyncio.wait_for(done.wait(), timeout=5)
+
+    assert len(depths) == 51
+    assert len(set(depths)) == 1
+
+
+@pytest.mark.parametrize("ws_link_class", [GraphQLWSLink, GraphQLTransportWSLink, SubscriptionTransportWsLink])
+async def test_ws_gives_up_after_max_retries(ws_link_class, monkeypatch):
+    def refuse(*args, **kwargs):
+        raise ConnectionRefusedError("Nobody is listening")
+
+    monkeypatch.setattr(websockets, "connect", refuse)
+
+    link = ws_link_class(ws_endpoint_url="ws://127.0.0.1:1/graphql", time_between_retries=0, max_retries=2)
+    with pytest.raises(TerminatingLinkError):
+        async with link:
+            await link.aconnect(opify("subscription { count }"))
+
+    assert link._connection_dead
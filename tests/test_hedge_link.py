@@ -0,0 +1,93 @@
+"""Tests for the HedgeLink."""
+import asyncio
+from typing import AsyncIterator, List
+
+import pytest
+
+from rath import Rath
+from rath.links.base import AsyncTerminatingLink
+from rath.links.hedge import HedgeLink
+from rath.operation import GraphQLResult, Operation
+
+QUERY = "query { beast { id } }"
+MUTATION = "mutation { createBeast { id } }"
+
+
+class ReplicaLink(AsyncTerminatingLink):
+    """Answers after the delay of the next replica, recording started and cancelled attempts."""
+
+    delays: List[float] = []
+    started: List[str] = []
+    cancelled: List[str] = []
+
+    async def aexecute(self, operation: Operation) -> AsyncIterator[GraphQLResult]:
+        replica = len(self.started)
+        self.started.append(operation.id)
+        try:
+            await asyncio.sleep(self.delays[replica % len(self.delays)])
+        except asyncio.CancelledError:
+            self.cancelled.append(operation.id)
+            raise
+        yield GraphQLResult(data={"replica": replica})
+
+
+async def test_hedges_slow_queries_and_cancels_the_loser():
+    replicas = ReplicaLink(delays=[1, 0.01])
+    hedge = HedgeLink(hedge_delay=0.02)
+    rath = Rath(link=[hedge, replicas])
+
+    async with rath:
+        result = await rath.aquery(QUERY)
+
+    assert result.data == {"replica": 1}
+    assert len(set(replicas.started)) == 2
+    assert replicas.cancelled == replicas.started[:1]
+    assert hedge.info().hedge_wins == 1
+
+
+async def test_does_not_hedge_fast_queries_or_mutations():
+    replicas = ReplicaLink(delays=[0.05])
+    rath = Rath(link=[HedgeLink(hedge_delay=0.01), replicas])
+
+    async with rath:
+        await rath.aquery(MUTATION)
+        assert len(replicas.started) == 1
+
+        replicas.delays = [0]
+        await rath.aquery(QUERY)
+        assert len(replicas.started) == 2
+
+
+async def test_caps_the_hedge_rate():
+    replicas = ReplicaLink(delays=[0.03])
+    hedge = HedgeLink(hedge_delay=0.01, max_hedge_rate=0.25)
+    rath = Rath(link=[hedge, replicas])
+
+    async with rath:
+        for _ in range(8):
+            await rath.aquery(QUERY)
+
+    info = hedge.info()
+    assert info.queries == 8
+    assert info.hedged == 2
+
+
+async def test_hedges_by_observed_latency_percentile():
+    replicas = ReplicaLink(delays=[0.001] * 9 + [0.2])
+    hedge = HedgeLink(min_samples=10, hedge_percentile=0.9, max_hedge_rate=1)
+    rath = Rath(link=[hedge, replicas])
+
+    async with rath:
+        assert hedge.info().delay is None
+        for _ in range(10):
+            await rath.aquery(QUERY)
+        assert hedge.info().delay == pytest.approx(0.2, abs=0.05)
+
+        replicas.delays = [0.01] * 9 + [0.5]
+        replicas.started = []
+        for _ in range(10):
+            await rath.aquery(QUERY)
+
+    # the slow replica was hedged (and lost), the fast ones were not
+    assert hedge.info().hedged == 1
+    assert len(replicas.cancelled) == 1
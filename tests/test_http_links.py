@@ -1,15 +1,21 @@
-"""Non-happy-path tests for the HTTP terminating links (aiohttp & httpx).
+"""Tests for the HTTP terminating links (aiohttp & httpx).
 
-The aiohttp/httpx links build their own client internally, so most paths require a
-live server. The subscription guard needs no network at all, and the httpx response
-handling is exercised with a small monkeypatched AsyncClient.
+The subscription guard needs no network at all, the httpx response handling is
+exercised with a small monkeypatched AsyncClient, and the connection handling is
+exercised against a local aiohttp test server.
 """
+import json
+from datetime import datetime
+
 import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
 
 import rath.links.httpx as httpx_module
 from rath.links.aiohttp import AIOHttpLink
 from rath.links.httpx import HttpxLink
-from rath.links.errors import MalformedResponseError
+from rath.links.codec import DateTimeEncoder, StdlibCodec
+from rath.links.errors import HTTPStatusError, MalformedResponseError, TerminatingLinkError
 from rath.operation import GraphQLException, opify
 
 
@@ -51,8 +57,9 @@ class _FakeResponse:
         self.status_code = status_code
         self._payload = payload
 
-    def json(self) -> dict:
-        return self._payload
+    @property
+    def content(self) -> bytes:
+        return json.dumps(self._payload).encode()
 
 
 class _FakeAsyncClient:
@@ -60,13 +67,19 @@ class _FakeAsyncClient:
 
     _response: _FakeResponse
 
+    def __init__(self, **kwargs) -> None:
+        self.kwargs = kwargs
+
     async def __aenter__(self) -> "_FakeAsyncClient":
         return self
 
     async def __aexit__(self, *args: object) -> None:
         return None
 
-    async def post(self, url: str, headers=None, **kwargs) -> _FakeResponse:
+    async def aclose(self) -> None:
+        return None
+
+    async def request(self, method: str, url: str, headers=None, **kwargs) -> _FakeResponse:
         return self._response
 
 
@@ -113,6 +126,17 @@ async def test_httpx_raises_graphql_exception_with_errors(monkeypatch):
     assert "GetBeast" in str(exc)
 
 
+async def test_httpx_raises_on_unexpected_status(monkeypatch):
+    """A status that is neither OK nor an auth or status error raises instead of yielding nothing."""
+    _patch_httpx_response(monkeypatch, _FakeResponse(400, {"errors": [{"message": "bad"}]}))
+
+    link = HttpxLink(endpoint_url="http://example.com/graphql")
+    async with link:
+        with pytest.raises(TerminatingLinkError, match="failed with status 400"):
+            async for _ in link.aexecute(opify(QUERY)):
+                pass
+
+
 async def test_httpx_returns_data_on_success(monkeypatch):
     """Happy-path control through the patched client."""
     _patch_httpx_response(monkeypatch, _FakeResponse(200, {"data": {"beast": {"id": "1"}}}))
@@ -122,3 +146,250 @@ async def test_httpx_returns_data_on_success(monkeypatch):
         results = [r async for r in link.aexecute(opify(QUERY))]
 
     assert results[0].data == {"beast": {"id": "1"}}
+
+
+# ---------------------------------------------------------------------------
+# aiohttp session pooling (local test server)
+# ---------------------------------------------------------------------------
+
+
+@pytest.fixture
+async def graphql_server():
+    """A local GraphQL-ish server that records the peer port and body (or query string) of every request."""
+    peers: list = []
+    bodies: list = []
+    methods: list = []
+
+    async def handle(request: web.Request) -> web.Response:
+        peers.append(request.transport.get_extra_info("peername")[1])
+        methods.append(request.method)
+        bodies.append(await request.json() if request.method == "POST" else dict(request.query))
+        return web.json_response({"data": {"beast": {"id": "1"}}})
+
+    app = web.Application()
+    app.router.add_post("/graphql", handle)
+    app.router.add_get("/graphql", handle)
+    async with TestServer(app) as server:
+        server.peers = peers
+        server.bodies = bodies
+        server.methods = methods
+        yield server
+
+
+async def test_aiohttp_reuses_pooled_session(graphql_server):
+    link = AIOHttpLink(endpoint_url=str(graphql_server.make_url("/graphql")))
+    async with link:
+        session = link._session
+        assert session is not None
+
+        for _ in range(3):
+            results = [r async for r in link.aexecute(opify(QUERY))]
+            assert results[0].data == {"beast": {"id": "1"}}
+
+        assert link._session is session
+
+    assert session.closed
+    assert link._session is None
+    # all requests went over the same keep-alive connection
+    assert len(set(graphql_server.peers)) == 1
+
+
+async def test_aiohttp_session_per_request(graphql_server):
+    link = AIOHttpLink(
+        endpoint_url=str(graphql_server.make_url("/graphql")),
+        session_per_request=True,
+    )
+    async with link:
+        assert link._session is None
+
+        for _ in range(2):
+            results = [r async for r in link.aexecute(opify(QUERY))]
+            assert results[0].data == {"beast": {"id": "1"}}
+
+    assert len(set(graphql_server.peers)) == 2
+
+
+async def test_aiohttp_connector_limits(graphql_server):
+    link = AIOHttpLink(
+        endpoint_url=str(graphql_server.make_url("/graphql")),
+        connection_limit=7,
+        connection_limit_per_host=3,
+    )
+    async with link:
+        connector = link._session.connector
+        assert connector.limit == 7
+        assert connector.limit_per_host == 3
+
+
+# ---------------------------------------------------------------------------
+# httpx client pooling (local test server)
+# ---------------------------------------------------------------------------
+
+
+async def test_httpx_reuses_pooled_client(graphql_server):
+    link = HttpxLink(endpoint_url=str(graphql_server.make_url("/graphql")))
+    async with link:
+        client = link._client
+        assert client is not None
+
+        for _ in range(3):
+            results = [r async for r in link.aexecute(opify(QUERY))]
+            assert results[0].data == {"beast": {"id": "1"}}
+
+        assert link._client is client
+
+    assert client.is_closed
+    assert link._client is None
+    assert len(set(graphql_server.peers)) == 1
+
+
+async def test_httpx_client_per_request(graphql_server):
+    link = HttpxLink(
+        endpoint_url=str(graphql_server.make_url("/graphql")),
+        client_per_request=True,
+    )
+    async with link:
+        assert link._client is None
+
+        for _ in range(2):
+            results = [r async for r in link.aexecute(opify(QUERY))]
+            assert results[0].data == {"beast": {"id": "1"}}
+
+    assert len(set(graphql_server.peers)) == 2
+
+
+async def test_httpx_passes_limits_and_timeouts(monkeypatch):
+    _patch_httpx_response(monkeypatch, _FakeResponse(200, {"data": {}}))
+    monkeypatch.setattr(httpx_module, "_h2_installed", lambda: True)
+
+    link = HttpxLink(
+        endpoint_url="http://example.com/graphql",
+        http2=True,
+        max_connections=4,
+        max_keepalive_connections=2,
+        timeout=3,
+        connect_timeout=1,
+    )
+    async with link:
+        kwargs = link._client.kwargs
+
+    assert kwargs["http2"] is True
+    assert kwargs["limits"].max_connections == 4
+    assert kwargs["limits"].max_keepalive_connections == 2
+    assert kwargs["timeout"].read == 3
+    assert kwargs["timeout"].connect == 1
+
+
+async def test_httpx_http2_without_h2_raises_on_enter(monkeypatch):
+    monkeypatch.setattr(httpx_module, "_h2_installed", lambda: False)
+
+    link = HttpxLink(endpoint_url="http://example.com/graphql", http2=True)
+    with pytest.raises(ImportError, match=r"rath\[http2\]"):
+        async with link:
+            pass
+
+
+# ---------------------------------------------------------------------------
+# codecs
+# ---------------------------------------------------------------------------
+
+
+async def test_aiohttp_encodes_datetimes(graphql_server):
+    link = AIOHttpLink(endpoint_url=str(graphql_server.make_url("/graphql")))
+    async with link:
+        op = opify(QUERY, variables={"since": datetime(2024, 1, 1, 12, 30)})
+        results = [r async for r in link.aexecute(op)]
+
+    assert results[0].data == {"beast": {"id": "1"}}
+    assert graphql_server.bodies[0]["variables"] == {"since": "2024-01-01T12:30:00"}
+
+
+async def test_json_encoder_forces_stdlib_codec():
+    link = HttpxLink(endpoint_url="http://example.com/graphql", json_encoder=DateTimeEncoder)
+    assert isinstance(link.codec, StdlibCodec)
+    assert link.codec.encoder is DateTimeEncoder
+
+
+async def test_httpx_encodes_datetimes(graphql_server):
+    link = HttpxLink(endpoint_url=str(graphql_server.make_url("/graphql")))
+    async with link:
+        op = opify(QUERY, variables={"since": datetime(2024, 1, 1, 12, 30)})
+        results = [r async for r in link.aexecute(op)]
+
+    assert results[0].data == {"beast": {"id": "1"}}
+    assert graphql_server.bodies[0]["variables"] == {"since": "2024-01-01T12:30:00"}
+
+
+# ---------------------------------------------------------------------------
+# persisted queries
+# ---------------------------------------------------------------------------
+
+
+def _persisted(query: str = QUERY, **kwargs):
+    op = opify(query, **kwargs)
+    op.context.extensions["persistedQuery"] = {"version": 1, "sha256Hash": "abc"}
+    op.context.omit_document = True
+    return op
+
+
+@pytest.mark.parametrize("link_class", [AIOHttpLink, HttpxLink])
+async def test_links_omit_document_and_forward_extensions(graphql_server, link_class):
+    link = link_class(endpoint_url=str(graphql_server.make_url("/graphql")))
+    async with link:
+        results = [r async for r in link.aexecute(_persisted())]
+
+    assert results[0].data == {"beast": {"id": "1"}}
+    assert graphql_server.methods == ["POST"]
+    assert "query" not in graphql_server.bodies[0]
+    assert graphql_server.bodies[0]["extensions"] == {"persistedQuery": {"version": 1, "sha256Hash": "abc"}}
+
+
+@pytest.mark.parametrize("link_class", [AIOHttpLink, HttpxLink])
+async def test_links_get_persisted_queries(graphql_server, link_class):
+    link = link_class(endpoint_url=str(graphql_server.make_url("/graphql")), get_persisted_queries=True)
+    async with link:
+        [r async for r in link.aexecute(_persisted(variables={"id": 1}))]
+        # documents that are sent in full, and mutations, are still posted
+        [r async for r in link.aexecute(opify(QUERY))]
+        [r async for r in link.aexecute(_persisted("mutation Kill { kill }"))]
+
+    assert graphql_server.methods == ["GET", "POST", "POST"]
+    params = graphql_server.bodies[0]
+    assert "query" not in params
+    assert json.loads(params["variables"]) == {"id": 1}
+    assert json.loads(params["extensions"])["persistedQuery"]["sha256Hash"] == "abc"
+
+
+@pytest.mark.parametrize("link_class", [AIOHttpLink, HttpxLink])
+async def test_links_post_persisted_queries_with_long_urls(graphql_server, link_class):
+    link = link_class(
+        endpoint_url=str(graphql_server.make_url("/graphql")),
+        get_persisted_queries=True,
+        max_get_url_length=100,
+    )
+    async with link:
+        [r async for r in link.aexecute(_persisted(variables={"name": "x" * 200}))]
+
+    assert graphql_server.methods == ["POST"]
+
+
+# ---------------------------------------------------------------------------
+# transient server errors
+# ---------------------------------------------------------------------------
+
+
+@pytest.mark.parametrize("link_class", [AIOHttpLink, HttpxLink])
+async def test_links_raise_status_errors_with_retry_after(link_class):
+    async def handle(request: web.Request) -> web.Response:
+        return web.Response(status=503, text="<html>down</html>", headers={"Retry-After": "7"})
+
+    app = web.Application()
+    app.router.add_post("/graphql", handle)
+    async with TestServer(app) as server:
+        link = link_class(endpoint_url=str(server.make_url("/graphql")))
+        async with link:
+            with pytest.raises(HTTPStatusError) as excinfo:
+                [r async for r in link.aexecute(opify(QUERY))]
+
+    assert excinfo.value.status == 503
+    assert excinfo.value.retry_after == 7
@@ -0,0 +1,154 @@
+"""Tests for the incremental delivery of @defer and @stream over multipart/mixed."""
+import asyncio
+import json
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from rath import Rath
+from rath.links.aiohttp import AIOHttpLink
+from rath.links.httpx import HttpxLink
+from rath.links.incremental import MultipartParser, apply_patches, uses_incremental_delivery
+from rath.operation import GraphQLException, opify
+
+DEFERRED = "query Beast { beast { id ... @defer { slow } } }"
+STREAMED = "query Beasts { beasts @stream(initialCount: 1) { id } }"
+
+PARTS = [
+    {"data": {"beast": {"id": "1"}, "beasts": [{"id": "a"}]}, "hasNext": True},
+    {"incremental": [{"data": {"slow": "finally"}, "path": ["beast"]}], "hasNext": True},
+    {"incremental": [{"items": [{"id": "b"}, {"id": "c"}], "path": ["beasts", 1]}], "hasNext": False},
+]
+
+
+def _multipart(parts, boundary: str = "-") -> bytes:
+    body = b""
+    for part in parts:
+        body += f"\r\n--{boundary}\r\nContent-Type: application/json; charset=utf-8\r\n\r\n".encode()
+        body += json.dumps(part).encode()
+    return body + f"\r\n--{boundary}--\r\n".encode()
+
+
+def test_detects_incremental_directives():
+    assert uses_incremental_delivery(opify(DEFERRED))
+    assert uses_incremental_delivery(opify(STREAMED))
+    assert not uses_incremental_delivery(opify("query { beast { id } }"))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 64, 4096])
+def test_parser_splits_parts_across_chunks(chunk_size):
+    body = _multipart(PARTS, boundary="graphql")
+    parser = MultipartParser("graphql")
+    bodies = []
+    for i in range(0, len(body), chunk_size):
+        bodies += parser.feed(body[i : i + chunk_size])
+
+    assert [json.loads(b) for b in bodies] == PARTS
+    assert parser.done
+
+
+def test_patches_are_merged_without_modifying_previous_results():
+    first = PARTS[0]["data"]
+    second = apply_patches(first, PARTS[1])
+    third = apply_patches(second, PARTS[2])
+
+    assert first == {"beast": {"id": "1"}, "beasts": [{"id": "a"}]}
+    assert second["beast"] == {"id": "1", "slow": "finally"}
+    assert third["beasts"] == [{"id": "a"}, {"id": "b"}, {"id": "c"}]
+    # untouched branches are shared, not copied
+    assert third["beast"] is second["beast"]
+
+
+def test_patches_support_the_older_format():
+    data = {"beast": {"id": "1"}}
+    assert apply_patches(data, {"data": {"slow": "x"}, "path": ["beast"], "hasNext": False}) == {
+        "beast": {"id": "1", "slow": "x"}
+    }
+
+
+@pytest.mark.parametrize(
+    "patch",
+    [
+        {"items": [{"id": "z"}], "path": ["beasts", 5]},
+        {"data": {"slow": "x"}, "path": ["beasts", 3]},
+        {"data": {"slow": "x"}, "path": ["beast", 0]},
+        {"items": [{"id": "z"}], "path": ["beasts"]},
+    ],
+)
+def test_patches_outside_of_the_result_raise(patch):
+    with pytest.raises(GraphQLException, match="patch|items"):
+        apply_patches(PARTS[0]["data"], {"incremental": [patch]})
+
+
+def test_patch_errors_raise():
+    with pytest.raises(GraphQLException, match="slow failed"):
+        apply_patches({}, {"incremental": [{"errors": [{"message": "slow failed"}], "path": []}]})
+
+
+@pytest.fixture
+async def defer_server():
+    """A server that answers deferred operations part by part, and everything else with JSON."""
+    accepts: list = []
+
+    async def handle(request: web.Request) -> web.StreamResponse:
+        accepts.append(request.headers.get("Accept"))
+        body = await request.json()
+        if "@defer" not in body["query"]:
+            return web.json_response({"data": {"beast": {"id": "1"}}})
+
+        response = web.StreamResponse(headers={"Content-Type": 'multipart/mixed; boundary="-"'})
+        await response.prepare(request)
+        for part in PARTS:
+            await response.write(_multipart([part])[: -len("\r\n-----\r\n")])
+            await asyncio.sleep(0.01)
+        await response.write(b"\r\n-----\r\n")
+        await response.write_eof()
+        return response
+
+    app = web.Application()
+    app.router.add_post("/graphql", handle)
+    async with TestServer(app) as server:
+        server.accepts = accepts
+        yield server
+
+
+@pytest.mark.parametrize("link_class", [AIOHttpLink, HttpxLink])
+async def test_links_yield_a_merged_result_per_patch(defer_server, link_class):
+    link = link_class(endpoint_url=str(defer_server.make_url("/graphql")))
+
+    async with link:
+        results = [result.data async for result in link.aexecute(opify(DEFERRED))]
+        plain = [result.data async for result in link.aexecute(opify("query { beast { id } }"))]
+
+    assert len(results) == 3
+    assert results[0]["beast"] == {"id": "1"}
+    assert results[1]["beast"] == {"id": "1", "slow": "finally"}
+    assert [beast["id"] for beast in results[2]["beasts"]] == ["a", "b", "c"]
+    assert plain == [{"beast": {"id": "1"}}]
+    assert defer_server.accepts[0].startswith("multipart/mixed")
+    assert defer_server.accepts[1] != defer_server.accepts[0]
+
+
+async def test_query_returns_the_complete_result(defer_server):
+    rath = Rath(link=AIOHttpLink(endpoint_url=str(defer_server.make_url("/graphql"))))
+
+    async with rath:
+        result = await rath.aquery(DEFERRED)
+        parts = [part.data async for part in rath.asubscribe(DEFERRED)]
+
+    # aquery waits for all deferred parts, asubscribe yields the result after every part
+    assert result.data == parts[-1]
+    assert result.data["beast"] == {"id": "1", "slow": "finally"}
+    assert len(parts) == 3
+
+
+@pytest.mark.parametrize("link_class", [AIOHttpLink, HttpxLink])
+async def test_links_fall_back_to_json(defer_server, link_class):
+    # the server ignores the directive, and answers with a single JSON result
+    link = link_class(endpoint_url=str(defer_server.make_url("/graphql")))
+
+    async with link:
+        results = [result.data async for result in link.aexecute(opify(STREAMED))]
+
+    assert results == [{"beast": {"id": "1"}}]
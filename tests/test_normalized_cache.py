@@ -0,0 +1,168 @@
+"""Tests for the NormalizedStore and the NormalizedCacheLink."""
+from typing import Any, AsyncIterator, Dict
+
+from rath import Rath
+from rath.links import compose
+from rath.links.base import AsyncTerminatingLink
+from rath.links.normalize import NormalizedCacheLink, NormalizedStore
+from rath.operation import GraphQLResult, Operation, opify
+
+
+class AnsweringLink(AsyncTerminatingLink):
+    """Answers every operation with the response registered for its operation name."""
+
+    responses: Dict[str, Any] = {}
+    calls: int = 0
+
+    async def aexecute(self, operation: Operation) -> AsyncIterator[GraphQLResult]:
+        object.__setattr__(self, "calls", self.calls + 1)
+        yield GraphQLResult(data=self.responses[operation.node.name.value])
+
+
+BEASTS = "query Beasts { beasts { __typename id name legs } }"
+BEAST = "query Beast($id: ID!) { beast(id: $id) { __typename id name } }"
+RENAME = "mutation Rename { renameBeast { __typename id name } }"
+
+BEASTS_DATA = {
+    "beasts": [
+        {"__typename": "Beast", "id": "1", "name": "cat", "legs": 4},
+        {"__typename": "Beast", "id": "2", "name": "bird", "legs": 2},
+    ]
+}
+
+
+def _make_rath(responses, **kwargs):
+    terminal = AnsweringLink(responses=responses)
+    cache = NormalizedCacheLink(**kwargs)
+    return Rath(link=compose(cache, terminal)), cache, terminal
+
+
+def test_store_normalizes_entities():
+    store = NormalizedStore()
+    store.write(opify(BEASTS), BEASTS_DATA)
+
+    assert store.get("Beast:1") == {"__typename": "Beast", "id": "1", "name": "cat", "legs": 4}
+    assert store.info().entities == {"Beast": 2}
+    assert store.read(opify(BEASTS)) == BEASTS_DATA
+
+
+def test_store_keys_fields_by_arguments_and_aliases():
+    store = NormalizedStore()
+    query = "query Both { cat: beast(id: 1) { __typename id name } bird: beast(id: 2) { __typename id name } }"
+    store.write(
+        opify(query),
+        {
+            "cat": {"__typename": "Beast", "id": "1", "name": "cat"},
+            "bird": {"__typename": "Beast", "id": "2", "name": "bird"},
+        },
+    )
+
+    assert store.read(opify(BEAST, variables={"id": 2})) == {
+        "beast": {"__typename": "Beast", "id": "2", "name": "bird"}
+    }
+    assert store.read(opify(BEAST, variables={"id": 3})) is None
+
+
+def test_store_reads_fragments():
+    store = NormalizedStore()
+    query = """
+    query Beasts { beasts { __typename id ...Named ... on Bird { wings } } }
+    fragment Named on Beast { name }
+    """
+    store.write(opify(query), {"beasts": [{"__typename": "Beast", "id": "1", "name": "cat"}]})
+
+    assert store.read(opify(query)) == {"beasts": [{"__typename": "Beast", "id": "1", "name": "cat"}]}
+
+
+def test_store_misses_unknown_fields():
+    store = NormalizedStore()
+    store.write(opify(BEAST, variables={"id": 1}), {"beast": {"__typename": "Beast", "id": "1", "name": "cat"}})
+
+    assert store.read(opify("query Legs($id: ID!) { beast(id: $id) { __typename id legs } }", variables={"id": 1})) is None
+    assert store.info().misses == 1
+
+
+def test_store_evicts_per_type():
+    store = NormalizedStore(max_entities_per_type=5, type_limits={"Bird": 1})
+    for i in range(10):
+        store.write(opify(BEAST, variables={"id": i}), {"beast": {"__typename": "Beast", "id": str(i), "name": "cat"}})
+        store.write(opify(BEAST, variables={"id": -i}), {"beast": {"__typename": "Bird", "id": str(i), "name": "bird"}})
+
+    assert store.info().entities == {"Beast": 5, "Bird": 1}
+    # a query that references an evicted entity is not answered from the store
+    assert store.read(opify(BEAST, variables={"id": 0})) is None
+    assert store.read(opify(BEAST, variables={"id": 9})) is not None
+
+
+async def test_link_serves_repeated_queries_from_store():
+    rath, cache, terminal = _make_rath({"Beasts": BEASTS_DATA})
+
+    async with rath:
+        await rath.aquery(BEASTS)
+        await rath.aquery(BEASTS)
+
+    assert terminal.calls == 1
+    assert cache.store.info().hits == 1
+
+
+async def test_link_mutation_updates_cached_queries():
+    rath, cache, terminal = _make_rath(
+        {
+            "Beasts": BEASTS_DATA,
+            "Rename": {"renameBeast": {"__typename": "Beast", "id": "1", "name": "tiger"}},
+        }
+    )
+
+    async with rath:
+        await rath.aquery(BEASTS)
+        await rath.aquery(RENAME)
+        result = await rath.aquery(BEASTS)
+
+    assert terminal.calls == 2
+    assert result.data["beasts"][0] == {"__typename": "Beast", "id": "1", "name": "tiger", "legs": 4}
+
+
+def test_store_counts_explicit_evictions():
+    store = NormalizedStore()
+    store.write(opify(BEASTS), BEASTS_DATA)
+
+    assert store.evict("Beast:1") == 1
+    assert store.info().evictions == 1
+    assert store.evict("Beast") == 1
+    assert store.info().evictions == 2
+
+
+async def test_link_keeps_a_store_per_headers():
+    rath, cache, terminal = _make_rath({"Beasts": BEASTS_DATA})
+
+    async with rath:
+        await rath.aquery(BEASTS, headers={"Authorization": "Bearer alice"})
+        await rath.aquery(BEASTS, headers={"Authorization": "Bearer bob"})
+        await rath.aquery(BEASTS, headers={"Authorization": "Bearer alice"})
+
+    assert terminal.calls == 2
+    alice = cache.store_for(opify(BEASTS, headers={"Authorization": "Bearer alice"}))
+    assert alice.info().hits == 1
+    assert alice is not cache.store
+
+
+async def test_link_can_share_the_store_between_headers():
+    rath, cache, terminal = _make_rath({"Beasts": BEASTS_DATA}, vary_on_headers=False)
+
+    async with rath:
+        await rath.aquery(BEASTS, headers={"Authorization": "Bearer alice"})
+        await rath.aquery(BEASTS, headers={"Authorization": "Bearer bob"})
+
+    assert terminal.calls == 1
+    assert cache.store.info().hits == 1
+
+
+async def test_link_network_only_refreshes_store():
+    rath, cache, terminal = _make_rath({"Beasts": BEASTS_DATA})
+
+    async with rath:
+        await rath.aquery(BEASTS, cache_policy="network-only")
+        await rath.aquery(BEASTS, cache_policy="network-only")
+
+    assert terminal.calls == 2
+    assert cache.store.info().entities == {"Beast": 2}
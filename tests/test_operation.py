@@ -4,11 +4,13 @@ from graphql import DocumentNode
 
 from rath.operation import (
     Context,
+    DocumentCache,
     Extensions,
     GraphQLException,
     GraphQLResult,
     Operation,
     SubscriptionDisconnect,
+    document_cache,
     opify,
 )
 from rath.errors import (
@@ -83,6 +85,16 @@ def test_opify_generates_unique_ids():
     assert op1.id != op2.id
 
 
+def test_opify_ids_do_not_repeat_after_seeding_random():
+    import random
+
+    random.seed(42)
+    op1 = opify("query { hello }")
+    random.seed(42)
+    op2 = opify("query { hello }")
+    assert op1.id != op2.id
+
+
 def test_opify_accepts_document_node():
     from graphql import parse
 
@@ -97,6 +109,98 @@ def test_opify_raises_on_missing_operation():
         opify("query { hello }", operation_name="NonExistent")
 
 
+def test_opify_matches_validated_models():
+    """The validation-free fast path builds the same models as validation would."""
+    op = opify("query { hello }", variables={"a": 1}, headers={"x": "y"}, foo="bar")
+    assert op.context == Context(headers={"x": "y"}, kwargs={"foo": "bar"})
+    assert op.extensions == Extensions()
+    assert Operation(**dict(op)) == op
+    assert set(op.model_fields_set) == set(Operation.model_fields)
+
+
+def test_opify_copies_variables_and_headers():
+    variables = {"a": 1}
+    headers = {"x": "y"}
+    op = opify("query { hello }", variables=variables, headers=headers)
+    op.variables["b"] = 2
+    op.context.headers["z"] = "w"
+    assert variables == {"a": 1}
+    assert headers == {"x": "y"}
+
+
+# ---------------------------------------------------------------------------
+# DocumentCache
+# ---------------------------------------------------------------------------
+
+
+def test_opify_reuses_cached_document():
+    query = "query CachedHello { hello }"
+    first = opify(query)
+    second = opify(query)
+    assert first.document_node is second.document_node
+    assert first.node is second.node
+    assert first.id != second.id
+
+
+def test_opify_caches_per_operation_name():
+    query = "query A { a } query B { b }"
+    a = opify(query, operation_name="A")
+    b = opify(query, operation_name="B")
+    assert a.node.name.value == "A"
+    assert b.node.name.value == "B"
+
+
+def test_document_cache_counts_hits_and_misses():
+    cache = DocumentCache(maxsize=8)
+    cache.get("query { hello }")
+    cache.get("query { hello }")
+    cache.get("query { world }")
+
+    info = cache.info()
+    assert info.hits == 1
+    assert info.misses == 2
+    assert info.currsize == 2
+    assert info.evictions == 0
+
+
+def test_document_cache_evicts_least_recently_used():
+    cache = DocumentCache(maxsize=2)
+    a = cache.get("query { a }")
+    cache.get("query { b }")
+    cache.get("query { a }")  # a is now the most recently used
+    cache.get("query { c }")  # evicts b
+
+    assert cache.info().evictions == 1
+    assert cache.get("query { a }") is a
+    cache.get("query { b }")
+    assert cache.info().misses == 4
+
+
+def test_document_cache_resize_and_clear():
+    cache = DocumentCache(maxsize=4)
+    for field in "abcd":
+        cache.get(f"query {{ {field} }}")
+
+    cache.resize(1)
+    assert cache.info().currsize == 1
+    assert cache.info().evictions == 3
+
+    cache.clear()
+    assert cache.info() == (0, 0, 0, 1, 0)
+
+
+def test_document_cache_disabled_with_zero_size():
+    cache = DocumentCache(maxsize=0)
+    assert cache.get("query { a }") is not cache.get("query { a }")
+    assert cache.info().currsize == 0
+
+
+def test_document_cache_does_not_cache_missing_operations():
+    with pytest.raises(AssertionError):
+        opify("query { hello }", operation_name="StillNonExistent")
+    assert ("query { hello }", "StillNonExistent") not in document_cache._entries
+
+
 # ---------------------------------------------------------------------------
 # Context defaults
 # ---------------------------------------------------------------------------
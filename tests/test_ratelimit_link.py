@@ -0,0 +1,122 @@
+"""Tests for the RateLimitLink."""
+import asyncio
+import time
+from typing import AsyncIterator, List
+from uuid import uuid4
+
+import pytest
+
+from rath import Rath
+from rath.links.base import AsyncTerminatingLink
+from rath.links.errors import HTTPStatusError
+from rath.links.ratelimit import RateLimitLink, TokenBucket
+from rath.operation import GraphQLResult, Operation
+
+QUERY = "query GetBeast { beast { id } }"
+OTHER = "query GetOther { other { id } }"
+
+
+class RecordingLink(AsyncTerminatingLink):
+    """Records when operations arrive, and fails with the given errors first."""
+
+    errors: List[Exception] = []
+    arrivals: List[float] = []
+
+    async def aexecute(self, operation: Operation) -> AsyncIterator[GraphQLResult]:
+        self.arrivals.append(time.monotonic())
+        if self.errors:
+            raise self.errors.pop(0)
+        yield GraphQLResult(data={"beast": {"id": "1"}})
+
+
+def _endpoint() -> str:
+    # buckets are process wide, every test limits its own endpoint
+    return f"http://{uuid4().hex}/graphql"
+
+
+async def test_bucket_waits_for_tokens():
+    bucket = TokenBucket(rate=100, burst=2)
+
+    waits = [await bucket.acquire() for _ in range(4)]
+
+    assert waits[:2] == [0, 0]
+    assert all(0 < wait <= 0.01 for wait in waits[2:])
+
+
+async def test_waits_instead_of_failing():
+    recording = RecordingLink()
+    rath = Rath(link=[RateLimitLink(endpoint=_endpoint(), rate=50, burst=1), recording])
+
+    start = time.monotonic()
+    async with rath:
+        await asyncio.gather(*[rath.aquery(QUERY) for _ in range(6)])
+
+    assert len(recording.arrivals) == 6
+    assert time.monotonic() - start >= 5 / 50 * 0.9
+
+
+async def test_operation_quotas():
+    recording = RecordingLink()
+    link = RateLimitLink(endpoint=_endpoint(), rate=1000, operation_rates={"GetBeast": 20})
+    rath = Rath(link=[link, recording])
+
+    async with rath:
+        start = time.monotonic()
+        await asyncio.gather(*[rath.aquery(OTHER) for _ in range(5)])
+        assert time.monotonic() - start < 0.04
+
+        # a burst of one second worth of operations, the rest has to wait
+        await asyncio.gather(*[rath.aquery(QUERY) for _ in range(22)])
+        assert time.monotonic() - start >= 2 / 20 * 0.9
+
+
+async def test_budget_is_shared_across_clients():
+    endpoint = _endpoint()
+    recording = RecordingLink()
+    first = Rath(link=[RateLimitLink(endpoint=endpoint, rate=20, burst=1), recording])
+    second = Rath(link=[RateLimitLink(endpoint=endpoint, rate=20, burst=1), recording])
+
+    start = time.monotonic()
+    async with first:
+        async with second:
+            await asyncio.gather(first.aquery(QUERY), second.aquery(QUERY), second.aquery(QUERY))
+
+    assert time.monotonic() - start >= 2 / 20 * 0.9
+
+
+async def test_links_without_endpoint_have_their_own_budget():
+    recording = RecordingLink()
+    first = Rath(link=[RateLimitLink(rate=1, burst=1), recording])
+    second = Rath(link=[RateLimitLink(rate=1, burst=1), recording])
+
+    start = time.monotonic()
+    async with first:
+        async with second:
+            # one token each, a shared bucket would make the second wait a second
+            await asyncio.gather(first.aquery(QUERY), second.aquery(QUERY))
+    assert time.monotonic() - start < 0.5
+
+    async with first:
+        start = time.monotonic()
+        await first.aquery(QUERY)
+    assert time.monotonic() - start >= 0.9
+
+
+async def test_honors_retry_after_of_429():
+    recording = RecordingLink(errors=[HTTPStatusError("slow down", 429, retry_after=0.1)])
+    rath = Rath(link=[RateLimitLink(endpoint=_endpoint(), rate=1000), recording])
+
+    async with rath:
+        result = await rath.aquery(QUERY)
+
+    assert result.data == {"beast": {"id": "1"}}
+    assert recording.arrivals[1] - recording.arrivals[0] >= 0.09
+
+
+async def test_raises_when_rate_limited_too_often():
+    errors = [HTTPStatusError("slow down", 429, retry_after=0)] * 3
+    rath = Rath(link=[RateLimitLink(endpoint=_endpoint(), max_rate_limited_retries=2), RecordingLink(errors=errors)])
+
+    async with rath:
+        with pytest.raises(HTTPStatusError):
+            await rath.aquery(QUERY)
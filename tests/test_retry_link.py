@@ -0,0 +1,111 @@
+"""Tests for the RetryLink."""
+from typing import AsyncIterator, List
+
+import pytest
+
+from rath import Rath
+from rath.links.base import AsyncTerminatingLink
+from rath.links.errors import HTTPStatusError
+from rath.links.retry import RetryBudget, RetryLink
+from rath.operation import GraphQLException, GraphQLResult, Operation, SubscriptionDisconnect
+
+QUERY = "query { beast { id } }"
+MUTATION = "mutation { createBeast { id } }"
+
+
+class FlakyLink(AsyncTerminatingLink):
+    """Fails with the given errors (one per call), before succeeding."""
+
+    errors: List[Exception] = []
+    calls: int = 0
+
+    async def aexecute(self, operation: Operation) -> AsyncIterator[GraphQLResult]:
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        yield GraphQLResult(data={"beast": {"id": "1"}})
+
+
+async def test_retries_transient_errors():
+    flaky = FlakyLink(
+        errors=[ConnectionResetError("reset"), TimeoutError(), HTTPStatusError("unavailable", 503)]
+    )
+    rath = Rath(link=[RetryLink(sleep_interval=0.001), flaky])
+
+    async with rath:
+        result = await rath.aquery(QUERY)
+
+    assert result.data == {"beast": {"id": "1"}}
+    assert flaky.calls == 4
+
+
+@pytest.mark.parametrize(
+    "error",
+    [HTTPStatusError("bad request", 400), GraphQLException("Field not found"), ValueError("broken")],
+)
+async def test_does_not_retry_other_errors(error):
+    flaky = FlakyLink(errors=[error])
+    rath = Rath(link=[RetryLink(sleep_interval=0.001), flaky])
+
+    async with rath:
+        with pytest.raises(type(error)):
+            await rath.aquery(QUERY)
+
+    assert flaky.calls == 1
+
+
+async def test_does_not_retry_mutations_by_default():
+    flaky = FlakyLink(errors=[ConnectionResetError("reset")])
+    rath = Rath(link=[RetryLink(sleep_interval=0.001), flaky])
+
+    async with rath:
+        with pytest.raises(ConnectionResetError):
+            await rath.aquery(MUTATION)
+        await rath.aquery(QUERY)
+
+    assert flaky.calls == 2
+
+
+async def test_gives_up_after_maximum_retry_attempts():
+    flaky = FlakyLink(errors=[SubscriptionDisconnect("gone")] * 5)
+    rath = Rath(link=[RetryLink(sleep_interval=None, maximum_retry_attempts=2), flaky])
+
+    async with rath:
+        with pytest.raises(GraphQLException, match="Maximum retry attempts"):
+            await rath.aquery(QUERY)
+
+    assert flaky.calls == 3
+
+
+async def test_retry_budget_stops_retry_storms():
+    budget = RetryBudget(max_tokens=4, token_ratio=1)
+    flaky = FlakyLink(errors=[ConnectionResetError("reset")] * 10)
+    rath = Rath(link=[RetryLink(sleep_interval=None, budget=budget), flaky])
+
+    async with rath:
+        # the first failure is retried, the second exhausts the budget
+        with pytest.raises(ConnectionResetError):
+            await rath.aquery(QUERY)
+        assert flaky.calls == 2
+
+        with pytest.raises(ConnectionResetError):
+            await rath.aquery(QUERY)
+        assert flaky.calls == 3
+
+        # successes refill the budget
+        flaky.errors = []
+        for _ in range(4):
+            await rath.aquery(QUERY)
+
+    assert budget.tokens == 4
+
+
+def test_retry_delay_uses_full_jitter_and_retry_after():
+    link = RetryLink(sleep_interval=1, max_sleep_interval=5)
+
+    for retry, cap in [(0, 1), (1, 2), (2, 4), (5, 5)]:
+        delays = [link.retry_delay(retry, ConnectionError()) for _ in range(50)]
+        assert all(0 <= delay <= cap for delay in delays)
+
+    assert link.retry_delay(0, HTTPStatusError("slow down", 503, retry_after=3)) >= 3
+    assert link.retry_delay(0, HTTPStatusError("slow down", 503, retry_after=60)) == 5
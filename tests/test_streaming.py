@@ -0,0 +1,137 @@
+"""Tests for the incremental decoding of large responses."""
+import json
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from rath import Rath
+from rath.links.aiohttp import AIOHttpLink
+from rath.links.errors import MalformedResponseError
+from rath.links.httpx import HttpxLink
+from rath.links.streaming import JSONListStream
+from rath.operation import GraphQLException, opify
+
+DOCUMENT = {
+    "data": {
+        "count": 3,
+        "items": [
+            {"id": "1", "name": 'tricky ] }, "quoted" \\ [ {'},
+            {"id": "2", "tags": [[1, 2], {"items": []}]},
+            "a string",
+        ],
+        "other": {"items": [1, 2]},
+    },
+    "extensions": {"cost": 1},
+}
+
+
+def _feed(data: bytes, path, chunk_size: int):
+    stream = JSONListStream(path)
+    items = []
+    for i in range(0, len(data), chunk_size):
+        items += stream.feed(data[i : i + chunk_size])
+    return items, stream.close()
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 1024])
+def test_stream_extracts_items_across_chunks(chunk_size):
+    items, rest = _feed(json.dumps(DOCUMENT).encode(), ["data", "items"], chunk_size)
+
+    assert items == DOCUMENT["data"]["items"]
+    assert rest == {
+        "data": {"count": 3, "items": [], "other": {"items": [1, 2]}},
+        "extensions": {"cost": 1},
+    }
+
+
+def test_stream_handles_whitespace_and_empty_lists():
+    items, rest = _feed(b'{ "data" : { "items" : [ ] , "b" : [ 1 , 2 ] } }', ["data", "items"], 3)
+    assert items == []
+    assert rest == {"data": {"items": [], "b": [1, 2]}}
+
+    items, _ = _feed(b'{"data": {"items": [ 1 ,\n 2 ]}}', ["data", "items"], 3)
+    assert items == [1, 2]
+
+
+def test_stream_keeps_memory_bounded():
+    document = json.dumps({"data": {"items": [{"id": i, "payload": "x" * 100} for i in range(2000)]}}).encode()
+    stream = JSONListStream(["data", "items"])
+    largest = 0
+    count = 0
+    for i in range(0, len(document), 4096):
+        count += len(stream.feed(document[i : i + 4096]))
+        largest = max(largest, len(stream._buffer))
+
+    assert count == 2000
+    assert largest < 4096 + 200
+
+
+def test_stream_rejects_truncated_documents():
+    stream = JSONListStream(["data", "items"])
+    stream.feed(b'{"data": {"items": [1, 2')
+    with pytest.raises(MalformedResponseError):
+        stream.close()
+
+
+@pytest.fixture
+async def large_server():
+    """A server that answers with a large list, written in small chunks."""
+
+    async def handle(request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        if "broken" in body["query"]:
+            document = {"errors": [{"message": "Field 'broken' not found"}]}
+        else:
+            document = {"data": {"items": [{"id": i} for i in range(1000)]}}
+
+        response = web.StreamResponse()
+        await response.prepare(request)
+        data = json.dumps(document).encode()
+        for i in range(0, len(data), 500):
+            await response.write(data[i : i + 500])
+        await response.write_eof()
+        return response
+
+    app = web.Application()
+    app.router.add_post("/graphql", handle)
+    async with TestServer(app) as server:
+        yield server
+
+
+@pytest.mark.parametrize("link_class", [AIOHttpLink, HttpxLink])
+async def test_links_stream_items(large_server, link_class):
+    link = link_class(endpoint_url=str(large_server.make_url("/graphql")), stream_chunk_size=256)
+
+    async with Rath(link=link) as rath:
+        items = [item async for item in rath.astream_items("query { items { id } }", "data.items")]
+
+        # the results arrive in many partial results
+        op_results = [r async for r in link.aexecute(opify("query { items { id } }", stream_path=["data", "items"]))]
+
+    assert [item["id"] for item in items] == list(range(1000))
+    assert len(op_results) > 10
+    assert op_results[-1].data == {"items": []}
+
+
+@pytest.mark.parametrize("link_class", [AIOHttpLink, HttpxLink])
+async def test_links_stream_errors(large_server, link_class):
+    link = link_class(endpoint_url=str(large_server.make_url("/graphql")))
+
+    async with Rath(link=link) as rath:
+        with pytest.raises(GraphQLException, match="broken"):
+            [item async for item in rath.astream_items("query { broken { id } }", "data.items")]
+
+
+async def test_stream_items_requires_data_path():
+    async with Rath(link=AIOHttpLink(endpoint_url="http://example.com/graphql")) as rath:
+        with pytest.raises(ValueError):
+            [item async for item in rath.astream_items("query { items { id } }", "items")]
+
+
+async def test_query_rejects_stream_paths(large_server):
+    link = AIOHttpLink(endpoint_url=str(large_server.make_url("/graphql")))
+
+    async with Rath(link=link) as rath:
+        with pytest.raises(ValueError, match="astream_items"):
+            await rath.aquery("query { items { id } }", stream_path=["data", "items"])
@@ -0,0 +1,171 @@
+"""Tests for the streamed multipart uploads of the HTTP links."""
+import hashlib
+import io
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from rath import Rath
+from rath.links import compose
+from rath.links.aiohttp import AIOHttpLink
+from rath.links.file import FileExtraction
+from rath.links.httpx import HttpxLink
+from rath.links.upload import MultipartUpload, UploadProgress, aiter_file, file_size
+from rath.operation import opify
+
+UPLOAD = "mutation Upload($file: Upload, $others: [Upload]) { upload(file: $file, others: $others) }"
+FILE_SIZE = 3 * 1024 * 1024 + 17
+
+
+@pytest.fixture
+def big_file(tmp_path):
+    path = tmp_path / "image.tif"
+    path.write_bytes(os.urandom(FILE_SIZE))
+    with open(path, "rb") as f:
+        yield f
+
+
+async def _generator():
+    for i in range(3):
+        yield f"part {i};".encode()
+
+
+@pytest.fixture
+async def upload_server():
+    """A server that hashes the uploaded files part by part, and returns the hashes"""
+    requests: list = []
+
+    async def handle(request: web.Request) -> web.Response:
+        reader = await request.multipart()
+        fields = {}
+        uploads = {}
+        while (part := await reader.next()) is not None:
+            if part.filename is None:
+                fields[part.name] = json.loads(await part.text())
+                continue
+            digest, size = hashlib.sha256(), 0
+            while chunk := await part.read_chunk(2**16):
+                digest.update(chunk)
+                size += len(chunk)
+            uploads[part.name] = {"filename": part.filename, "size": size, "sha": digest.hexdigest()}
+
+        requests.append({"headers": dict(request.headers), "fields": fields})
+        return web.json_response({"data": {"upload": uploads}})
+
+    app = web.Application(client_max_size=2**30)
+    app.router.add_post("/graphql", handle)
+    async with TestServer(app) as server:
+        server.requests = requests
+        yield server
+
+
+@pytest.mark.parametrize("chunk_size", [1000, 64 * 1024])
+async def test_regular_files_are_sent_as_bounded_views(big_file, chunk_size):
+    big_file.seek(100)
+    assert file_size(big_file) == FILE_SIZE - 100
+
+    digest, size = hashlib.sha256(), 0
+    async for chunk in aiter_file(big_file, chunk_size):
+        assert isinstance(chunk, memoryview)
+        assert len(chunk) <= chunk_size
+        digest.update(chunk)
+        size += len(chunk)
+
+    big_file.seek(100)
+    assert size == FILE_SIZE - 100
+    assert digest.hexdigest() == hashlib.sha256(big_file.read()).hexdigest()
+
+
+async def test_in_memory_files_are_sent_as_views():
+    chunks = [chunk async for chunk in aiter_file(io.BytesIO(b"0123456789"), 4)]
+    assert all(isinstance(chunk, memoryview) for chunk in chunks)
+    assert [bytes(chunk) for chunk in chunks] == [b"0123", b"4567", b"89"]
+    assert [bytes(chunk) async for chunk in aiter_file(b"abc", 2)] == [b"ab", b"c"]
+
+
+async def test_content_length_matches_the_body(big_file):
+    upload = MultipartUpload(
+        {"operations": b"{}", "map": b'{"0": ["variables.file"]}'},
+        {"variables.file": big_file, "variables.other": io.BytesIO(b"x" * 10)},
+        chunk_size=4096,
+    )
+    body = b"".join([bytes(chunk) async for chunk in upload])
+    assert upload.headers["Content-Length"] == str(len(body))
+    assert body.endswith(f"--{upload.boundary}--\r\n".encode())
+
+
+async def test_unknown_sizes_have_no_content_length():
+    upload = MultipartUpload({"operations": b"{}"}, {"variables.file": _generator()})
+    assert "Content-Length" not in upload.headers
+    assert upload.headers["Content-Type"].startswith("multipart/form-data; boundary=")
+
+
+@pytest.mark.parametrize("link_class", [AIOHttpLink, HttpxLink])
+async def test_links_stream_uploads(upload_server, big_file, link_class):
+    progress: list = []
+
+    async def on_progress(update: UploadProgress) -> None:
+        progress.append(update)
+
+    link = link_class(
+        endpoint_url=str(upload_server.make_url("/graphql")),
+        upload_chunk_size=256 * 1024,
+        on_upload_progress=on_progress,
+    )
+
+    async with Rath(link=compose(FileExtraction(), link)) as rath:
+        result = await rath.aquery(
+            UPLOAD, variables={"file": big_file, "others": [io.BytesIO(b"small"), _generator()]}
+        )
+
+    big_file.seek(0)
+    uploads = result.data["upload"]
+    assert uploads["0"] == {
+        "filename": "image.tif",
+        "size": FILE_SIZE,
+        "sha": hashlib.sha256(big_file.read()).hexdigest(),
+    }
+    assert uploads["1"]["size"] == 5
+    assert uploads["2"]["size"] == len(b"part 0;part 1;part 2;")
+
+    request = upload_server.requests[0]
+    assert request["fields"]["map"] == {"0": ["variables.file"], "1": ["variables.others.0"], "2": ["variables.others.1"]}
+    assert request["fields"]["operations"]["variables"] == {"file": None, "others": [None, None]}
+
+    big_progress = [p.sent for p in progress if p.path == "variables.file"]
+    assert len(big_progress) == -(-FILE_SIZE // (256 * 1024))
+    assert big_progress == sorted(big_progress)
+    assert big_progress[-1] == FILE_SIZE
+    assert progress[-1] == UploadProgress("Upload", "variables.others.1", 21, None)
+
+
+@pytest.mark.parametrize("link_class", [AIOHttpLink, HttpxLink])
+async def test_links_send_a_content_length_for_sized_files(upload_server, big_file, link_class):
+    link = link_class(endpoint_url=str(upload_server.make_url("/graphql")))
+
+    async with Rath(link=compose(FileExtraction(), link)) as rath:
+        await rath.aquery(UPLOAD, variables={"file": big_file})
+
+    headers = upload_server.requests[0]["headers"]
+    assert int(headers["Content-Length"]) > FILE_SIZE
+    assert "Transfer-Encoding" not in headers
+
+
+def test_httpx_link_uploads_without_aiohttp():
+    # aiohttp is an optional extra, the httpx link must not depend on it
+    script = (
+        "import sys, asyncio\n"
+        "sys.modules['aiohttp'] = None\n"
+        "from rath.links.httpx import HttpxLink\n"
+        "from rath.links.upload import MultipartUpload\n"
+        "async def main():\n"
+        "    upload = MultipartUpload({'operations': b'{}'}, {'variables.file': b'abc'})\n"
+        "    return b''.join([bytes(chunk) async for chunk in upload])\n"
+        "assert b'abc' in asyncio.run(main())\n"
+    )
+    subprocess.run([sys.executable, "-c", script], check=True)